@@ -36,67 +36,178 @@ class Sirano:
         pass
 
     @staticmethod
-    def phase_1(project_name):
+    def phase_1(project_name, workers=None):
         """
         Discovery phase
+        :param project_name: The project name
+        :type project_name: str
+        :param workers: The number of worker processes, None to use the configuration
+        :type workers: int | None
         """
-        app = App(project_name)
-        app.phase = Phase.phase_1
-        app.load()
-        app.manager.file.add_files()
-        app.manager.file.discover_all()
+        app = Sirano.__load(project_name, Phase.phase_1, workers)
+        Sirano.__discover(app)
         app.manager.data.save_all()
-        app.log.info("Phase 1: discovery complete")
-        app.save_report()
+        Sirano.__complete(app, "Phase 1: discovery complete")
 
     @staticmethod
     def phase_2(project_name):
         """
         Generation phase
         """
-        app = App(project_name)
-        app.phase = Phase.phase_2
-        app.load()
-        app.manager.data.process_all()
-        app.manager.data.save_all()
-        app.log.info("Phase 2: generation complete")
-        app.save_report()
+        app = Sirano.__load(project_name, Phase.phase_2)
+        Sirano.__generate(app)
+        Sirano.__complete(app, "Phase 2: generation complete")
 
     @staticmethod
-    def phase_3(project_name):
+    def phase_3(project_name, workers=None):
         """
         Anonymization phase
+        :param project_name: The project name
+        :type project_name: str
+        :param workers: The number of worker processes, None to use the configuration
+        :type workers: int | None
+        """
+        app = Sirano.__load(project_name, Phase.phase_3, workers)
+        Sirano.__anonymize(app)
+        Sirano.__complete(app, "Phase 3: anonymization complete")
+
+    @staticmethod
+    def phase_4(project_name, workers=None):
+        """
+        Validation phase
+        :param project_name: The project name
+        :type project_name: str
+        :param workers: The number of worker processes, None to use the configuration
+        :type workers: int | None
+        """
+        app = Sirano.__load(project_name, Phase.phase_4, workers)
+        Sirano.__validate(app)
+        Sirano.__complete(app, "Phase 4: validation complete")
+
+    @staticmethod
+    def pass_through(project_name, workers=None):
+        """
+        Pass through all phases
+
+        The same application instance is used for all phases, the data are kept in memory and saved once after the
+        generation.
+        :param project_name: The project name
+        :type project_name: str
+        :param workers: The number of worker processes, None to use the configuration
+        :type workers: int | None
+        """
+        app = Sirano.__load(project_name, Phase.phase_1, workers)
+        Sirano.__discover(app)
+        Sirano.__complete(app, "Phase 1: discovery complete")
+
+        app.set_phase(Phase.phase_2)
+        Sirano.__generate(app)
+        Sirano.__complete(app, "Phase 2: generation complete")
+
+        app.set_phase(Phase.phase_3)
+        Sirano.__anonymize(app)
+        Sirano.__complete(app, "Phase 3: anonymization complete")
+
+        app.set_phase(Phase.phase_4)
+        Sirano.__validate(app)
+        Sirano.__complete(app, "Phase 4: validation complete")
+
+    @staticmethod
+    def single_pass(project_name):
+        """
+        Discover, generate and anonymize in a single pass
+
+        The replacement values are generated the first time a value is found and the data files are saved at the end.
+        :param project_name: The project name
+        :type project_name: str
         """
         app = App(project_name)
         app.phase = Phase.phase_3
+        app.single_pass = True
         app.load()
+        app.manager.data.open_journal_all()
+        app.manager.data.process_all()
         app.manager.file.add_files()
         app.manager.file.anonymize_all()
-        app.log.info("Phase 3: anonymization complete")
+        app.manager.data.save_all()
+        app.log.info("Single pass: discovery, generation and anonymization complete")
         app.save_report()
 
     @staticmethod
-    def phase_4(project_name):
+    def __load(project_name, phase, workers=None):
         """
-        Validation phase
+        Create and load the application for a phase
+        :param project_name: The project name
+        :type project_name: str
+        :param phase: The phase
+        :type phase: int
+        :param workers: The number of worker processes, None to use the configuration
+        :type workers: int | None
+        :return: The application
+        :rtype: App
         """
         app = App(project_name)
-        app.phase = Phase.phase_4
+        app.phase = phase
         app.load()
+        if phase in (Phase.phase_1, Phase.phase_2):  # The phases that save the data
+            app.manager.data.open_journal_all()
+        if workers is not None:
+            app.manager.file.workers = workers
+        return app
+
+    @staticmethod
+    def __discover(app):
+        """
+        Discover the values in all files
+        :param app: The application
+        :type app: App
+        """
         app.manager.file.add_files()
+        app.manager.file.discover_all()
+
+    @staticmethod
+    def __generate(app):
+        """
+        Generate the replacement values and save the data
+        :param app: The application
+        :type app: App
+        """
+        app.manager.data.process_all()
+        app.manager.data.save_all()
+
+    @staticmethod
+    def __anonymize(app):
+        """
+        Anonymize all files, the files are added if not already done
+        :param app: The application
+        :type app: App
+        """
+        if len(app.manager.file.files) == 0:
+            app.manager.file.add_files()
+        app.manager.file.anonymize_all()
+
+    @staticmethod
+    def __validate(app):
+        """
+        Validate all files, the files are added if not already done
+        :param app: The application
+        :type app: App
+        """
+        if len(app.manager.file.files) == 0:
+            app.manager.file.add_files()
         app.manager.file.validate_all()
-        app.log.info("Phase 4: validation complete")
-        app.save_report()
 
     @staticmethod
-    def pass_through(project_name):
+    def __complete(app, message):
         """
-        Pass through all phases
+        Log the end of a phase and save the report
+        :param app: The application
+        :type app: App
+        :param message: The message to log
+        :type message: str
         """
-        Sirano.phase_1(project_name)
-        Sirano.phase_2(project_name)
-        Sirano.phase_3(project_name)
-        Sirano.phase_4(project_name)
+        app.log.info(message)
+        app.save_report()
 
     @staticmethod
     def create(project_name):
@@ -108,6 +219,31 @@ class Sirano:
         app = App(project_name)
         app.create()
 
+    @staticmethod
+    def export_data(project_name):
+        """
+        Write the data of the project in the YAML files, for the storages that do not use them directly
+        :param project_name: The project name
+        :type project_name: str
+        """
+        app = App(project_name)
+        app.load()
+        app.manager.data.export_all()
+        app.log.info("Data exported to the YAML files")
+
+    @staticmethod
+    def import_data(project_name):
+        """
+        Replace the data of the project by the content of the YAML files, for the storages that do not use them
+        directly
+        :param project_name: The project name
+        :type project_name: str
+        """
+        app = App(project_name)
+        app.load()
+        app.manager.data.import_all()
+        app.log.info("Data imported from the YAML files")
+
     @staticmethod
     def archive(project_name):
         """
@@ -137,6 +273,11 @@ if __name__ == '__main__':
                                      "3: anonymization and "
                                      "4: validation}")
     parser_process.add_argument("project", help="The project name")
+    parser_process.add_argument("-w", "--workers", type=int, default=None,
+                                help="The number of processes used to process the files "
+                                     "(0 for one process per CPU, overrides the configuration)")
+    parser_process.add_argument("-s", "--single-pass", action="store_true",
+                                help="Discover, generate and anonymize in a single pass (phase 0 only)")
 
     parser_create = subparsers.add_parser('create', help="Create a new project")
     parser_create.add_argument("project", help="The project name")
@@ -144,22 +285,32 @@ if __name__ == '__main__':
     parser_archive = subparsers.add_parser('archive', help="Archive an existent project")
     parser_archive.add_argument("project", help="The project name")
 
+    parser_export = subparsers.add_parser('export', help="Export the data of a project to the YAML files")
+    parser_export.add_argument("project", help="The project name")
+
+    parser_import = subparsers.add_parser('import', help="Import the data of a project from the YAML files")
+    parser_import.add_argument("project", help="The project name")
+
     args = parser.parse_args()
 
     if args.action == "process":
         if not os.path.isdir("projects/" + args.project):
             parser.error("Project '{}' not exists".format(args.project))
             exit(1)
-        if args.phase == 0:
-            Sirano.pass_through(args.project)
+        if args.single_pass and args.phase != 0:
+            parser.error("The single pass mode is only available for the phase 0")
+        if args.phase == 0 and args.single_pass:
+            Sirano.single_pass(args.project)
+        elif args.phase == 0:
+            Sirano.pass_through(args.project, args.workers)
         elif args.phase == 1:
-            Sirano.phase_1(args.project)
+            Sirano.phase_1(args.project, args.workers)
         elif args.phase == 2:
             Sirano.phase_2(args.project)
         elif args.phase == 3:
-            Sirano.phase_3(args.project)
+            Sirano.phase_3(args.project, args.workers)
         elif args.phase == 4:
-            Sirano.phase_4(args.project)
+            Sirano.phase_4(args.project, args.workers)
     elif args.action == "create":
         Sirano.create(args.project)
     elif args.action == "archive":
@@ -167,3 +318,11 @@ if __name__ == '__main__':
             parser.error("Project '{}' not exists".format(args.project))
             exit(1)
         Sirano.archive(args.project)
+    elif args.action in ("export", "import"):
+        if not os.path.isdir("projects/" + args.project):
+            parser.error("Project '{}' not exists".format(args.project))
+            exit(1)
+        if args.action == "export":
+            Sirano.export_data(args.project)
+        else:
+            Sirano.import_data(args.project)
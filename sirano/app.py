@@ -74,6 +74,11 @@ class AppManager(AppBase):
         self.layer.configure()
         self.file.configure()
 
+    def reset_all(self):
+        """Reset the managers between two phases"""
+        self.data.reset()
+        self.file.reset()
+
 
 class ProjectPath(AppBase):
 
@@ -194,6 +199,13 @@ class App(object):
         self.phase = None
         """The current phase of the application"""
 
+        self.single_pass = False
+        """
+        Single pass mode, if True the values are discovered and their replacement values generated during the
+        anonymization phase
+        :type: True | False
+        """
+
         self.manager = None
         """
         Structure with all manager instances
@@ -219,6 +231,20 @@ class App(object):
         self.manager.data.load_all()
         self.packet = PacketAnonymizer(self)
 
+    def set_phase(self, phase):
+        """
+        Switch the loaded application to another phase
+
+        The configuration, the plugins and the data are kept in memory, only the logs and the report of the phase are
+        reset.
+        :param phase: The new phase
+        :type phase: int
+        """
+        self.phase = phase
+        self.__load_log()
+        self.manager.reset_all()
+        self.packet.reset()
+
     def save_report(self):
         self.report['project_name'] = self.project_name
         with open(os.path.join(self.project.report, 'report.json'), 'w+') as a_file:
@@ -2,17 +2,24 @@
 #
 # Copyright 2015 Loic Gremaud <loic.gremaud@grelinfo.ch>
 
-from collections import defaultdict
+from collections import defaultdict, Mapping
+from contextlib import contextmanager
+import hashlib
+import hmac
 import os
+import random
 import re
 import datetime
 
 import yaml
 
-from sirano.exception import InvalidValueDataException
+from sirano.exception import InvalidValueDataException, DataException, NamespaceExhaustedException
+from sirano.generator import UniqueGenerator
 
 from sirano.manager import Manager
+from sirano.storage import storages
 from sirano.utils import date_to_json, AppBase
+from sirano.word import WordPool
 
 
 class _DataMetaclass(type):
@@ -44,16 +51,40 @@ class DataManager(Manager):
     data_classes = None
     """Imported Data plugins, the key contain the name and the value contain the class"""
 
+    guess_cache_size = 65536
+    """The default maximum number of values in the memo of guess_data()"""
+
     def __init__(self, app):
         Manager.__init__(self, app)
 
         self.data = dict()
 
+        self.guesses = dict()
+        """
+        Memo of guess_data(), the Data instance guessed for each value and its replacement value if it is known
+        :type: dict[str, list[Data | str | None]]
+        """
+
+        self.cache_replacements = True
+        """
+        Store the replacement values in the memo of guess_data(), they are not stored in clean mode
+        :type: True | False
+        """
+
+        self.guess_report = None
+        """
+        The hits and the misses of the memo of guess_data() in the report
+        :type: dict[str, int]
+        """
+
     def configure(self):
         dirpath = os.path.dirname(__file__) + '/plugins/data/'
         for f in os.listdir(dirpath):
             if f not in ['.', '..', '__init__.py'] and f.endswith('.py'):
                 self.__create_data(f[:-3])
+        conf = self.conf.get('global', dict())
+        self.guess_cache_size = conf.get('guess-cache-size', self.guess_cache_size)
+        self.cache_replacements = conf.get('guess-cache-replacements', self.cache_replacements)
         self.__report_data_reset()
         self.app.log.debug("manager:data: Configured")
 
@@ -85,14 +116,23 @@ class DataManager(Manager):
 
         return d
 
+    def reset(self):
+        """Reset the report of all Data instance between two phases"""
+        self.guesses.clear()
+        self.__report_data_reset()
+        for d in self.data.values():
+            d.reset()
+
     def load_all(self):
         """Call load method for all Data instance"""
+        self.guesses.clear()
         for _, d in self.data.items():
             d.load()
 
     def process_all(self):
         """Call process method for all Data instance"""
         start = datetime.datetime.now()
+        self.guesses.clear()
         for _, d in self.data.items():
             d.process()
         end = datetime.datetime.now()
@@ -118,6 +158,54 @@ class DataManager(Manager):
             values[name] = data.find_values(string)
         return values
 
+    def set_record_mode_all(self, mode):
+        """
+        Set the record mode for all data
+        :param mode: True if the added values are recorded, False otherwise
+        :type mode: True | False
+        """
+        for name, data in self.data.items():
+            data.added_values = list() if mode else None
+
+    def pop_added_values_all(self):
+        """
+        Get and forget the values recorded by all data since the last call
+        :return: Dictionary with data name and added values
+        :rtype: dict[str, list[str]]
+        """
+        values = dict()
+        for name, data in self.data.items():
+            if data.added_values:
+                values[name] = data.added_values
+                data.added_values = list()
+        return values
+
+    def merge_added_values_all(self, values):
+        """
+        Add the values recorded by another process to all data
+        :param values: Dictionary with data name and added values
+        :type values: dict[str, list[str]]
+        """
+        for name, added_values in values.items():
+            data = self.data[name]
+            for value in added_values:
+                data.merge_value(value)
+
+    def open_journal_all(self):
+        """Start to journal the values added or replaced in all Data instance until they are saved"""
+        for d in self.data.values():
+            d.storage.open_journal()
+
+    def export_all(self):
+        """Write the data of all Data instance in their YAML file"""
+        for d in self.data.values():
+            d.storage.export_yaml()
+
+    def import_all(self):
+        """Replace the data stored by all Data instance by the content of their YAML file"""
+        for d in self.data.values():
+            d.storage.import_yaml()
+
     def set_clean_mode_all(self, mode):
         """
         Set the clean mode for all data
@@ -131,12 +219,50 @@ class DataManager(Manager):
         """
         Guess which Data class to use for the specified value
 
+        The guesses are memoized, the validation of a value depends only on the configuration.
         :param value: The value
         :type value: str
 
         :return the Data class
         :rtype Data
         """
+        entry = self.__guess(value)
+        if entry is not None:
+            return entry[0]
+
+    def __guess(self, value):
+        """
+        Get the entry of the memo of guess_data() for a value, it is added if the value is not in the memo
+        :param value: The value
+        :type value: str
+        :return: The entry, a list with the Data instance and the replacement value or None, or None if the value is
+        unknown or ambiguous
+        :rtype: list[Data | str | None] | None
+        """
+        entry = self.guesses.get(value)
+        if entry is not None:
+            self.guess_report['hits'] += 1
+            return entry
+        self.guess_report['misses'] += 1
+
+        d = self.__guess_data(value)
+        if d is None:
+            return None
+        entry = [d, None]
+        if self.guess_cache_size > 0:
+            if len(self.guesses) >= self.guess_cache_size:
+                self.guesses.clear()
+            self.guesses[value] = entry
+        return entry
+
+    def __guess_data(self, value):
+        """
+        Called by __guess() to validate a value with all Data instance
+        :param value: The value
+        :type value: str
+        :return: The Data instance or None if the value is unknown or ambiguous
+        :rtype: Data | None
+        """
         l = dict()
         for n, d in self.data.items():
             if d.is_valid(value):
@@ -177,10 +303,20 @@ class DataManager(Manager):
 
         :return The replacement value
         :rtype str
+        :raise DataException: The data type of the value is unknown or ambiguous
         """
 
-        d = self.guess_data(value)
-        return d.get_replacement(value)
+        entry = self.__guess(value)
+        if entry is None:
+            raise DataException("Data type unknown or ambiguous, value = '{}'".format(value))
+        d, replacement = entry
+        if replacement is not None and not d.clean_mode:
+            return replacement
+
+        replacement = d.get_replacement(value)
+        if self.cache_replacements and not d.clean_mode:
+            entry[1] = replacement
+        return replacement
 
     def report_data_increment(self, data, a_property):
         data_list = self.report.setdefault('data', list())
@@ -222,6 +358,9 @@ class DataManager(Manager):
             d['error'] = 0
             d['discovered'] = 0
             # Added is not reset for preserving the counter from the first discovery
+        self.guess_report = self.report.setdefault('guess', dict())
+        self.guess_report['hits'] = 0
+        self.guess_report['misses'] = 0
 
 
 class Data(AppBase):
@@ -248,6 +387,19 @@ class Data(AppBase):
         :type: dict[str, object]
         """
 
+        self.storage = self.__get_storage()
+        """
+        The storage backend of the data
+        :type: YamlStorage
+        """
+
+        self.lazy = False
+        """
+        Lazy mode, if True the sections of the data are loaded as mappings that look up the values on demand, the
+        Data plugin must not iterate over them unless it is required
+        :type: True | False
+        """
+
         self.data = None
         """Data from the YAML file"""
 
@@ -275,14 +427,37 @@ class Data(AppBase):
         :type: list
         """
 
+        self.added_values = None
+        """
+        Values added since the last call of DataManager.pop_added_values_all() or None if they are not recorded
+        :type: list[str] | None
+        """
+
+        self.secret = None
+        """
+        The secret key of the project if the keyed mode is enabled for this data, None otherwise
+        :type: str | None
+        """
+
+        self.generator = UniqueGenerator()
+        """
+        The generator of the unique replacement values
+        :type: UniqueGenerator
+        """
+
+        self.words = WordPool()
+        """
+        The pool of the pronounceable words used to generate the replacement values
+        :type: WordPool
+        """
+
     def load(self):
-        """Load data from the YAML file"""
+        """Load data from the storage"""
         self.app.log.debug("data:{}:load()".format(self.name))
         self.__data_report_reset()
 
-        if os.path.isfile(self.path):
-            with file(self.path) as f:  # Read only by default
-                self.data = yaml.load(f)
+        self.lazy = self.storage.lazy and self.__is_read_only()
+        self.data = self.storage.load(self.lazy)
 
         if self.data is None:
             self.data = defaultdict(dict)
@@ -294,8 +469,98 @@ class Data(AppBase):
             for exclusion in exclusions:
                 self.__exclusion.append(re.compile(exclusion, re.IGNORECASE))
 
+        self.secret = self.__get_secret()
+        self.generator = UniqueGenerator(self.conf.get('generation-retries', self.app.conf.get('data', dict()).get(
+            'global', dict()).get('generation-retries')))
+        self.words = WordPool(batch_size=1) if self.secret is not None else WordPool()
+
         self.post_load()
 
+    def __is_read_only(self):
+        """
+        Check if the data are loaded for a phase that does not save them
+        :return: True for the anonymization and the validation phases, False otherwise
+        :rtype: True | False
+        """
+        from sirano.app import Phase  # sirano.app imports this module
+        return self.app.phase in (Phase.phase_3, Phase.phase_4) and not self.app.single_pass
+
+    def __get_storage(self):
+        """
+        Create the storage backend given by the configuration data.global.storage
+        :return: The storage
+        :rtype: YamlStorage
+        :raise DataException: The storage is unknown
+        """
+        name = self.app.conf.get('data', dict()).get('global', dict()).get('storage', 'yaml')
+        if name not in storages:
+            raise DataException("Unknown storage '{}' for the data '{}', expected one of {}".format(
+                name, self.name, sorted(storages)))
+        return storages[name](self.path)
+
+    def __get_secret(self):
+        """
+        Get the secret key of the project if the keyed mode is enabled for this data
+        :return: The secret or None if the keyed mode is disabled
+        :rtype: str | None
+        :raise DataException: The keyed mode is enabled without secret
+        """
+        if not self.conf.get('keyed', False):
+            return None
+        secret = self.app.conf.get('data', dict()).get('global', dict()).get('secret')
+        if not secret:
+            raise DataException("The keyed mode of the data '{}' requires the secret 'data.global.secret'".format(
+                self.name))
+        return str(secret)
+
+    @contextmanager
+    def keyed_random(self, value):
+        """
+        Context in which the module random is seeded with a keyed hash of a value if the keyed mode is enabled
+
+        The replacement generated in this context depends only on the secret and the value, and on the replacements
+        already used if it must be generated again. The state of the module random is restored at the end.
+        :param value: The value
+        :type value: str
+        """
+        if self.secret is None:
+            yield
+            return
+
+        state = random.getstate()
+        random.seed(long(hmac.new(self.secret, self.name + '\x00' + value, hashlib.sha256).hexdigest(), 16))
+        try:
+            yield
+        finally:
+            random.setstate(state)
+
+    def generate_replacement(self, value, candidate, is_used, namespace=None):
+        """
+        Generate a replacement value that is not used for a value, in the keyed context of the value
+        :param value: The value
+        :type value: str
+        :param candidate: The function that draws a random candidate with the module random
+        :type candidate: () -> str
+        :param is_used: The function that checks if a candidate is already used or not valid, it must be backed by an
+        index
+        :type is_used: (str) -> bool
+        :param namespace: All the candidates or None if they cannot be enumerated
+        :type namespace: Namespace | None
+        :return: The replacement value
+        :rtype: str
+        :raise NamespaceExhaustedException: No unused replacement value can be generated
+        """
+        with self.keyed_random(value):
+            try:
+                return self.generator.generate(candidate, is_used, namespace)
+            except NamespaceExhaustedException as e:
+                raise NamespaceExhaustedException("Fail to generate a replacement value, data = '{}', value = '{}': "
+                                                  "{}".format(self.name, value, e.message))
+
+    def reset(self):
+        """Reset the report between two phases"""
+        self.__data_report_reset()
+
     def post_load(self):
         """
         Method called after loading data
@@ -315,7 +580,7 @@ class Data(AppBase):
         pass
 
     def save(self):
-        """Save data to the YAML file"""
+        """Save data to the storage, the journal is compacted and closed"""
 
         self.manager.report_stats(self)
 
@@ -323,11 +588,25 @@ class Data(AppBase):
 
         self.app.log.debug('data:{}:save()'.format(self.name))
 
-        with open(self.path, 'w') as f:
-            yaml.dump(dict(self.data), f, default_flow_style=False)
+        self.storage.save(self.data)
 
         self.app.log.debug("data:{}: Data saved: File \"{}\"".format(self.name, self.path))
 
+    def journal(self, section, key, value):
+        """
+        Journal a value as it is added or replaced, in the format of the section in the saved data
+
+        The values of a worker process are journaled by the main process when they are merged.
+        :param section: The section of the data, like 'hosts'
+        :type section: str
+        :param key: The key in the section
+        :type key: str
+        :param value: The value in the section
+        :type value: str | None
+        """
+        if self.added_values is None:
+            self.storage.journal(section, key, value)
+
     def process(self):
         """
         Process data
@@ -336,6 +615,17 @@ class Data(AppBase):
         """
         raise NotImplementedError
 
+    def process_value(self, value):
+        """
+        Process a single value
+
+        This method must be overridden for the single pass mode. It generates the replacement value for the specified
+        value if it does not already have one.
+        :param value: The value added with add_value()
+        :type value: str
+        """
+        raise NotImplementedError
+
     def add_value(self, value, validate=True):
         """
         Add a value to the data
@@ -352,7 +642,12 @@ class Data(AppBase):
             try:
                 added = self._add_value(value)
                 if added:
-                    self.manager.report_data_increment(self, 'added')
+                    if self.added_values is not None:
+                        self.added_values.append(value)  # The 'added' counter is incremented by merge_value()
+                    else:
+                        self.manager.report_data_increment(self, 'added')
+                if self.app.single_pass:
+                    self.process_value(value)
                 self.manager.report_data_increment(self, 'discovered')
                 return added
             except Exception:
@@ -362,6 +657,18 @@ class Data(AppBase):
             self.manager.report_data_increment(self, 'invalid')
             raise InvalidValueDataException("data = '{}', value = '{}'".format(self.name, value))
 
+    def merge_value(self, value):
+        """
+        Add a value already validated and recorded by another process
+        :param value: The value to add
+        :type value: str
+        :return True if the value is added | False otherwise
+        """
+        added = self._add_value(value)
+        if added:
+            self.manager.report_data_increment(self, 'added')
+        return added
+
     def _add_value(self, value):
         """
         Method called by add_value()
@@ -441,6 +748,9 @@ class Data(AppBase):
         # Set default value if not exist or None
         if (name not in self.data) or (self.data[name] is None):
             self.data[name] = default()
+        # Convert a loaded dict to another mapping, like ReplacementDict
+        elif issubclass(default, Mapping) and type(self.data[name]) is dict and default is not dict:
+            self.data[name] = default(self.data[name])
         return self.data[name]
 
     def get_number_of_values(self):
@@ -461,12 +771,34 @@ class Data(AppBase):
         :return: The list of values
         :rtype: list[str]
         """
+        return self._find_values(self.prepare_find(string))
+
+    def prepare_find(self, string):
+        """
+        Prepare a string for the search of values, the new lines are replaced and the exclusions are removed
+
+        The exclusions are global, so the prepared string is the same for all Data instances.
+        :param string: The string
+        :type string: str
+        :return: The prepared string
+        :rtype: str
+        """
         string = string.replace('\n', ' ').replace('\r', ' ')  # Remove new line
 
         for re_exclusion in self.__exclusion:
             for exclusion in re_exclusion.findall(string):
                 string = string.replace(exclusion, '')
 
+        return string
+
+    def find_prepared_values(self, string):
+        """
+        Find values present in a string already prepared by prepare_find()
+        :param string: The prepared string
+        :type string: str
+        :return: The list of values
+        :rtype: list[str]
+        """
         return self._find_values(string)
 
     def _find_values(self, string):
@@ -515,7 +847,7 @@ class Data(AppBase):
         data.append({'value': value, 'replacement': replacement})
 
     def __data_report_reset(self):
-        if self.app.phase == 2:
+        if self.app.phase == 2 or self.app.single_pass:
             # Processing
             data = self.report.setdefault('processing', list())
             for d in data:
@@ -526,3 +858,102 @@ class Data(AppBase):
             # Values
             self.report['values'] = dict()
 
+
+class ReplacementDict(dict):
+    """
+    Dictionary of values with their replacement that indexes the replacements
+
+    The replacements are counted in a reverse index kept in sync by all the methods that modify the dictionary, so
+    has_replacement() does not scan the values. It is saved in the YAML files like a dict.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ReplacementDict, self).__init__(*args, **kwargs)
+
+        self.replacements = dict()
+        """
+        The number of values for each replacement
+        :type: dict[str, int]
+        """
+
+        self.__count(self.itervalues())
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.__discard(dict.__getitem__(self, key))
+        dict.__setitem__(self, key, value)
+        self.replacements[value] = self.replacements.get(value, 0) + 1
+
+    def __delitem__(self, key):
+        value = dict.__getitem__(self, key)
+        dict.__delitem__(self, key)
+        self.__discard(value)
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = dict.pop(self, key)
+            self.__discard(value)
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self.__discard(value)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        for key in other:
+            if key in self:
+                self.__discard(dict.__getitem__(self, key))
+        dict.update(self, other)
+        self.__count(other.itervalues())
+
+    def clear(self):
+        dict.clear(self)
+        self.replacements.clear()
+
+    def copy(self):
+        return self.__class__(self)
+
+    def has_replacement(self, replacement):
+        """
+        Check if a value has the specified replacement
+        :param replacement: The replacement
+        :type replacement: str
+        :return: True if a value has this replacement, False otherwise
+        :rtype: True | False
+        """
+        return replacement in self.replacements
+
+    def __discard(self, replacement):
+        """
+        Remove a replacement from the index
+        :param replacement: The replacement
+        :type replacement: str
+        """
+        count = self.replacements[replacement] - 1
+        if count > 0:
+            self.replacements[replacement] = count
+        else:
+            del self.replacements[replacement]
+
+    def __count(self, replacements):
+        """
+        Add replacements to the index
+        :param replacements: The replacements
+        :type replacements: collections.Iterable[str]
+        """
+        for replacement in replacements:
+            self.replacements[replacement] = self.replacements.get(replacement, 0) + 1
+
+
+yaml.add_representer(ReplacementDict, yaml.representer.SafeRepresenter.represent_dict)
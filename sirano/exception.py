@@ -66,6 +66,13 @@ class ValueNotFoundException(DataException):
     pass
 
 
+class NamespaceExhaustedException(DataException):
+    """
+    Exception when no unused replacement value can be generated for a value of a data plugin
+    """
+    pass
+
+
 class UnsupportedFormatException(ActionException):
     """
     Exception when the format of a value is invalid
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from itertools import islice
+import socket
+import struct
+
+from scapy.config import conf
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.l2 import Ether
+from scapy.layers.rtp import RTP
+from scapy.packet import Packet
+from scapy.utils import checksum, mac2str, str2mac
+
+from sirano.packet import AnonymizeLayerAction, PassLayerAction
+from sirano.utils import AppBase
+
+
+class FastPathAnonymizer(AppBase):
+    """
+    Anonymize the Ethernet, IPv4, UDP, TCP and RTP packets directly in the raw bytes
+
+    The result is the same as the dissection, the anonymization and the build of the packet with scapy. The packets
+    that are not supported are returned as None and must be anonymized with the PacketAnonymizer.
+    """
+
+    supported_fields = {
+        'Ether': {'dst': ('mac-address',),
+                  'src': ('mac-address',)},
+        'IP': {'len': ('reset',),
+               'chksum': ('reset',),
+               'src': ('ip-address',),
+               'dst': ('ip-address',)},
+        'TCP': {'chksum': ('reset',)},
+        'UDP': {'len': ('reset',),
+                'chksum': ('reset',)},
+        'RTP': {},
+        'RawPayload': {'content': ('raw-payload',)},
+        'Padding': {}
+    }
+    """The actions supported for each layer and field in addition to the action 'pass'"""
+
+    tcp_option_mood = 25
+    """The only TCP option that scapy does not rebuild without change"""
+
+    batch_size = 4096
+    """The number of records of a batch for the lookup of the addresses"""
+
+    def __init__(self, app, flows=None):
+        """
+        :param app: The application instance
+        :type app: App
+        :param flows: The media flows used to decode the RTP datagrams, None to use only the layer bindings
+        :type flows: MediaFlowTable | None
+        """
+        super(FastPathAnonymizer, self).__init__(app)
+
+        self.flows = flows
+        """
+        The media flows used to decode the RTP datagrams, None to use only the layer bindings
+        :type: MediaFlowTable | None
+        """
+
+        self.ip = self.app.manager.data.get_data('ip')
+        """
+        The IP data plugin
+        :type: IPData
+        """
+
+        self.mac = self.app.manager.data.get_data('mac')
+        """
+        The MAC data plugin
+        :type: MACData
+        """
+
+        self.layers = dict()
+        """
+        The actions of the supported layers, the key contain the layer name and the value contain the fields with
+        their action name, the fields with the action 'pass' are omitted
+        :type: dict[str, dict[str, str]]
+        """
+
+        for name in self.supported_fields:
+            actions = self.__get_layer_actions(name)
+            if actions is not None:
+                self.layers[name] = actions
+
+        self.raw_payload_class = self.app.manager.layer.get_layer_class('RawPayload')
+        """
+        The class of the RawPayload layer
+        :type: type
+        """
+
+        self.raw_payload_action = self.app.manager.action.get_action('raw-payload')
+        """
+        The action that anonymize the content of the RTP payloads
+        :type: Action
+        """
+
+        self.enabled = all(name in self.layers for name in ['Ether', 'IP'])
+        """
+        True if the Ether and IP layers are supported by the configuration
+        :type: True | False
+        """
+
+        self.binding_fields = dict()
+        """
+        The names of the fields used by the layer bindings of a layer class
+        :type: dict[type, list[str]]
+        """
+
+        self.payload_classes = dict()
+        """
+        Cache of the payload classes, the key contain the layer class with the values of the binding fields
+        :type: dict[tuple, type | None]
+        """
+
+        self.ip_replacements = dict()
+        """
+        Cache of the IP address replacements in binary format
+        :type: dict[str, str]
+        """
+
+        self.mac_replacements = dict()
+        """
+        Cache of the MAC address replacements in binary format
+        :type: dict[str, str]
+        """
+
+    def iter_batches(self, records):
+        """
+        Iterate the records, the replacements of the addresses of each batch are looked up before its first record
+        :param records: The records with the raw packet in the first item
+        :type records: collections.Iterable[(str, object)]
+        :return: The records
+        :rtype: collections.Iterable[(str, object)]
+        """
+        records = iter(records)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if len(batch) == 0:
+                return
+            self.prefetch(batch)
+            for record in batch:
+                yield record
+
+    def prefetch(self, records):
+        """
+        Look up in batch the replacements of the Ethernet and IPv4 addresses of raw packets that are not in the caches
+
+        The unknown addresses are not cached, the packets that contain them are handled like before by anonymize().
+        :param records: The records with the raw packet in the first item
+        :type records: collections.Iterable[(str, object)]
+        """
+        if not self.enabled:
+            return
+
+        macs = set()
+        ips = set()
+        for record in records:
+            data = record[0]
+            if len(data) < 34:
+                continue
+            macs.add(data[0:6])
+            macs.add(data[6:12])
+            if data[12:15] == '\x08\x00\x45':  # IPv4 without options
+                ips.add(data[26:30])
+                ips.add(data[30:34])
+
+        if 'src' in self.layers['Ether'] or 'dst' in self.layers['Ether']:
+            macs = [mac for mac in macs if mac not in self.mac_replacements]
+            integers = [int(mac.encode('hex'), 16) for mac in macs]
+            replacements, unknown = self.mac.get_replacements(integers)
+            for mac, replacement, missing in zip(macs, replacements, unknown):
+                if not missing:
+                    self.mac_replacements[mac] = ('%012x' % replacement).decode('hex')
+
+        if 'src' in self.layers['IP'] or 'dst' in self.layers['IP']:
+            ips = [ip for ip in ips if ip not in self.ip_replacements]
+            integers = [struct.unpack('!I', ip)[0] for ip in ips]
+            replacements, unknown = self.ip.get_replacements(integers)
+            for ip, replacement, missing in zip(ips, replacements, unknown):
+                if not missing:
+                    self.ip_replacements[ip] = struct.pack('!I', replacement)
+
+    def anonymize(self, data, time):
+        """
+        Anonymize a raw Ethernet packet
+        :param data: The raw packet
+        :type data: str
+        :param time: The time of the packet
+        :type time: float
+        :return: The anonymized packet or None if the packet is not supported
+        :rtype: str | None
+        """
+        if not self.enabled or len(data) < 34:
+            return None
+
+        try:
+            return self.__anonymize(data, time)
+        except Exception as e:
+            # The packet will be anonymized by scapy, that reports the error if necessary
+            self.app.log.debug("fastpath: Packet not supported, exception = '{}', message = '{}'".format(
+                type(e).__name__, e.message))
+            return None
+
+    def __anonymize(self, data, time):
+        """
+        Anonymize a raw Ethernet packet, see anonymize()
+        """
+        names = ['Ether', 'IP']
+
+        # Ethernet
+        ether_type, = struct.unpack('!H', data[12:14])
+        if ether_type <= 1500:  # Dissected as Dot3 by scapy
+            return None
+        ether_values = {'dst': str2mac(data[0:6]), 'src': str2mac(data[6:12]), 'type': ether_type}
+        if self.__get_payload_class(Ether, ether_values) is not IP:
+            return None
+        ether = self.__anonymize_ether(data[:14])
+
+        # IPv4 without options
+        ip = data[14:34]
+        version_ihl, tos, ip_len, ip_id, flags_frag, ttl, proto, ip_chksum = struct.unpack('!BBHHHBBH', ip[:12])
+        if version_ihl != 0x45 or ip_len < 20:
+            return None
+        segment = data[34:14 + ip_len]
+        padding = data[14 + ip_len:]
+
+        if len(padding) > 0 and 'Padding' not in self.layers:
+            return None
+
+        if len(segment) == 0:
+            l4_class = None
+            l4 = ''
+        else:
+            flow = (socket.inet_ntoa(ip[12:16]), socket.inet_ntoa(ip[16:20]), time)
+            l4_class = self.__get_payload_class(IP, {'version': 4, 'ihl': 5, 'tos': tos, 'len': ip_len, 'id': ip_id,
+                                                     'flags': flags_frag >> 13, 'frag': flags_frag & 0x1fff,
+                                                     'ttl': ttl, 'proto': proto, 'chksum': ip_chksum,
+                                                     'src': flow[0], 'dst': flow[1], 'options': []})
+            if l4_class not in (TCP, UDP) or l4_class.__name__ not in self.layers:
+                return None
+
+        ip_actions = self.layers['IP']
+        src = self.__anonymize_ip(ip_actions, 'src', ip[12:16])
+        dst = self.__anonymize_ip(ip_actions, 'dst', ip[16:20])
+
+        if l4_class is TCP:
+            l4 = self.__anonymize_tcp(segment, src, dst, proto, ip_len, names)
+        elif l4_class is UDP:
+            l4 = self.__anonymize_udp(segment, src, dst, proto, ip_len, names, flow)
+
+        if l4 is None:
+            return None
+
+        if len(padding) > 0:
+            names.append('Padding')
+
+        if ip_actions.get('len') == 'reset':
+            ip_len = 20 + len(l4)
+        ip = ip[:2] + struct.pack('!H', ip_len) + ip[4:10] + '\x00\x00' + src + dst
+        if ip_actions.get('chksum') == 'reset':
+            ip_chksum = checksum(ip)
+        ip = ip[:10] + struct.pack('!H', ip_chksum) + ip[12:]
+
+        self.app.packet.report_anonymized(names)
+
+        return ether + ip + l4 + padding
+
+    def __anonymize_ether(self, ether):
+        """
+        Anonymize the Ethernet header
+        :param ether: The raw header
+        :type ether: str
+        :return: The anonymized header
+        :rtype: str
+        """
+        actions = self.layers['Ether']
+        dst = ether[0:6]
+        src = ether[6:12]
+        if 'dst' in actions:
+            dst = self.__get_mac_replacement(dst)
+        if 'src' in actions:
+            src = self.__get_mac_replacement(src)
+        return dst + src + ether[12:14]
+
+    def __anonymize_ip(self, actions, field, address):
+        """
+        Anonymize an IPv4 address field
+        :param actions: The actions of the IP layer
+        :type actions: dict[str, str]
+        :param field: The field name
+        :type field: str
+        :param address: The binary address
+        :type address: str
+        :return: The binary address anonymized
+        :rtype: str
+        """
+        if field in actions:
+            return self.__get_ip_replacement(address)
+        return address
+
+    def __anonymize_tcp(self, segment, src, dst, proto, ip_len, names):
+        """
+        Anonymize a TCP segment without payload
+        :param segment: The raw segment
+        :type segment: str
+        :param src: The source address of the IP layer, already anonymized
+        :type src: str
+        :param dst: The destination address of the IP layer, already anonymized
+        :type dst: str
+        :param proto: The protocol of the IP layer
+        :type proto: int
+        :param ip_len: The original length of the IP layer
+        :type ip_len: int
+        :param names: The names of the layers, the names of the anonymized layers are appended
+        :type names: list[str]
+        :return: The anonymized segment or None if it is not supported
+        :rtype: str | None
+        """
+        if len(segment) < 20:
+            return None
+        length = (ord(segment[12]) >> 4) * 4
+        if length < 20 or length != len(segment) or not self.__is_tcp_options_rebuilt(segment[20:length]):
+            return None
+        if self.layers['TCP'].get('chksum') == 'reset':
+            segment = segment[:16] + '\x00\x00' + segment[18:]
+            ck = checksum(self.__get_pseudo_header(segment, src, dst, proto, ip_len) + segment)
+            segment = segment[:16] + struct.pack('!H', ck) + segment[18:]
+        names.append('TCP')
+        return segment
+
+    def __anonymize_udp(self, segment, src, dst, proto, ip_len, names, flow):
+        """
+        Anonymize a UDP datagram without payload or with a RTP payload
+        :param segment: The raw datagram
+        :type segment: str
+        :param src: The source address of the IP layer, already anonymized
+        :type src: str
+        :param dst: The destination address of the IP layer, already anonymized
+        :type dst: str
+        :param proto: The protocol of the IP layer
+        :type proto: int
+        :param ip_len: The original length of the IP layer
+        :type ip_len: int
+        :param names: The names of the layers, the names of the anonymized layers are appended
+        :type names: list[str]
+        :param flow: The original source and destination addresses of the IP layer with the time of the packet
+        :type flow: (str, str, float)
+        :return: The anonymized datagram or None if it is not supported
+        :rtype: str | None
+        """
+        if len(segment) < 8:
+            return None
+        header = segment[:8]
+        payload = segment[8:]
+        payload_names = list()
+
+        if len(payload) > 0:
+            sport, dport, udp_len, udp_chksum = struct.unpack('!HHHH', header)
+            values = {'sport': sport, 'dport': dport, 'len': udp_len, 'chksum': udp_chksum}
+            payload_class = self.__get_payload_class(UDP, values)
+            if payload_class is conf.raw_layer and self.flows is not None and \
+                    self.flows.is_decoded(values, flow[0], flow[1], flow[2]):
+                payload_class = RTP
+            if payload_class is not RTP or 'RTP' not in self.layers:
+                return None
+            payload = self.__anonymize_rtp(payload, payload_names)
+            if payload is None:
+                return None
+
+        actions = self.layers['UDP']
+        if actions.get('len') == 'reset':
+            header = header[:4] + struct.pack('!H', 8 + len(payload)) + header[6:]
+        if actions.get('chksum') == 'reset':
+            header = header[:6] + '\x00\x00'
+            ck = checksum(self.__get_pseudo_header(header + payload, src, dst, proto, ip_len) + header + payload)
+            header = header[:6] + struct.pack('!H', ck)
+
+        names.append('UDP')
+        names.extend(payload_names)
+        return header + payload
+
+    def __anonymize_rtp(self, payload, names):
+        """
+        Anonymize a RTP packet, the header is kept and the content of the payload is replaced
+        :param payload: The raw RTP packet
+        :type payload: str
+        :param names: The names of the layers, the names of the anonymized layers are appended
+        :type names: list[str]
+        :return: The anonymized RTP packet or None if it is not supported
+        :rtype: str | None
+        """
+        if len(payload) < 12:
+            return None
+        first, second, sequence, timestamp, sourcesync = struct.unpack('!BBHII', payload[:12])
+        numsync = first & 0x0f
+        length = 12 + 4 * numsync
+        if len(payload) < length:
+            return None
+
+        names.append('RTP')
+        content = payload[length:]
+        if len(content) == 0:
+            return payload
+
+        values = {'version': first >> 6, 'padding': (first >> 5) & 1, 'extension': (first >> 4) & 1,
+                  'numsync': numsync, 'marker': second >> 7, 'payload_type': second & 0x7f, 'sequence': sequence,
+                  'timestamp': timestamp, 'sourcesync': sourcesync,
+                  'sync': list(struct.unpack('!{}I'.format(numsync), payload[12:length]))}
+        if self.__get_payload_class(RTP, values) is not self.raw_payload_class or 'RawPayload' not in self.layers:
+            return None
+
+        if 'content' in self.layers['RawPayload']:
+            content = self.raw_payload_action.anonymize(content)
+
+        names.append('RawPayload')
+        return payload[:length] + content
+
+    def __get_pseudo_header(self, segment, src, dst, proto, ip_len):
+        """
+        Get the pseudo header for the checksum of TCP and UDP, the length is computed like scapy
+        :return: The pseudo header
+        :rtype: str
+        """
+        if self.layers['IP'].get('len') == 'reset':
+            length = len(segment)
+        else:
+            length = ip_len - 20
+        return struct.pack('!4s4sHH', src, dst, proto, length)
+
+    def __is_tcp_options_rebuilt(self, options):
+        """
+        Check if scapy rebuilds the TCP options without change
+        :param options: The raw options
+        :type options: str
+        :return: True if the options are rebuilt without change, False otherwise
+        :rtype: True | False
+        """
+        index = 0
+        while index < len(options):
+            kind = ord(options[index])
+            if kind == 0:  # End of option list, the remaining bytes must be the padding
+                return len(options) - index <= 4 and options[index:].strip('\x00') == ''
+            if kind == 1:
+                index += 1
+                continue
+            if index + 1 >= len(options):
+                return False
+            length = ord(options[index + 1])
+            if length < 2 or index + length > len(options) or kind == self.tcp_option_mood:
+                return False
+            index += length
+        return True
+
+    def __get_ip_replacement(self, address):
+        """
+        Get the replacement of a binary IPv4 address
+        :param address: The binary address
+        :type address: str
+        :return: The binary replacement
+        :rtype: str
+        """
+        try:
+            return self.ip_replacements[address]
+        except KeyError:
+            replacement = socket.inet_aton(self.ip.get_replacement(socket.inet_ntoa(address)))
+            self.ip_replacements[address] = replacement
+            return replacement
+
+    def __get_mac_replacement(self, address):
+        """
+        Get the replacement of a binary MAC address
+        :param address: The binary address
+        :type address: str
+        :return: The binary replacement
+        :rtype: str
+        """
+        try:
+            return self.mac_replacements[address]
+        except KeyError:
+            replacement = mac2str(self.mac.get_replacement(str2mac(address)))
+            if len(replacement) != 6:
+                raise ValueError("Invalid MAC replacement, value = '{}'".format(str2mac(address)))
+            self.mac_replacements[address] = replacement
+            return replacement
+
+    def __get_payload_class(self, cls, values):
+        """
+        Get the payload class chosen by the scapy layer bindings
+        :param cls: The class of the layer
+        :type cls: type
+        :param values: The values of the fields of the layer
+        :type values: dict[str, object]
+        :return: The payload class or None if it cannot be found without scapy
+        :rtype: type | None
+        """
+        names = self.binding_fields.get(cls)
+        if names is None:
+            names = sorted(set(name for fields, _ in cls.payload_guess for name in fields))
+            self.binding_fields[cls] = names
+
+        if any(name not in values for name in names):
+            return None
+
+        key = (cls,) + tuple(values[name] for name in names)
+        try:
+            return self.payload_classes[key]
+        except KeyError:
+            pass
+
+        payload_class = conf.raw_layer
+        for fields, a_cls in cls.payload_guess:
+            if all(values[name] == value for name, value in fields.items()):
+                payload_class = a_cls
+                break
+
+        if cls.guess_payload_class.im_func is not Packet.guess_payload_class.im_func:
+            payload_class = None
+
+        self.payload_classes[key] = payload_class
+        return payload_class
+
+    def __get_layer_actions(self, name):
+        """
+        Get the actions of a layer if they are supported
+        :param name: The layer name
+        :type name: str
+        :return: The fields with their action name or None if the layer is not supported
+        :rtype: dict[str, str] | None
+        """
+        layer_action = self.app.packet.layers[name]
+        if isinstance(layer_action, PassLayerAction):
+            return dict()
+        if not isinstance(layer_action, AnonymizeLayerAction):
+            return None
+
+        layer_class = self.app.manager.layer.get_layer_class(name)
+        if layer_class is None:
+            return None
+        supported = self.supported_fields[name]
+        actions = dict()
+        for field in layer_class.fields_desc:
+            action = layer_action.fields[field.name.lower()].name
+            if action == 'pass':
+                continue
+            if action not in supported.get(field.name, ()):
+                self.app.log.debug("fastpath: Layer not supported, layer = '{}', field = '{}', action = '{}'".format(
+                    name, field.name, action))
+                return None
+            actions[field.name] = action
+        return actions
@@ -2,11 +2,19 @@
 #
 # Copyright 2015 Loic Gremaud <loic.gremaud@grelinfo.ch>
 
+import copy
+import multiprocessing
 import os
 import datetime
 
 from sirano.manager import Manager
-from sirano.utils import date_to_json
+from sirano.utils import date_to_json, report_delta, report_merge
+
+sirano_file_manager = None
+"""
+The file manager inherited by the worker processes
+:type: FileManager
+"""
 
 
 class _FiletypeMetaclass(type):
@@ -67,6 +75,12 @@ class FileManager(Manager):
         :type: str
         """
 
+        self.workers = app.conf.setdefault('parallel', dict()).get('workers', 1)
+        """
+        The number of processes used to process the files, 0 for one process per CPU
+        :type: int
+        """
+
     def configure(self):
         if isinstance(self.conf, dict):
             for name, data in self.conf.items():
@@ -111,6 +125,10 @@ class FileManager(Manager):
         self.app.log.critical("manager:file: File type not detected for \"%s\"", path)
         return None
 
+    def reset(self):
+        """Reset between two phases, the files already added are kept"""
+        self.current_file = None
+
     def add_files(self):
         """Adds all files that are in the input file"""
 
@@ -141,13 +159,7 @@ class FileManager(Manager):
     def anonymize_all(self):
         """Launch the anonymize method for all files"""
         start = datetime.datetime.now()
-        for f in self.files:
-            self.current_file = f.file
-            f_start = datetime.datetime.now()
-            f.anonymize()
-            f_end = datetime.datetime.now()
-            self.__report_update_file(f.file, {'anonymize_duration': date_to_json(f_end - f_start)})
-
+        self.__process_all('anonymize')
         end = datetime.datetime.now()
         self.app.report_update_phase('Anonymize', {'start': date_to_json(start),
                                                    'end': date_to_json(end),
@@ -156,13 +168,7 @@ class FileManager(Manager):
     def discover_all(self):
         """Launch the discover method for all files"""
         start = datetime.datetime.now()
-        for f in self.files:
-            self.current_file = f.file
-            f_start = datetime.datetime.now()
-            f.discover()
-            f_end = datetime.datetime.now()
-            self.__report_update_file(f.file, {'discover_duration': date_to_json(f_end - f_start)})
-
+        self.__process_all('discover')
         end = datetime.datetime.now()
         self.app.report_update_phase('Discover', {'start': date_to_json(start),
                                                   'end': date_to_json(end),
@@ -171,17 +177,110 @@ class FileManager(Manager):
     def validate_all(self):
         """Launch the validate method for all files"""
         start = datetime.datetime.now()
+        self.__process_all('validate')
+        end = datetime.datetime.now()
+        self.app.report_update_phase('Validate', {'start': date_to_json(start),
+                                                  'end': date_to_json(end),
+                                                  'duration': date_to_json(end - start)})
+
+    def get_number_of_workers(self, tasks):
+        """
+        Get the number of worker processes to use
+
+        The single pass mode always uses one process because the replacement values are generated during the
+        anonymization.
+        :param tasks: The number of tasks to process
+        :type tasks: int
+        :return: The number of processes
+        :rtype: int
+        """
+        if self.app.single_pass:
+            return 1
+        workers = self.workers
+        if not workers:  # 0 or None
+            workers = multiprocessing.cpu_count()
+        return min(workers, tasks)
+
+    def __process_all(self, method):
+        """
+        Launch a method for all files in the priority order
+
+        The files that use their own worker processes are processed one by one by the main process, the files between
+        them are processed together.
+        :param method: The name of the File method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        """
+        for f in self.files:
+            f.prepare(method)
+
+        files = list()
         for f in self.files:
+            if f.is_parallel(method):
+                self.__process_files(method, files)
+                self.__process_all_serial(method, [f])
+                files = list()
+            else:
+                files.append(f)
+        self.__process_files(method, files)
+
+    def __process_files(self, method, files):
+        """
+        Launch a method for the files with a pool of worker processes if more than one worker is configured
+        :param method: The name of the File method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        :param files: The files to process
+        :type files: list[File]
+        """
+        if self.get_number_of_workers(len(files)) > 1:
+            self.__process_all_parallel(method, files)
+        else:
+            self.__process_all_serial(method, files)
+
+    def __process_all_serial(self, method, files):
+        """
+        Launch a method for the files one after another
+        :param method: The name of the File method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        :param files: The files to process
+        :type files: list[File]
+        """
+        for f in files:
             self.current_file = f.file
             f_start = datetime.datetime.now()
-            f.validate()
+            getattr(f, method)()
             f_end = datetime.datetime.now()
-            self.__report_update_file(f.file, {'validate_duration': date_to_json(f_end - f_start)})
+            self.__report_update_file(f.file, {method + '_duration': date_to_json(f_end - f_start)})
 
-        end = datetime.datetime.now()
-        self.app.report_update_phase('Validate', {'start': date_to_json(start),
-                                                  'end': date_to_json(end),
-                                                  'duration': date_to_json(end - start)})
+    def __process_all_parallel(self, method, files):
+        """
+        Launch a method for the files with a pool of worker processes
+
+        The workers are forked from this process, the changes of the report and the values added to the Data plugins
+        are sent back and merged in the file order to obtain the same result than a serial processing.
+        :param method: The name of the File method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        :param files: The files to process
+        :type files: list[File]
+        """
+        global sirano_file_manager
+        sirano_file_manager = self
+
+        workers = self.get_number_of_workers(len(files))
+        self.app.log.info("manager:file: Process {} files with {} workers".format(len(files), workers))
+
+        pool = multiprocessing.Pool(workers, init_worker, (self.app,))
+        try:
+            tasks = [(self.files.index(f), method) for f in files]
+            for f, (duration, delta, values) in zip(files, pool.imap(_process_file, tasks)):
+                merge_worker_task(self.app, delta, values)
+                self.__report_update_file(f.file, {method + '_duration': duration})
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            sirano_file_manager = None
 
     def __report_update_file(self, name, values):
         """
@@ -203,6 +302,67 @@ class FileManager(Manager):
         entry.update(values)
 
 
+def init_worker(app):
+    """
+    Initialize a worker process forked from the main process
+    :param app: The application instance
+    :type app: App
+    """
+    app.manager.data.set_record_mode_all(True)
+
+
+def run_worker_task(app, function, *args):
+    """
+    Run a function in a worker process and collect the changes to send back to the main process
+    :param app: The application instance
+    :type app: App
+    :param function: The function to run
+    :param args: The arguments of the function
+    :return: The result of the function, the changes of the report and the values added to the Data plugins
+    :rtype: (object, dict | None, dict[str, list[str]])
+    """
+    report = copy.deepcopy(app.report)
+    result = function(*args)
+    return result, report_delta(report, app.report), app.manager.data.pop_added_values_all()
+
+
+def merge_worker_task(app, delta, values):
+    """
+    Merge in the main process the changes collected by run_worker_task()
+    :param app: The application instance
+    :type app: App
+    :param delta: The changes of the report
+    :type delta: dict | None
+    :param values: The values added to the Data plugins
+    :type values: dict[str, list[str]]
+    """
+    if delta is not None:
+        report_merge(app.report, delta)
+    app.manager.data.merge_added_values_all(values)
+
+
+def _process_file(task):
+    """
+    Launch a method for a file in a worker process
+    :param task: The index of the file and the name of the method
+    :type task: (int, str)
+    :return: The duration, the changes of the report and the values added to the Data plugins
+    :rtype: (str, dict | None, dict[str, list[str]])
+    """
+    index, method = task
+    manager = sirano_file_manager
+    f = manager.files[index]
+    manager.current_file = f.file
+
+    def process():
+        f_start = datetime.datetime.now()
+        getattr(f, method)()
+        f_end = datetime.datetime.now()
+        return date_to_json(f_end - f_start)
+
+    return run_worker_task(manager.app, process)
+
+
 class File:
     """Superclass for all actions"""
 
@@ -286,6 +446,31 @@ class File:
         """
         raise NotImplementedError
 
+    def is_parallel(self, method):
+        """
+        Check if the file uses its own worker processes for the specified method
+
+        Such a file is processed by the main process. Can be overridden.
+
+        :param method: The name of the method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        :return: True if the file uses its own worker processes, False otherwise
+        :rtype: True | False
+        """
+        return False
+
+    def prepare(self, method):
+        """
+        Prepare the processing of the file by the specified method
+
+        Called by the main process for all files before any file is processed, so the state prepared here is inherited
+        by the worker processes. Can be overridden.
+
+        :param method: The name of the method ('discover', 'anonymize' or 'validate')
+        :type method: str
+        """
+        pass
+
     def __get_size(self):
         """
         Get the size of the file
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from bisect import bisect_right, insort
+import re
+
+from scapy.config import conf
+from scapy.layers.inet import UDP
+from scapy.layers.rtp import RTP
+from scapy.packet import NoPayload
+
+from sirano.plugins.layers.sip import SDP
+
+
+class MediaFlowTable(object):
+    """
+    Table of the RTP and RTCP flows negotiated by the SDP descriptions
+
+    The ports of the lines m= are added with the address of the line c= and the time of the packet. A flow is valid
+    from this time until the timeout, so the result does not depend on the order the files are processed. The UDP
+    datagrams that are not bound to a layer by scapy are decoded as RTP only if they belong to a valid flow.
+
+    A table created with all_flows decodes as RTP all the UDP datagrams that match no layer binding, like a binding of
+    UDP to RTP without fields, without changing the layer bindings of scapy.
+    """
+
+    re_media = re.compile(r"^\S+\s+(?P<port>\d+)(?:/(?P<count>\d+))?\s+(?P<proto>\S+)")
+    """The regular expression for the field M"""
+
+    re_connection = re.compile(r"^IN\s+IP[46]\s+(?P<address>[^/\s]+)")
+    """The regular expression for the field C"""
+
+    re_rtcp = re.compile(r"^rtcp:(?P<port>\d+)(?:\s+IN\s+IP[46]\s+(?P<address>[^/\s]+))?")
+    """The regular expression for the attribute rtcp of the field A"""
+
+    def __init__(self, timeout=0, all_flows=False):
+        """
+        :param timeout: The time in seconds during which a flow is decoded after its SDP description, 0 for no limit
+        :type timeout: float
+        :param all_flows: Decode as RTP all the UDP datagrams that match no layer binding
+        :type all_flows: True | False
+        """
+        self.timeout = timeout
+        """
+        The time in seconds during which a flow is decoded after its SDP description, 0 for no limit
+        :type: float
+        """
+
+        self.all_flows = all_flows
+        """
+        Decode as RTP all the UDP datagrams that match no layer binding instead of the flows of the table
+        :type: True | False
+        """
+
+        self.flows = dict()
+        """
+        The flows, the key contain the address and the port and the value contain the sorted times of the SDP
+        descriptions that negotiated the flow
+        :type: dict[(str, int), list[float]]
+        """
+
+    def add(self, address, port, time):
+        """
+        Add a flow to the table
+        :param address: The IP address
+        :type address: str
+        :param port: The UDP port
+        :type port: int
+        :param time: The time of the SDP description that negotiated the flow
+        :type time: float
+        """
+        insort(self.flows.setdefault((address, port), list()), time)
+
+    def add_packet(self, packet):
+        """
+        Add the flows negotiated by the SDP description of a packet, if any
+        :param packet: The packet
+        :type packet: Packet
+        """
+        sdp = packet.getlayer(SDP)
+        if sdp is None:
+            return
+        for address, port in self.get_sdp_flows(sdp):
+            self.add(address, port, packet.time)
+
+    def is_media(self, src, sport, dst, dport, time):
+        """
+        Check if a UDP datagram belongs to a valid flow of the table
+        :param src: The source IP address
+        :type src: str
+        :param sport: The source UDP port
+        :type sport: int
+        :param dst: The destination IP address
+        :type dst: str
+        :param dport: The destination UDP port
+        :type dport: int
+        :param time: The time of the packet
+        :type time: float
+        :return: True if the datagram belongs to a flow, False otherwise
+        :rtype: True | False
+        """
+        for key in ((dst, dport), (src, sport)):
+            times = self.flows.get(key)
+            if times is None:
+                continue
+            index = bisect_right(times, time)
+            if index > 0 and (self.timeout <= 0 or time <= times[index - 1] + self.timeout):
+                return True
+        return False
+
+    def is_decoded(self, values, src, dst, time):
+        """
+        Check if a UDP datagram whose payload is not bound to a layer by scapy is decoded as RTP
+        :param values: The values of the fields of the UDP layer
+        :type values: dict[str, object]
+        :param src: The source IP address
+        :type src: str
+        :param dst: The destination IP address
+        :type dst: str
+        :param time: The time of the packet
+        :type time: float
+        :return: True if the payload is decoded as RTP, False otherwise
+        :rtype: True | False
+        """
+        if self.all_flows:
+            return not self.is_bound(values)
+        return self.is_media(src, values['sport'], dst, values['dport'], time)
+
+    @staticmethod
+    def is_bound(values):
+        """
+        Check if a UDP datagram matches a layer binding, even a binding to Raw, like the dissection of scapy does
+        :param values: The values of the fields of the UDP layer
+        :type values: dict[str, object]
+        :return: True if a binding matches, False otherwise
+        :rtype: True | False
+        """
+        for fields, _ in UDP.payload_guess:
+            if all(values.get(name) == value for name, value in fields.iteritems()):
+                return True
+        return False
+
+    def decode(self, packet):
+        """
+        Decode as RTP the UDP payload of a packet that belongs to a flow of the table
+
+        The payload is decoded only if scapy has not bound it to a layer.
+        :param packet: The packet dissected by scapy
+        :type packet: Packet
+        """
+        udp = packet.getlayer(UDP)
+        if udp is None or not isinstance(udp.payload, conf.raw_layer):
+            return
+        ip = udp.underlayer
+        if not self.all_flows and not hasattr(ip, 'src'):
+            return
+        if not self.is_decoded(udp.fields, getattr(ip, 'src', None), getattr(ip, 'dst', None), packet.time):
+            return
+
+        raw = udp.payload
+        try:
+            rtp = RTP(raw.load, _internal=1, _underlayer=udp)
+        except Exception:
+            return  # Kept as Raw like the payloads that scapy fails to dissect
+        if not isinstance(raw.payload, NoPayload):
+            rtp.add_payload(raw.payload)
+        udp.remove_payload()
+        udp.add_payload(rtp)
+
+    @classmethod
+    def get_sdp_flows(cls, sdp):
+        """
+        Get the RTP and RTCP flows of an SDP description
+        :param sdp: The SDP layer
+        :type sdp: SDP
+        :return: The list of flows with the IP address and the UDP port
+        :rtype: list[(str, int)]
+        """
+        session_address = None
+        medias = list()  # The address, the RTP ports and the RTCP flows of each media
+
+        for value, line in sdp.descriptions:
+            kind = line[0]
+            media = medias[-1] if len(medias) > 0 else None
+
+            if kind == 'm':
+                m = cls.re_media.match(value)
+                if m is None or 'RTP' not in m.group('proto').upper() or int(m.group('port')) == 0:
+                    medias.append(None)  # Not a RTP media or rejected media
+                    continue
+                port = int(m.group('port'))
+                count = int(m.group('count') or 1)
+                medias.append([None, [port + 2 * i for i in range(count)], list()])
+
+            elif kind == 'c':
+                m = cls.re_connection.match(value)
+                if m is None:
+                    continue
+                if len(medias) == 0:
+                    session_address = m.group('address')
+                elif media is not None:
+                    media[0] = m.group('address')
+
+            elif kind == 'a' and media is not None:
+                m = cls.re_rtcp.match(value)
+                if m is not None:
+                    media[2].append((m.group('address'), int(m.group('port'))))
+
+        flows = list()
+        for media in medias:
+            if media is None:
+                continue
+            address, ports, rtcp_flows = media
+            if address is None:
+                address = session_address
+            if address is None:
+                continue
+            for port in ports:
+                flows.append((address, port))
+                if len(rtcp_flows) == 0:
+                    flows.append((address, port + 1))
+            for rtcp_address, rtcp_port in rtcp_flows:
+                flows.append((rtcp_address or address, rtcp_port))
+        return flows
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import random
+
+from sirano.exception import NamespaceExhaustedException
+
+
+class Namespace(object):
+    """All the candidates that a generator can draw, when they can be enumerated"""
+
+    def __init__(self, size, candidates):
+        """
+        :param size: The number of candidates
+        :type size: int
+        :param candidates: The function that returns an iterable over all the candidates
+        :type candidates: () -> collections.Iterable[str]
+        """
+        self.size = size
+        """
+        The number of candidates
+        :type: int
+        """
+
+        self.candidates = candidates
+        """
+        The function that returns an iterable over all the candidates
+        :type: () -> collections.Iterable[str]
+        """
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.candidates())
+
+
+class UniqueGenerator(object):
+    """
+    Generate replacement values that are not already used
+
+    The uniqueness is checked with a function that must be backed by an index (a set or a ReplacementDict), the
+    candidates are drawn at random a bounded number of times. If they are all used and the namespace is small enough to
+    be enumerated, a candidate is chosen in the pool of the unused ones, otherwise the namespace is considered exhausted.
+    """
+
+    max_retries = 1000
+    """The default maximum number of random candidates drawn"""
+
+    pool_size = 1000000
+    """The maximum size of a namespace that is enumerated to build the pool of the unused candidates"""
+
+    def __init__(self, max_retries=None, pool_size=None):
+        """
+        :param max_retries: The maximum number of random candidates drawn, the default one if None
+        :type max_retries: int | None
+        :param pool_size: The maximum size of an enumerated namespace, the default one if None
+        :type pool_size: int | None
+        """
+        if max_retries is not None:
+            self.max_retries = max_retries
+        if pool_size is not None:
+            self.pool_size = pool_size
+
+    def generate(self, candidate, is_used, namespace=None):
+        """
+        Generate a replacement value that is not used
+        :param candidate: The function that draws a random candidate with the module random
+        :type candidate: () -> str
+        :param is_used: The function that checks if a candidate is already used or not valid
+        :type is_used: (str) -> bool
+        :param namespace: All the candidates or None if they cannot be enumerated
+        :type namespace: Namespace | None
+        :return: The replacement value
+        :rtype: str
+        :raise NamespaceExhaustedException: All the candidates are used or no unused one is found
+        """
+        retries = self.max_retries
+        if namespace is not None:
+            retries = min(retries, len(namespace))
+
+        for _ in xrange(retries):
+            value = candidate()
+            if not is_used(value):
+                return value
+
+        if namespace is None or len(namespace) > self.pool_size:
+            raise NamespaceExhaustedException("No unused candidate found after {} retries, the namespace is "
+                                              "nearly exhausted".format(retries))
+
+        pool = [value for value in namespace if not is_used(value)]
+        if len(pool) == 0:
+            raise NamespaceExhaustedException("All the {} candidates of the namespace are used".format(len(namespace)))
+        return random.choice(pool)
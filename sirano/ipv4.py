@@ -0,0 +1,680 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from array import array
+from bisect import bisect_left
+from collections import MutableMapping
+import hashlib
+import socket
+import struct
+import sys
+
+import yaml
+
+_NONE, _SET, _EMPTY, _DELETED = range(4)
+"""The states of an entry of the arrays: no replacement, a replacement, an empty replacement or deleted"""
+
+
+def address_to_int(address):
+    """
+    Convert an IPv4 address in dotted-quad notation to an integer
+    :param address: The address
+    :type address: str
+    :return: The integer or None if the address is not in the canonical dotted-quad notation
+    :rtype: int | None
+    """
+    try:
+        packed = socket.inet_aton(address)
+    except (socket.error, TypeError, UnicodeError):
+        return None
+    if socket.inet_ntoa(packed) != address:  # Like '1.2.3' or '01.2.3.4'
+        return None
+    return struct.unpack('!I', packed)[0]
+
+
+def int_to_address(value):
+    """
+    Convert an integer to an IPv4 address in dotted-quad notation
+    :param value: The integer
+    :type value: int
+    :return: The address
+    :rtype: str
+    """
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class IPv4Dict(MutableMapping):
+    """
+    Compact dictionary of IPv4 addresses with their replacement address
+
+    The addresses are stored as integers in three arrays sorted by address, the address, the replacement and the
+    state of the replacement (None, an address or an empty string), about 9 bytes by entry. A lookup is a binary
+    search. The new addresses are added to a small pending dict merged in the arrays when it grows. The keys or the
+    replacements that are not addresses in the canonical dotted-quad notation are kept in another dict, so any
+    value of a YAML file is kept unchanged.
+
+    The entries are iterated in the order of the arrays, then of the pending and the other dict. update() merges the
+    pending dict, so a dictionary loaded from a YAML file or from the compact file is iterated in the same order.
+
+    The replacements are indexed for has_replacement(), the index of the arrays is sorted again when it is used after
+    a change of the arrays. The dictionary must not be changed while it is iterated, except the replacements.
+    """
+
+    magic = 'SIRANO-IPV4\x00'
+    """The first bytes of the compact file form"""
+
+    pending_size = 65536
+    """The minimum size of the pending dict before a merge, the merge occurs when it contains a third of the arrays"""
+
+    def __init__(self, *args, **kwargs):
+        self.keys_array = array('I')
+        """
+        The sorted addresses
+        :type: array.array
+        """
+
+        self.values_array = array('I')
+        """
+        The replacement addresses, for the state _SET
+        :type: array.array
+        """
+
+        self.states_array = array('B')
+        """
+        The states of the replacements
+        :type: array.array
+        """
+
+        self.pending = dict()
+        """
+        The addresses added since the last merge with their replacement
+        :type: dict[int, str | None]
+        """
+
+        self.others = dict()
+        """
+        The keys or replacements that are not canonical addresses, the address is deleted from the arrays
+        :type: dict[str, str | None]
+        """
+
+        self.size = 0
+        """
+        The number of entries
+        :type: int
+        """
+
+        self.replacements = dict()
+        """
+        The number of entries of the pending and the other dict for each replacement
+        :type: dict[str, int]
+        """
+
+        self.replacements_array = None
+        """
+        The sorted replacements of the arrays or None if they must be sorted again
+        :type: array.array | None
+        """
+
+        self.__bulk = False
+        """
+        True during update(), the pending dict is merged at the end
+        :type: True | False
+        """
+
+        self.update(*args, **kwargs)
+
+    def __len__(self):
+        return self.size
+
+    def __locate(self, key):
+        """
+        Locate an address in the arrays
+        :param key: The address
+        :type key: int
+        :return: The index or -1 if not found
+        :rtype: int
+        """
+        keys = self.keys_array
+        i = bisect_left(keys, key)
+        if i != len(keys) and keys[i] == key and self.states_array[i] != _DELETED:
+            return i
+        return -1
+
+    def __decode(self, i):
+        """
+        Get the replacement of an entry of the arrays
+        :param i: The index
+        :type i: int
+        :return: The replacement
+        :rtype: str | None
+        """
+        state = self.states_array[i]
+        if state == _SET:
+            return int_to_address(self.values_array[i])
+        return None if state == _NONE else ''
+
+    @staticmethod
+    def __encode(value):
+        """
+        Get the state and the integer of a replacement for the arrays
+        :param value: The replacement
+        :type value: str | None
+        :return: The state and the integer or None if it cannot be stored in the arrays
+        :rtype: (int, int) | None
+        """
+        if value is None:
+            return _NONE, 0
+        if value == '':
+            return _EMPTY, 0
+        integer = address_to_int(value)
+        if integer is None:
+            return None
+        return _SET, integer
+
+    def __count(self, replacement, increment):
+        """
+        Change the count of a replacement of the pending or the other dict
+        :param replacement: The replacement
+        :type replacement: str | None
+        :param increment: 1 or -1
+        :type increment: int
+        """
+        count = self.replacements.get(replacement, 0) + increment
+        if count > 0:
+            self.replacements[replacement] = count
+        else:
+            self.replacements.pop(replacement, None)
+
+    def get(self, key, default=None):
+        integer = address_to_int(key)
+        if integer is not None:
+            i = self.__locate(integer)
+            if i >= 0:
+                return self.__decode(i)
+            if integer in self.pending:
+                return self.pending[integer]
+        return self.others.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __setitem__(self, key, value):
+        integer = address_to_int(key)
+        if integer is not None:
+            i = self.__locate(integer)
+            if i >= 0:
+                encoded = self.__encode(value)
+                if encoded is not None:
+                    self.states_array[i], self.values_array[i] = encoded
+                    self.replacements_array = None
+                    return
+                self.states_array[i] = _DELETED  # Moved to the other dict
+                self.replacements_array = None
+                self.size -= 1
+            elif key not in self.others:
+                if integer not in self.pending:
+                    self.size += 1
+                elif not self.__bulk:
+                    self.__count(self.pending[integer], -1)
+                self.pending[integer] = value
+                if not self.__bulk:  # Counted by merge()
+                    self.__count(value, 1)
+                    self.__merge_if_needed()
+                return
+
+        if key in self.others:
+            self.__count(self.others[key], -1)
+        else:
+            self.size += 1
+        self.others[key] = value
+        self.__count(value, 1)
+
+    def __delitem__(self, key):
+        integer = address_to_int(key)
+        if integer is not None:
+            i = self.__locate(integer)
+            if i >= 0:
+                self.states_array[i] = _DELETED
+                self.replacements_array = None
+                self.size -= 1
+                return
+            if integer in self.pending:
+                self.__count(self.pending.pop(integer), -1)
+                self.size -= 1
+                return
+        self.__count(self.others.pop(key), -1)
+        self.size -= 1
+
+    def __iter__(self):
+        states = self.states_array
+        for i, key in enumerate(self.keys_array):
+            if states[i] != _DELETED:
+                yield int_to_address(key)
+        for key in self.pending.keys():
+            yield int_to_address(key)
+        for key in self.others.keys():
+            yield key
+
+    def iteritems(self):
+        keys = self.keys_array
+        for i in xrange(len(keys)):
+            if self.states_array[i] != _DELETED:
+                yield int_to_address(keys[i]), self.__decode(i)
+        for key, value in self.pending.items():
+            yield int_to_address(key), value
+        for item in self.others.items():
+            yield item
+
+    def update(self, *args, **kwargs):
+        self.__bulk = True
+        try:
+            MutableMapping.update(self, *args, **kwargs)
+        finally:
+            self.__bulk = False
+            if len(self.pending) > 0:
+                self.merge()  # The order of the iteration does not depend on the order of the update
+
+    def clear(self):
+        self.__init__()
+
+    def copy(self):
+        return self.__class__(self)
+
+    def __merge_if_needed(self):
+        """
+        Merge the pending dict in the arrays if it is too large
+        """
+        if len(self.pending) > max(self.pending_size, len(self.keys_array) / 3):
+            self.merge()
+
+    def merge(self):
+        """
+        Merge the pending dict in the arrays and remove the deleted entries
+        """
+        new_keys = array('I')
+        new_values = array('I')
+        new_states = array('B')
+        for key, value in sorted(self.pending.iteritems()):
+            encoded = self.__encode(value)
+            if encoded is None:
+                self.others[int_to_address(key)] = value
+            else:
+                new_keys.append(key)
+                new_states.append(encoded[0])
+                new_values.append(encoded[1])
+        self.pending = dict()
+
+        old_keys, old_values, old_states = self.keys_array, self.values_array, self.states_array
+        if _DELETED not in old_states and (len(old_keys) == 0 or len(new_keys) == 0 or old_keys[-1] < new_keys[0]):
+            keys, values, states = old_keys + new_keys, old_values + new_values, old_states + new_states
+        else:
+            keys = array('I')
+            values = array('I')
+            states = array('B')
+            i = j = 0
+            while i < len(old_keys) or j < len(new_keys):
+                if j == len(new_keys) or (i < len(old_keys) and old_keys[i] < new_keys[j]):
+                    if old_states[i] != _DELETED:
+                        keys.append(old_keys[i])
+                        values.append(old_values[i])
+                        states.append(old_states[i])
+                    i += 1
+                else:
+                    keys.append(new_keys[j])
+                    values.append(new_values[j])
+                    states.append(new_states[j])
+                    j += 1
+
+        self.keys_array, self.values_array, self.states_array = keys, values, states
+        self.replacements_array = None
+
+        self.replacements = dict()
+        for value in self.others.itervalues():
+            self.__count(value, 1)
+
+    def get_many(self, keys):
+        """
+        Get the replacements of a batch of integer addresses
+
+        The addresses are looked up in increasing order, each binary search starts at the position of the previous
+        address.
+        :param keys: The addresses
+        :type keys: collections.Sequence[int]
+        :return: The integer replacements and the mask of the addresses that do not have an address replacement (1
+        if unknown), the replacement of an unknown address is 0
+        :rtype: (array.array, bytearray)
+        """
+        keys_array, values_array, states_array = self.keys_array, self.values_array, self.states_array
+        length = len(keys_array)
+        replacements = array('I', [0]) * len(keys)
+        unknown = bytearray(len(keys))
+
+        lo = 0
+        for index in sorted(xrange(len(keys)), key=keys.__getitem__):
+            key = keys[index]
+            lo = bisect_left(keys_array, key, lo)
+            if lo != length and keys_array[lo] == key and states_array[lo] != _DELETED:
+                if states_array[lo] == _SET:
+                    replacements[index] = values_array[lo]
+                else:
+                    unknown[index] = 1
+                continue
+            integer = address_to_int(self.get(int_to_address(key)))  # In the pending or the other dict
+            if integer is None:
+                unknown[index] = 1
+            else:
+                replacements[index] = integer
+        return replacements, unknown
+
+    def has_replacement(self, replacement):
+        """
+        Check if an address has the specified replacement
+        :param replacement: The replacement
+        :type replacement: str
+        :return: True if an address has this replacement, False otherwise
+        :rtype: True | False
+        """
+        if replacement in self.replacements:
+            return True
+        if replacement is None or replacement == '':
+            return (_NONE if replacement is None else _EMPTY) in self.states_array
+        integer = address_to_int(replacement)
+        if integer is None:
+            return False
+        if self.replacements_array is None:
+            states = self.states_array
+            self.replacements_array = array('I', sorted(v for i, v in enumerate(self.values_array)
+                                                        if states[i] == _SET))
+        replacements = self.replacements_array
+        i = bisect_left(replacements, integer)
+        return i != len(replacements) and replacements[i] == integer
+
+    def dump(self, a_file):
+        """
+        Write the arrays in the compact file form, the pending dict is merged before and the other dict is not written
+        :param a_file: The file opened in binary mode
+        :type a_file: file
+        """
+        self.merge()
+        a_file.write(self.magic + struct.pack('<I', len(self.keys_array)))
+        for an_array in (self.keys_array, self.values_array, self.states_array):
+            if sys.byteorder == 'big':
+                an_array = array(an_array.typecode, an_array)
+                an_array.byteswap()
+            a_file.write(an_array.tostring())
+
+    def load(self, a_file):
+        """
+        Read the arrays from the compact file form written by dump(), the current entries are replaced
+        :param a_file: The file opened in binary mode
+        :type a_file: file
+        :raise ValueError: The file is not in the compact file form or it is truncated
+        """
+        header = a_file.read(len(self.magic) + 4)
+        if len(header) != len(self.magic) + 4 or not header.startswith(self.magic):
+            raise ValueError("The file is not a compact IPv4 dictionary")
+        length = struct.unpack('<I', header[len(self.magic):])[0]
+
+        self.clear()
+        for an_array in (self.keys_array, self.values_array, self.states_array):
+            data = a_file.read(length * an_array.itemsize)
+            if len(data) != length * an_array.itemsize:
+                raise ValueError("The compact IPv4 dictionary is truncated")
+            an_array.fromstring(data)
+            if sys.byteorder == 'big':
+                an_array.byteswap()
+        self.size = length
+
+
+class PrefixPreservingCipher(object):
+    """
+    Keyed prefix-preserving permutation of the IPv4 addresses, like Crypto-PAn, that keeps the number of digits of
+    each byte
+
+    Each byte is permuted by a pseudo-random permutation computed with the key from the bytes before it, so two
+    addresses that share their first n bytes have replacements that share their first n bytes. A byte is permuted as
+    its offset among the bytes with the same number of digits: the bit i of the offset is flipped by a pseudo-random
+    bit of the bits before it, read from a HMAC-SHA256 of the bytes before the byte, whose 256 bits contain the nodes
+    of the binary tree of the prefixes of the offset. The permutation is walked until its result is in the class of the
+    byte, so the replacement of an address has the same text length in dotted decimal notation, like the replacements
+    of the random subnets.
+
+    The class of a byte is its number of digits and the prefixes of the blocks that it matches, among the blocks that
+    match the bytes before it. An address stays in all its blocks, and the bytes of the other addresses are not
+    replaced by a byte of a block: a byte on the path of a block that is not wider than a byte, like the first byte
+    of 10.0.0.0/8 or the second byte of 192.168.0.0/16, is never changed, even for an address outside the block like
+    192.169.1.1. The excluded addresses are not changed and the other addresses are never replaced by an excluded
+    address, the permutation is walked until its result is not excluded.
+    """
+
+    cache_length = 2
+    """The digests of the prefixes shorter than this number of bytes are cached"""
+
+    cache_size = 65536
+    """The maximum number of addresses in the cache of the replacements"""
+
+    digits = ((0, 10, 4), (10, 90, 7), (100, 156, 8))
+    """The bytes with one, two and three digits, with the first byte, the number of bytes and the number of bits"""
+
+    def __init__(self, key, blocks=(), exclusion=()):
+        """
+        :param key: The secret key
+        :type key: str
+        :param blocks: The blocks of addresses with the integer value of the network and the prefix length
+        :type blocks: collections.Iterable[(int, int)]
+        :param exclusion: The integer addresses that are not changed
+        :type exclusion: collections.Iterable[int]
+        """
+        key = hashlib.sha256(key).digest() if len(key) > 64 else key
+        key = key.ljust(64, '\x00')
+
+        self.inner = hashlib.sha256(key.translate(''.join(chr(c ^ 0x36) for c in xrange(256))))
+        """
+        The inner hash of the HMAC with the key
+        :type: hashlib.sha256
+        """
+
+        self.outer = hashlib.sha256(key.translate(''.join(chr(c ^ 0x5c) for c in xrange(256))))
+        """
+        The outer hash of the HMAC with the key
+        :type: hashlib.sha256
+        """
+
+        self.regions = dict()
+        """
+        The prefixes of the blocks in the byte that follows a prefix, the key contain the number of bytes and the
+        prefix, the value contain the mask and the value of the bits of the blocks in the byte
+        :type: dict[(int, int), list[(int, int)]]
+        """
+
+        for network, prefixlen in blocks:
+            for length in xrange((prefixlen + 7) // 8):
+                bits = min(8, prefixlen - 8 * length)
+                mask = (0xff << (8 - bits)) & 0xff
+                region = (mask, (network >> (24 - 8 * length)) & mask)
+                regions = self.regions.setdefault((length, network >> (32 - 8 * length)), list())
+                if region not in regions:
+                    regions.append(region)
+
+        self.exclusion = frozenset(exclusion)
+        """
+        The addresses that are not changed
+        :type: frozenset[int]
+        """
+
+        self.digests = dict()
+        """
+        Cache of the digests of the short prefixes, the key contain the number of bytes and the prefix
+        :type: dict[(int, int), str]
+        """
+
+        self.encryptions = dict()
+        """
+        Cache of the replacements of the addresses
+        :type: dict[int, int]
+        """
+
+    def __digest(self, length, prefix):
+        """
+        Get the pseudo-random bits of the byte that follows a prefix
+        :param length: The number of bytes of the prefix
+        :type length: int
+        :param prefix: The integer value of the prefix
+        :type prefix: int
+        :return: The HMAC-SHA256 digest of the prefix
+        :rtype: str
+        """
+        key = (length, prefix)
+        digest = self.digests.get(key)
+        if digest is None:
+            inner = self.inner.copy()
+            inner.update(chr(length) + struct.pack('!I', prefix))
+            outer = self.outer.copy()
+            outer.update(inner.digest())
+            digest = outer.digest()
+            if length < self.cache_length:
+                self.digests[key] = digest
+        return digest
+
+    @staticmethod
+    def __permute_bits(digest, value, width, inverse):
+        """
+        Apply the pseudo-random permutation of a digest or its inverse to a value of a number of bits
+        :param digest: The digest
+        :type digest: str
+        :param value: The value
+        :type value: int
+        :param width: The number of bits of the value
+        :type width: int
+        :param inverse: True for the inverse
+        :type inverse: True | False
+        :return: The value
+        :rtype: int
+        """
+        result = 0
+        high = 0  # The bits of the value before the permutation
+        for j in xrange(width):
+            node = (1 << j) - 1 + high
+            bit = (value >> (width - 1 - j)) & 1
+            if (ord(digest[node >> 3]) >> (node & 7)) & 1:
+                bit ^= 1
+            result = result << 1 | bit
+            if inverse:
+                high = high << 1 | bit
+            else:
+                high = high << 1 | ((value >> (width - 1 - j)) & 1)
+        return result
+
+    def __permute_byte(self, digest, byte, regions, inverse):
+        """
+        Apply the permutation of a digest or its inverse to a byte, walked until its result is in the class of the byte
+
+        The class of a byte is its number of digits and the regions that contain it. The bytes with the same number of
+        digits are permuted as an offset from the first one, in the smallest number of bits that contain them.
+        :param digest: The digest
+        :type digest: str
+        :param byte: The byte
+        :type byte: int
+        :param regions: The mask and the value of the bits of the blocks in the byte
+        :type regions: list[(int, int)]
+        :param inverse: True for the inverse
+        :type inverse: True | False
+        :return: The byte
+        :rtype: int
+        """
+        for first, size, width in self.digits:
+            if byte < first + size:
+                break
+        matches = [byte & mask == value for mask, value in regions]
+        offset = byte - first
+        while True:
+            offset = self.__permute_bits(digest, offset, width, inverse)
+            if offset < size and [(first + offset) & mask == value for mask, value in regions] == matches:
+                return first + offset
+
+    def __permute(self, address, inverse):
+        """
+        Apply the prefix-preserving permutation or its inverse to an address
+        :param address: The integer address
+        :type address: int
+        :param inverse: True for the inverse
+        :type inverse: True | False
+        :return: The integer address
+        :rtype: int
+        """
+        result = 0
+        prefix = 0  # The bytes of the address before the permutation
+        for length in xrange(4):
+            byte = (address >> (24 - 8 * length)) & 0xff
+            permuted = self.__permute_byte(self.__digest(length, prefix), byte,
+                                           self.regions.get((length, prefix), ()), inverse)
+            result = result << 8 | permuted
+            prefix = prefix << 8 | (permuted if inverse else byte)
+        return result
+
+    def encrypt(self, address):
+        """
+        Get the replacement of an address
+        :param address: The integer address
+        :type address: int
+        :return: The integer replacement
+        :rtype: int
+        """
+        try:
+            return self.encryptions[address]
+        except KeyError:
+            pass
+
+        replacement = address
+        if address not in self.exclusion:
+            replacement = self.__permute(address, False)
+            while replacement in self.exclusion:
+                replacement = self.__permute(replacement, False)
+
+        if len(self.encryptions) >= self.cache_size:
+            self.encryptions.clear()
+        self.encryptions[address] = replacement
+        return replacement
+
+    def decrypt(self, address):
+        """
+        Get the address of a replacement
+        :param address: The integer replacement
+        :type address: int
+        :return: The integer address
+        :rtype: int
+        """
+        if address in self.exclusion:
+            return address
+        address = self.__permute(address, True)
+        while address in self.exclusion:
+            address = self.__permute(address, True)
+        return address
+
+
+yaml.add_representer(IPv4Dict, yaml.representer.SafeRepresenter.represent_dict)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from collections import MutableMapping
+
+import yaml
+
+_MISSING = object()
+"""The value of a node that does not end a domain"""
+
+
+class LabelTrie(MutableMapping):
+    """
+    Mapping of the domain names with their replacement, stored in a trie indexed by the labels from the last one
+
+    The subdomains of a domain share its node, and the replacement of a domain that ends with the replacement of its
+    parent, like the ones generated by the plugin domain, is stored as its first labels only. A lookup follows the
+    labels of the domain, it resolves the replacement in one traversal. The replacements are counted in a second trie,
+    so has_replacement() does not scan the values. It is saved in the YAML files like a dict.
+
+    A node is stored in the children of its parent: a node with children is a list with the children by label and the
+    value, a leaf is only the value. A value is a str for a replacement relative to the parent, a tuple with the full
+    replacement, None for a domain without replacement or _MISSING for a node that does not end a domain.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.root = [dict(), _MISSING]
+        """
+        The root node
+        :type: list
+        """
+
+        self.replacements = [dict(), 0]
+        """
+        The root node of the replacements, a node with children is a list with the children and the number of values,
+        a leaf is only the number of values
+        :type: list
+        """
+
+        self.size = 0
+        """
+        The number of domains
+        :type: int
+        """
+
+        self.update(*args, **kwargs)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        found, value = self.__find(key)
+        if not found:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.__find(key)[0]
+
+    def __setitem__(self, key, value):
+        children = self.root[0]
+        parent_replacement = None
+        replacement = None
+        labels = list(reversed(key.split('.')))
+        last = len(labels) - 1
+        for index, label in enumerate(labels):
+            node = children.get(label, _MISSING)
+            if node is _MISSING:
+                node = children[label] = _MISSING if index == last else [dict(), _MISSING]
+            elif index < last and type(node) is not list:
+                node = children[label] = [dict(), node]
+            parent_replacement = replacement
+            replacement = self.__resolve(node[1] if type(node) is list else node, replacement)
+            if index < last:
+                children = node[0]
+
+        code = node[1] if type(node) is list else node
+        if code is _MISSING:
+            self.size += 1
+        else:
+            if replacement == value:
+                return
+            self.__detach_children(node, replacement)
+            self.__count(replacement, -1)
+
+        if isinstance(value, str) and parent_replacement is not None and \
+                len(value) > len(parent_replacement) + 1 and value.endswith('.' + parent_replacement):
+            code = self.__count(value, 1, len(value) - len(parent_replacement) - 1)
+        else:
+            self.__count(value, 1)
+            code = (value,) if value is not None else None
+
+        if type(node) is list:
+            node[1] = code
+        else:
+            children[labels[-1]] = code
+
+    def __delitem__(self, key):
+        path = list()
+        node = self.root
+        replacement = None
+        labels = list(reversed(key.split('.')))
+        for label in labels:
+            if type(node) is not list or label not in node[0]:
+                raise KeyError(key)
+            path.append(node)
+            node = node[0][label]
+            replacement = self.__resolve(node[1] if type(node) is list else node, replacement)
+
+        code = node[1] if type(node) is list else node
+        if code is _MISSING:
+            raise KeyError(key)
+        self.__detach_children(node, replacement)
+        self.__count(replacement, -1)
+        self.size -= 1
+
+        if type(node) is list:
+            node[1] = _MISSING
+            return
+        for index in range(len(path) - 1, -1, -1):
+            parent = path[index]
+            del parent[0][labels[index]]
+            if index == 0 or len(parent[0]) > 0:
+                break
+            if parent[1] is not _MISSING:
+                path[index - 1][0][labels[index - 1]] = parent[1]  # The parent becomes a leaf
+                break
+
+    def __iter__(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def __reduce__(self):
+        return self.__class__, (dict(self.iteritems()),)
+
+    def iteritems(self):
+        stack = [(self.root[0], None, None)]
+        while len(stack) > 0:
+            children, parent_key, parent_replacement = stack.pop()
+            for label, node in children.iteritems():
+                key = label if parent_key is None else '{}.{}'.format(label, parent_key)
+                if type(node) is list:
+                    replacement = self.__resolve(node[1], parent_replacement)
+                    stack.append((node[0], key, replacement))
+                    if node[1] is not _MISSING:
+                        yield key, replacement
+                else:
+                    yield key, self.__resolve(node, parent_replacement)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return [key for key, _ in self.iteritems()]
+
+    def values(self):
+        return [value for _, value in self.iteritems()]
+
+    def clear(self):
+        self.root = [dict(), _MISSING]
+        self.replacements = [dict(), 0]
+        self.size = 0
+
+    def get_levels(self, key):
+        """
+        Get the replacements of all the levels of a domain in one traversal
+        :param key: The domain
+        :type key: str
+        :return: The replacement of each level from the top-level one, None for a level without replacement
+        :rtype: list[str | None]
+        """
+        levels = list()
+        node = self.root
+        replacement = None
+        for label in reversed(key.split('.')):
+            node = node[0].get(label, _MISSING) if type(node) is list else _MISSING
+            replacement = self.__resolve(node[1] if type(node) is list else node, replacement)
+            levels.append(replacement)
+        return levels
+
+    def has_replacement(self, replacement):
+        """
+        Check if a value has the specified replacement
+        :param replacement: The replacement
+        :type replacement: str
+        :return: True if a value has this replacement, False otherwise
+        :rtype: True | False
+        """
+        node = self.replacements
+        for label in reversed(replacement.split('.')):
+            if type(node) is not list:
+                return False
+            node = node[0].get(label, 0)
+        return (node[1] if type(node) is list else node) > 0
+
+    def __find(self, key):
+        """
+        Find the replacement of a domain
+        :param key: The domain
+        :type key: str
+        :return: True if the domain is found, False otherwise and its replacement
+        :rtype: (True | False, str | None)
+        """
+        node = self.root
+        parts = list()  # The labels of the replacement from the last one
+        for label in reversed(key.split('.')):
+            if type(node) is not list:
+                return False, None
+            node = node[0].get(label, _MISSING)
+            if node is _MISSING:
+                return False, None
+            code = node[1] if type(node) is list else node
+            if type(code) is str:
+                parts.append(code)
+            elif type(code) is tuple:
+                parts = [code[0]]
+            else:
+                parts = list()
+        if code is _MISSING:
+            return False, None
+        if code is None:
+            return True, None
+        parts.reverse()
+        return True, '.'.join(parts)
+
+    @staticmethod
+    def __resolve(code, parent_replacement):
+        """
+        Resolve the replacement of a node
+        :param code: The value of the node
+        :type code: str | tuple | None
+        :param parent_replacement: The replacement of the parent or None
+        :type parent_replacement: str | None
+        :return: The replacement of the node or None
+        :rtype: str | None
+        """
+        if type(code) is str:
+            return '{}.{}'.format(code, parent_replacement)
+        if type(code) is tuple:
+            return code[0]
+        return None
+
+    @staticmethod
+    def __detach_children(node, replacement):
+        """
+        Store the replacements of the children relative to a node as full ones, before the node changes
+        :param node: The node
+        :type node: list | str | tuple | None
+        :param replacement: The current replacement of the node
+        :type replacement: str | None
+        """
+        if type(node) is not list:
+            return
+        for label, child in node[0].iteritems():
+            if type(child) is list:
+                if type(child[1]) is str:
+                    child[1] = ('{}.{}'.format(child[1], replacement),)
+            elif type(child) is str:
+                node[0][label] = ('{}.{}'.format(child, replacement),)
+
+    def __count(self, replacement, increment, relative_length=None):
+        """
+        Update the number of values of a replacement
+        :param replacement: The replacement
+        :type replacement: str | None
+        :param increment: The increment, 1 or -1
+        :type increment: int
+        :param relative_length: The length of the first labels of the replacement to return or None
+        :type relative_length: int | None
+        :return: The first labels of the replacement, shared with the trie of the replacements if it is one label,
+        or None
+        :rtype: str | None
+        """
+        if not isinstance(replacement, str):
+            return None
+        path = list()
+        node = self.replacements
+        labels = replacement.split('.')
+        labels.reverse()
+        last = len(labels) - 1
+        for index, label in enumerate(labels):
+            children = node[0]
+            child = children.get(label, 0)
+            if index < last and type(child) is not list:
+                child = children[label] = [dict(), child]
+            path.append(node)
+            node = child
+
+        if type(node) is list:
+            node[1] += increment
+        elif node + increment > 0:
+            path[-1][0][labels[-1]] = node + increment
+        else:
+            for index in range(len(path) - 1, -1, -1):
+                parent = path[index]
+                parent[0].pop(labels[index], None)
+                if index == 0 or len(parent[0]) > 0:
+                    break
+                path[index - 1][0][labels[index - 1]] = parent[1]  # The parent becomes a leaf
+                if parent[1] > 0:
+                    break
+
+        if relative_length is None:
+            return None
+        if len(labels[-1]) == relative_length:
+            return labels[-1]
+        return replacement[:relative_length]
+
+
+yaml.add_representer(LabelTrie, yaml.representer.SafeRepresenter.represent_dict)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+class MultiStringMatcher(object):
+    """
+    Find all the patterns of a set that are contained in a string
+
+    The patterns are stored in Aho-Corasick automata, a string is scanned once by automaton. An automaton cannot be
+    updated, so the added patterns are stored in automata whose size are distinct powers of two: adding a pattern
+    merges the smaller automata like a binary counter, there are at most log2(n) automata.
+    """
+
+    def __init__(self, patterns=()):
+        """
+        :param patterns: The initial patterns
+        :type patterns: collections.Iterable[str]
+        """
+        self.patterns = set(patterns)
+        """
+        The patterns
+        :type: set[str]
+        """
+
+        self.automata = list()
+        """
+        The automata, in decreasing size order
+        :type: list[_Automaton]
+        """
+
+        if len(self.patterns) > 0:
+            self.automata.append(_Automaton(self.patterns))
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def add(self, pattern):
+        """
+        Add a pattern
+        :param pattern: The pattern
+        :type pattern: str
+        :return: True if the pattern is added, False if it is already present
+        :rtype: True | False
+        """
+        if pattern in self.patterns:
+            return False
+        self.patterns.add(pattern)
+
+        patterns = [pattern]
+        while len(self.automata) > 0 and len(self.automata[-1].patterns) <= len(patterns):
+            patterns.extend(self.automata.pop().patterns)
+        self.automata.append(_Automaton(patterns))
+        return True
+
+    def find_all(self, string):
+        """
+        Find the patterns contained in a string
+        :param string: The string
+        :type string: str
+        :return: The patterns found, each one once, in the order of their first end position in the string
+        :rtype: list[str]
+        """
+        found = dict()
+        for automaton in self.automata:
+            automaton.find_all(string, found)
+        return sorted(found, key=found.get)
+
+
+class _Automaton(object):
+    """An Aho-Corasick automaton built for a fixed set of patterns"""
+
+    def __init__(self, patterns):
+        """
+        :param patterns: The patterns
+        :type patterns: collections.Iterable[str]
+        """
+        self.patterns = list(patterns)
+        """
+        The patterns
+        :type: list[str]
+        """
+
+        self.goto = [dict()]
+        """
+        The transitions of the trie, the index is the state
+        :type: list[dict[str, int]]
+        """
+
+        self.output = [None]
+        """
+        The pattern that ends at a state or None
+        :type: list[str | None]
+        """
+
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append(dict())
+                    self.output.append(None)
+                state = next_state
+            self.output[state] = pattern
+
+        self.fail = [0] * len(self.goto)
+        """
+        The failure transitions, the state of the longest proper suffix present in the trie
+        :type: list[int]
+        """
+
+        self.link = [0] * len(self.goto)
+        """
+        The output links, the state of the longest proper suffix that ends a pattern or 0
+        :type: list[int]
+        """
+
+        queue = self.goto[0].values()
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[child] = fail
+                self.link[child] = fail if self.output[fail] is not None else self.link[fail]
+
+    def find_all(self, string, found):
+        """
+        Find the patterns contained in a string
+        :param string: The string
+        :type string: str
+        :param found: The patterns already found with their first end position, updated with the new patterns found
+        :type found: dict[str, int]
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        link = self.link
+
+        if output[0] is not None:  # Empty pattern
+            found.setdefault(output[0], -1)
+
+        state = 0
+        for position, char in enumerate(string):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if output[state] is not None else link[state]
+            while match:
+                found.setdefault(output[match], position)
+                match = link[match]
@@ -46,6 +46,13 @@ class PacketAnonymizer(AppBase):
 
         self.layers = self.__layers()
 
+        self.stacks = dict()
+        """
+        The classification of the layer stacks, the key contain the classes of the layers and the value contain the
+        index of the first layer to drop or None if the stack is processed
+        :type: dict[tuple[type], int | None]
+        """
+
         self.reset()
 
         self.current_packet = None
@@ -62,7 +69,7 @@ class PacketAnonymizer(AppBase):
         """
         assert isinstance(packet, Packet)
         self.current_packet = packet
-        for layer in self.__packet_layers(packet):
+        for layer in self.__get_stack_layers(packet):
             try:
                 name = layer.__class__.__name__
                 layer_action = self.layers[name]
@@ -94,7 +101,7 @@ class PacketAnonymizer(AppBase):
         """
         assert isinstance(packet, Packet)
         self.current_packet = packet
-        for layer in self.__packet_layers(packet):
+        for layer in self.__get_stack_layers(packet):
             try:
                 name = layer.__class__.__name__
                 layer_action = self.layers[name]
@@ -156,6 +163,43 @@ class PacketAnonymizer(AppBase):
             yield layer
             layer = layer.payload  # Get the next layer
 
+    def __get_stack_layers(self, packet):
+        """
+        Get the layers to process in the specified packet
+
+        If a layer of the stack is dropped, only this layer is returned to reject the packet before the processing of
+        the other layers. The classification is cached for each layer stack.
+        :param packet: The scapy packet
+        :type packet: Packet
+        :return: The layers to process
+        :rtype: list[Packet]
+        """
+        layers = list(self.__packet_layers(packet))
+        key = tuple(layer.__class__ for layer in layers)
+        try:
+            drop = self.stacks[key]
+        except KeyError:
+            drop = self.__classify_stack(layers)
+            self.stacks[key] = drop
+
+        if drop is not None:
+            return layers[drop:drop + 1]
+        return layers
+
+    def __classify_stack(self, layers):
+        """
+        Find the first layer configured to be dropped or not configured
+        :param layers: The layers of the stack
+        :type layers: list[Packet]
+        :return: The index of the first layer to drop or None if the stack is processed
+        :rtype: int | None
+        """
+        for index, layer in enumerate(layers):
+            layer_action = self.layers[layer.__class__.__name__]
+            if isinstance(layer_action, (ImplicitDropLayerAction, ExplicitDropLayerAction)):
+                return index
+        return None
+
     def __layers(self):
         """
         Creates the layers property from the configuration file
@@ -227,6 +271,19 @@ class PacketAnonymizer(AppBase):
         """:type: list[listt[dict]]"""
 
         name = self.__get_packet_layers(packet)
+        self.__report_increment_stack(report, name, a_property)
+
+    @staticmethod
+    def __report_increment_stack(report, name, a_property):
+        """
+        Increment a layer stack entry in the report
+        :param report: The lists of the report with the entries of the layer stacks
+        :type report: list[list[dict]]
+        :param name: The name of the layer stack
+        :type name: str
+        :param a_property: The property to increment
+        :type a_property: str
+        """
         for layers in report:
             entry = find_one_dict_by_key(layers, 'name', name)
             if entry is None:
@@ -239,6 +296,24 @@ class PacketAnonymizer(AppBase):
                 layers.append(entry)
             entry[a_property] += 1
 
+    def report_anonymized(self, names):
+        """
+        Report a packet anonymized without scapy
+        :param names: The names of the layers of the packet
+        :type names: list[str]
+        """
+        for name in names:
+            layer_action = self.layers[name]
+            if layer_action.name == 'anonymize':
+                self.__report_increment_layer(name, 'anonymized')
+            elif layer_action.name == 'pass':
+                self.__report_increment_layer(name, 'pass')
+
+        report = [self.report.setdefault('anonymization', dict()).setdefault('packets', list()),
+                  self.report.setdefault('files', dict()).setdefault(self.app.manager.file.current_file,
+                                                                     dict()).setdefault('packets', list())]
+        self.__report_increment_stack(report, ' / '.join(names), 'anonymized')
+
     def reset(self):
         """
         Reset between phase
@@ -252,6 +327,10 @@ class PacketAnonymizer(AppBase):
         if self.app.phase == 1:
             a_global = self.report.setdefault('discovery', dict())
         elif self.app.phase == 3:
+            if self.app.single_pass:
+                discovery = self.report.setdefault('discovery', dict())
+                discovery['packets'] = list()
+                discovery['layers'] = list()
             a_global = self.report.setdefault('anonymization', dict())
             files = self.report.setdefault('files', dict())
             for a_file in files.values():
@@ -337,20 +416,49 @@ class AnonymizeLayerAction(LayerAction):
         """
         self.fields = self.__fields()
 
+        self.pass_action = self.app.manager.action.get_action('pass')
+        """
+        The action of the fields that are not modified
+        :type : Action
+        """
+
+        self.plans = dict()
+        """
+        The compiled plans, the key contain the names of the fields of a layer and the value contain the plan
+        :type : dict[tuple[str], list[(str, Action | None)]]
+        """
+
     def discover(self, layer):
-        for field in layer.fields.keys():
+        for field, action in self.__get_plan(layer):
             try:
-                self.__discover_field(layer, field)
+                if action is None:
+                    self.__discover_pass_field(layer, field)
+                else:
+                    self.__discover_field(layer, field, action)
             except Exception as e:
                 raise_drop_exception(e, "field = '{}'".format(field))
 
     def anonymize(self, layer):
-        for field in layer.fields.keys():
+        updated = False
+        skipped = None
+        for field, action in self.__get_plan(layer):
             try:
-                self.__anonymize_field(layer, field)
+                if action is None:
+                    if self.__anonymize_pass_field(layer, field):
+                        updated = True
+                    elif skipped is None:
+                        skipped = field
+                elif self.__anonymize_field(layer, field, action):
+                    updated = True
             except Exception as e:
                 raise_drop_exception(e, "field = '{}'".format(field))
 
+        if not updated and skipped is not None:
+            # Updating a field resets the build cache of scapy, the layer must be built from its fields
+            values = getattr(layer, skipped)
+            if values is not None:
+                setattr(layer, skipped, values)
+
     def validate(self, layer):
         validation = list()
         for field in layer.fields.keys():
@@ -361,15 +469,51 @@ class AnonymizeLayerAction(LayerAction):
 
         return '{}:\n  {}'.format(layer.__class__.__name__, '\n  '.join(validation))
 
-    def __discover_field(self, layer, field):
+    def __get_plan(self, layer):
+        """
+        Get the plan for the fields of the specified layer, the plan is compiled on first use
+
+        The plan contains each field with its action in the order of the layer, the action is None for the fields that
+        are not modified.
+        :param layer: The scapy layer
+        :type layer: Packet
+        :return: The fields with their action
+        :rtype: list[(str, Action | None)]
+        """
+        key = tuple(layer.fields)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = list()
+            for field in key:
+                action = self.fields[field.lower()]
+                if action is self.pass_action:
+                    action = None
+                plan.append((field, action))
+            self.plans[key] = plan
+        return plan
+
+    def __discover_pass_field(self, layer, field):
+        """
+        Discover the field not modified from the specified layer, only the layers in the field are discovered
+        :param layer: The scapy layer
+        :type layer: Packet
+        :param field: The field name
+        :type field: str
+        """
+        values = getattr(layer, field)
+        if isinstance(values, Packet):
+            self.app.packet.discover(values)
+
+    def __discover_field(self, layer, field, action):
         """
         Discover the field for from the specified layer
         :param layer: The scapy layer
         :type layer: Packet
         :param field: The field name
         :type field: str
+        :param action: The action of the field
+        :type action: Action
         """
-        action = self.fields[field.lower()]
         values = getattr(layer, field)
 
         if values is not None:
@@ -385,19 +529,42 @@ class AnonymizeLayerAction(LayerAction):
                 else:
                     self.__discover_value(action, values)
 
-    def __anonymize_field(self, layer, field):
+    def __anonymize_pass_field(self, layer, field):
         """
-        Anonymize the field for from the specified layer
+        Anonymize the field not modified from the specified layer, only the layers in the field are anonymized
         :param layer: The scapy layer
         :type layer: Packet
         :param field: The field name
         :type field: str
+        :return: True if the field is updated, False otherwise
+        :rtype: bool
         """
-        action = self.fields[field.lower()]
+        values = getattr(layer, field)
+
+        if isinstance(values, list):
+            for value in values:
+                if isinstance(value, Packet):
+                    self.app.packet.anonymize(value)
+        elif isinstance(values, Packet):
+            self.app.packet.anonymize(values)
+        else:
+            return False
 
-        # if action.name == 'pass' and layer.__class__.__name__ == 'IP' and field == 'options':
-        #     return
+        setattr(layer, field, values)  # Update the field
+        return True
 
+    def __anonymize_field(self, layer, field, action):
+        """
+        Anonymize the field for from the specified layer
+        :param layer: The scapy layer
+        :type layer: Packet
+        :param field: The field name
+        :type field: str
+        :param action: The action of the field
+        :type action: Action
+        :return: True if the field is updated, False otherwise
+        :rtype: bool
+        """
         values = getattr(layer, field)
 
         if values is not None:
@@ -413,6 +580,8 @@ class AnonymizeLayerAction(LayerAction):
                 else:
                     values = self.__anonymize_value(action, values)
             setattr(layer, field, values)  # Update the field
+            return True
+        return False
 
     def __validate_field(self, layer, field):
         """
@@ -26,61 +26,81 @@ from sirano.action import Action
 class AutoAction(Action):
     """
     Action plugin for unknown data structures (automatic)
+
+    The string is prepared once for all the Data plugins, then each Data plugin searches its values in the prepared
+    string with its own regular expressions, in the priority order. The values accepted are masked before the search
+    of the next Data plugin, and the output is built in one join from the non-overlapping spans of the values.
     """
 
     name = "auto"
 
+    data_names = ['ip', 'domain', 'mac', 'phone', 'name']
+    """
+    The names of the Data plugins in the priority order, a value that overlaps a value of a previous Data plugin is
+    not replaced
+    """
+
     def __init__(self, app):
         super(AutoAction, self).__init__(app)
 
-    def __discover_generic(self, string, data):
-        """
-        Generic method for the discover process
-        :param string: the string to discover
-        :type string: str
-        :param data: the name of the data manager to use
-        :type data: str
-        """
-        # :type Data
-        data = self.app.manager.data.get_data(data)
-        # :type list[str]
-        values = data.find_values(string)
-        # Remove duplicates
-        values = set(values)
-        for value in values:
-            data.add_value(value, False)
-
-    def __anonymize_generic(self, string, data):
+    def __get_data(self):
         """
-        Generic method for the anonymize process
-        :param string: the string to anonymize
-        :type string: str
-        :param data: the name of the data manager to use
-        :type data: str
-        :return The anonymized value
-        :rtype str
+        Get the Data plugins in the priority order
+        :return: The Data plugins
+        :rtype: list[Data]
         """
-        # :type Data
-        data = self.app.manager.data.get_data(data)
-        # :type list[str]
-        values = data.find_values(string)
-        values.sort(key=len, reverse=True)  # Replace the longest value first
-        for value in values:
-            replacement = data.get_replacement(value)
-            string = string.replace(value, replacement)
-        return string
+        return [self.app.manager.data.get_data(name) for name in self.data_names]
 
     def discover(self, value):
-        self.__discover_generic(value, 'ip')
-        self.__discover_generic(value, 'domain')
-        self.__discover_generic(value, 'mac')
-        self.__discover_generic(value, 'phone')
-        self.__discover_generic(value, 'name')
+        datas = self.__get_data()
+        string = datas[0].prepare_find(value)  # Prepared only once, the exclusions are the same for all Data plugins
+        for data in datas:
+            # Remove duplicates
+            for a_value in set(data.find_prepared_values(string)):
+                data.add_value(a_value, False)
 
     def anonymize(self, value):
-        value = self.__anonymize_generic(value, 'ip')
-        value = self.__anonymize_generic(value, 'domain')
-        value = self.__anonymize_generic(value, 'mac')
-        value = self.__anonymize_generic(value, 'phone')
-        value = self.__anonymize_generic(value, 'name')
-        return value
+        taken = [False] * len(value)  # The characters already replaced
+        spans = list()  # The start, the end and the replacement of the values to replace
+
+        datas = self.__get_data()
+        string = datas[0].prepare_find(value)  # Prepared only once, the exclusions are the same for all Data plugins
+
+        for data in datas:
+            values = data.find_prepared_values(string)
+            unique_values = list()
+            for a_value in values:
+                if a_value and a_value not in unique_values:
+                    unique_values.append(a_value)
+            unique_values.sort(key=len, reverse=True)  # Replace the longest value first
+
+            for a_value in unique_values:
+                replacement = None
+                start = value.find(a_value)
+                while start != -1:
+                    end = start + len(a_value)
+                    if any(taken[start:end]):
+                        start = value.find(a_value, start + 1)
+                        continue
+                    if replacement is None:
+                        replacement = data.get_replacement(a_value)
+                    taken[start:end] = [True] * len(a_value)
+                    spans.append((start, end, replacement))
+                    start = value.find(a_value, end)
+
+                if replacement is not None:
+                    # Hide the value from the next Data plugins, like if it was already replaced
+                    string = string.replace(a_value, '\x00' * len(a_value))
+
+        if len(spans) == 0:
+            return value
+
+        spans.sort()
+        pieces = list()
+        position = 0
+        for start, end, replacement in spans:
+            pieces.append(value[position:start])
+            pieces.append(replacement)
+            position = end
+        pieces.append(value[position:])
+        return ''.join(pieces)
@@ -27,17 +27,23 @@ class RTPPayloadAction(Action):
 
     name = "raw-payload"
 
+    text = "ANONYMIZED BY SIRANO "
+    """The text repeated in the anonymized content"""
+
     def __init__(self, app):
         super(RTPPayloadAction, self).__init__(app)
 
+        self.filler = self.text
+        """
+        The text repeated, sliced to the length of the content to anonymize
+        :type: str
+        """
+
     def anonymize(self, value):
         value_len = len(value)
-        text = "ANONYMIZED BY SIRANO "
-        text_len = len(text)
-        s = ''
-        for i in range(value_len):
-            s += text[i % text_len]
-        return s
+        if value_len > len(self.filler):
+            self.filler = self.text * (value_len / len(self.text) + 1)
+        return self.filler[:value_len]
 
     def discover(self, value):
         pass
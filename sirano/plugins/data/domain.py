@@ -19,12 +19,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 from sirano.exception import ValueNotFoundException
-from sirano.utils import word_generator, word_generate
 
 import re
 
 from sirano.data import Data
-from tld import get_tld
+from sirano.label import LabelTrie
+from sirano.suffix import PublicSuffixTrie
 
 
 class DomainData(Data):
@@ -40,13 +40,22 @@ class DomainData(Data):
     re_domain_find = re.compile(r"((?:(?:[A-Z0-9\-_]{0,63})\.){2,127})", re.IGNORECASE)
     """The regular expression for finding a domain name"""
 
+    valid_cache_size = 65536
+    """The maximum number of values in the cache of the validity"""
+
+    rules = None
+    """
+    The rules of the bundled suffix list, loaded once for all the instances
+    :type: list[str]
+    """
+
     def __init__(self, app):
         super(DomainData, self).__init__(app)
 
         self.domains = None
         """
         Domain names with replacement values
-        :type: dict[str, str]
+        :type: LabelTrie
         """
 
         self.tlds = self.conf.get('tlds', list())
@@ -55,6 +64,18 @@ class DomainData(Data):
         :type: list[str]
         """
 
+        self.suffixes = None
+        """
+        The suffixes of the bundled suffix list and the top level domains
+        :type: PublicSuffixTrie
+        """
+
+        self.valids = dict()
+        """
+        Cache of the validity of the values, see is_valid()
+        :type: dict[str, bool]
+        """
+
         self.exclusion = set()
         """
         Domain to not anonymize
@@ -68,42 +89,62 @@ class DomainData(Data):
         """
 
     def post_load(self):
-        self.domains = self.link_data('domains', dict)
+        self.domains = self.link_data('domains', LabelTrie)
         self.post_load_exclusion()
         self.post_load_special_char()
+        self.__post_load_suffixes()
 
     def process(self):
         for domain, replacement in self.domains.items():
             self.data_report_processed('domain', 'number')
             if replacement is None:
-                if domain in self.exclusion:
-                    self.domains[domain] = domain
-                else:
-                    try:
-                        self.__process_domain(domain)
-                    except Exception as e:
-                        self.data_report_processed('domain', 'error')
-                        self.app.log.error(
-                            "data:domain: Fail to process domain='{}', exception='{}', message='{}'".format(
-                                domain, type(e), e.message
-                            ))
-                        raise
-                self.data_report_processed('domain', 'processed')
+                self.__process_entry(domain)
+
+    def process_value(self, value):
+        if self.domains.get(value) is None:
+            self.data_report_processed('domain', 'number')
+            self.__process_entry(value)
+
+    def __process_entry(self, domain):
+        """
+        Generate the replacement value for a domain
+        :param domain: The domain
+        :type domain: str
+        """
+        if domain in self.exclusion:
+            self.domains[domain] = domain
+            self.journal('domains', domain, domain)
+        else:
+            try:
+                self.__process_domain(domain)
+            except Exception as e:
+                self.data_report_processed('domain', 'error')
+                self.app.log.error(
+                    "data:domain: Fail to process domain='{}', exception='{}', message='{}'".format(
+                        domain, type(e), e.message
+                    ))
+                raise
+        self.data_report_processed('domain', 'processed')
 
     def is_valid(self, value):
 
         if not isinstance(value, str):
             return False
 
-        # Check if it is not an IP address to avoid confusion
-        if self.app.manager.data.get_data('ip').is_valid(value):
-            return False
+        try:
+            return self.valids[value]
+        except KeyError:
+            pass
 
-        # Check if the value ends with a TLD
-        if (get_tld('http://' + value, fail_silently=True) is None) and (self.__tld_exist(value) is False):
-            return False
+        # Check if it is not an IP address to avoid confusion, then if the value ends with a TLD
+        valid = not self.app.manager.data.get_data('ip').is_valid(value) and \
+            self.suffixes.has_suffix(value) and \
+            self.re_domain.match(value) is not None
 
-        return self.re_domain.match(value) is not None
+        if len(self.valids) >= self.valid_cache_size:
+            self.valids.clear()
+        self.valids[value] = valid
+        return valid
 
     def get_number_of_values(self):
         return len(self.domains)
@@ -116,7 +157,7 @@ class DomainData(Data):
         return value in self.domains
 
     def has_replacement(self, replacement):
-        return replacement in self.domains.values()
+        return self.domains.has_replacement(replacement)
 
     def _find_values(self, string):
         founds = self.re_domain_find.findall(string)
@@ -126,6 +167,7 @@ class DomainData(Data):
     def _add_value(self, value):
         if value not in self.domains:
             self.domains[value] = None
+            self.journal('domains', value, None)
             return True
         return False
 
@@ -139,20 +181,6 @@ class DomainData(Data):
 
         return r
 
-    def __tld_exist(self, domain):
-        """
-        Check if domain has an existent TLD in local list
-        :param domain: the domain to check
-        :type domain: str
-        :return: True if exist, else False
-        :rtype bool
-        """
-        for tld in self.tlds:
-            if domain.endswith('.' + tld):
-                return True
-
-        return False
-
     def __process_domain(self, domain):
         """
         Process domain creates replacement values
@@ -161,30 +189,19 @@ class DomainData(Data):
         :return: Generator with domain level
         :rtype: list[str]
         """
-        domain_split = domain.split('.')
-        domain_split.reverse()
-        domain_level = ''
-        replacement_level = ''
-
-        for index, label in enumerate(domain_split):
-            if index != 0:
-                domain_level = '{}.{}'.format(label, domain_level)
-            else:
-                domain_level = label
+        labels = domain.split('.')
+        replacement_level = None
 
-            replacement = self.domains.get(domain_level, None)
+        for index, replacement in enumerate(self.domains.get_levels(domain)):
             if replacement is not None:
                 replacement_level = replacement
             else:
-                for replacement_label in self.__generate_random_label(label):
-                    if index != 0:
-                        replacement_level = '{}.{}'.format(replacement_label, replacement_level)
-                    else:
-                        replacement_level = replacement_label
-
-                    if replacement_level not in self.domains.keys():
-                        break
+                domain_level = '.'.join(labels[-index - 1:])
+                replacement_level = self.generate_replacement(
+                    domain_level, self.__generate_random_label(labels[-index - 1], replacement_level),
+                    self.__is_used_replacement)
                 self.domains[domain_level] = replacement_level
+                self.journal('domains', domain_level, replacement_level)
 
     def post_load_exclusion(self):
         """
@@ -195,20 +212,38 @@ class DomainData(Data):
             for domain in exception:
                 self.exclusion.add(domain)
 
-    def __generate_random_label(self, label):
+    def __is_used_replacement(self, replacement):
         """
-        Generate random label and preserve the special char at same position
+        Check if a replacement domain is already used as a domain or as a replacement
+        :param replacement: The replacement domain
+        :type replacement: str
+        :return: True if it is used, False otherwise
+        :rtype: True | False
+        """
+        return replacement in self.domains or self.domains.has_replacement(replacement)
+
+    def __generate_random_label(self, label, parent_replacement):
+        """
+        Get the function that generates a random label, preserving the special char at same position, under the
+        replacement of the parent domain
         :param label: The label
         :type label: str
-        :return: The anonmyized label
-        :rtype: list[str]
+        :param parent_replacement: The replacement of the parent domain or None for a top-level label
+        :type parent_replacement: str | None
+        :return: The function that generates a replacement domain
+        :rtype: () -> str
         """
-        while True:
+        label_split = self.__split_label(label)
+
+        def candidate():
             new_label = label
-            label_split = self.__split_label(label)
             for sublabel in label_split:
-                new_label = new_label.replace(sublabel, word_generate(len(sublabel)))
-            yield new_label
+                new_label = new_label.replace(sublabel, self.words.generate(len(sublabel)))
+            if parent_replacement is None:
+                return new_label
+            return '{}.{}'.format(new_label, parent_replacement)
+
+        return candidate
 
     def __split_label(self, label):
         """
@@ -230,3 +265,11 @@ class DomainData(Data):
             for sc in special_char:
                 self.special_char.append(sc)
 
+    def __post_load_suffixes(self):
+        """
+        Called by post_load() to build the trie of the suffixes, the bundled suffix list is loaded once
+        """
+        if DomainData.rules is None:
+            DomainData.rules = PublicSuffixTrie.load_rules()
+        self.suffixes = PublicSuffixTrie(DomainData.rules, self.tlds)
+        self.valids.clear()
@@ -19,16 +19,20 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+from array import array
 from collections import OrderedDict, defaultdict
 
 import random
 
 import re
 from math import ceil
+import os
 
 from netaddr import IPNetwork, IPAddress
 from sirano.data import Data
-from sirano.exception import ValueNotFoundException
+from sirano.exception import ValueNotFoundException, NamespaceExhaustedException
+from sirano.ipv4 import IPv4Dict, PrefixPreservingCipher, address_to_int, int_to_address
+from sirano.prefix import PrefixTrie
 
 
 class IPData(Data):
@@ -47,18 +51,44 @@ class IPData(Data):
 
     def __init__(self, app):
         super(IPData, self).__init__(app)
-        self.hosts = dict()
+        self.hosts = IPv4Dict()
+        """
+        Dictionary with host and replacement
+        :type: IPv4Dict
+        """
+
+        self.hosts_path = os.path.splitext(self.path)[0] + '.hosts'
+        """The path of the compact file of the hosts"""
 
         self.subnets = None
         """
-        Dictionary with subnet and replacement sorted by prefix length (longest to shortest)
+        Dictionary with subnet and replacement, the subnets loaded are sorted by prefix length (longest to shortest)
+        and the subnets discovered are appended
         :type dict[IPNetwork, IPNetwork]
         """
 
+        self.subnet_trie = PrefixTrie()
+        """
+        Trie of the subnets, for the lookup of the subnet of a host
+        :type: PrefixTrie
+        """
+
+        self.replacement_trie = PrefixTrie()
+        """
+        Trie of the subnets that have a replacement with the replacement, for the longest prefix match
+        :type: PrefixTrie
+        """
+
+        self.replacements = set()
+        """
+        The replacement subnets
+        :type: set[IPNetwork]
+        """
+
         self.blocks = self.__get_blocks()
         """
-        Addresses blocks list
-        :type list[IPNetwork]
+        Trie of the addresses blocks
+        :type PrefixTrie
         """
 
         self.exclusion = set()
@@ -67,26 +97,41 @@ class IPData(Data):
         :type: set[str]
         """
 
+        self.cipher = None
+        """
+        The prefix-preserving cipher of the keyed mode or None if the replacements are generated randomly
+        :type: PrefixPreservingCipher | None
+        """
+
     def post_load(self):
-        self.hosts = self.link_data('hosts', dict)
+        self.hosts = self.link_data('hosts', IPv4Dict)
+        self.__post_load_hosts()
         self.subnets = self.__get_subnets()
         self.__post_load_exclusion()
+        self.__post_load_cipher()
 
     def pre_save(self):
         self.__pre_save_hosts()
+        self.__pre_save_compact_hosts()
         self.__pre_save_subnets()
 
     def process(self):
-        self.__discover_subnet()
-        self.__process_subnets()
+        if self.cipher is None:  # The keyed mode does not use the subnets
+            self.__discover_subnet()
+            self.__process_subnets()
         self.__process_hosts()
 
     def clear(self):
-        for k in self.hosts.keys():
+        for k in self.hosts:
             self.hosts[k] = ''
 
     def has_replacement(self, replacement):
-        return replacement in self.hosts.values()
+        if self.hosts.has_replacement(replacement):
+            return True
+        if self.cipher is not None and self.is_valid(replacement):
+            # The replacement of a known host not processed, in the keyed mode
+            return int_to_address(self.cipher.decrypt(self.__to_int(replacement))) in self.hosts
+        return False
 
     def has_value(self, value):
         return value in self.hosts
@@ -94,6 +139,7 @@ class IPData(Data):
     def _add_value(self, ip):
         if ip not in self.hosts:
             self.hosts[ip] = None
+            self.journal('hosts', ip, None)
             return True
         return False
 
@@ -115,6 +161,11 @@ class IPData(Data):
         return values
 
     def _get_replacement(self, value):
+        if self.cipher is not None and self.is_valid(value):
+            if value in self.exclusion:
+                return value
+            return int_to_address(self.cipher.encrypt(self.__to_int(value)))
+
         r = self.hosts.get(value, None)
 
         if r is None:
@@ -123,6 +174,46 @@ class IPData(Data):
 
         return r
 
+    def get_replacements(self, addresses):
+        """
+        Get the replacements of a batch of IPv4 addresses in integer format, the unknown addresses are reported in a
+        mask instead of raising an exception
+        :param addresses: The addresses
+        :type addresses: collections.Sequence[int]
+        :return: The replacements and the mask of the unknown addresses (1 if unknown), the replacement of an unknown
+        address is 0
+        :rtype: (array.array, bytearray)
+        """
+        if self.clean_mode:
+            return array('I', [0]) * len(addresses), bytearray('\x01') * len(addresses)
+        if self.cipher is not None:
+            return array('I', map(self.cipher.encrypt, addresses)), bytearray(len(addresses))
+        if self.lazy and not isinstance(self.hosts, IPv4Dict):  # Loaded lazily from the storage
+            replacements = array('I', [0]) * len(addresses)
+            unknown = bytearray(len(addresses))
+            for index, replacement in enumerate(self.hosts.get_batch(map(int_to_address, addresses))):
+                integer = address_to_int(replacement)
+                if integer is None:
+                    unknown[index] = 1
+                else:
+                    replacements[index] = integer
+            return replacements, unknown
+        return self.hosts.get_many(addresses)
+
+    @staticmethod
+    def __to_int(value):
+        """
+        Convert a valid IPv4 address to an integer, the leading zeros of the bytes are accepted
+        :param value: The address
+        :type value: str
+        :return: The integer address
+        :rtype: int
+        """
+        integer = address_to_int(value)
+        if integer is None:
+            integer = reduce(lambda a, b: a << 8 | int(b, 10), value.split('.'), 0)
+        return integer
+
     def __get_subnets(self):
         """
         Generate the internal representation of subnets
@@ -142,66 +233,133 @@ class IPData(Data):
             except Exception as e:
                 self.app.log.error("{} : in 'ip.yml'".format(e))
 
-        subnets = OrderedDict(sorted(subnets.items(), key=lambda network: network[0].prefixlen, reverse=True))
+        self.subnets = OrderedDict()
+        self.subnet_trie = PrefixTrie()
+        self.replacement_trie = PrefixTrie()
+        self.replacements = set()
 
-        return subnets
+        for subnet, replacement in sorted(subnets.items(), key=lambda network: network[0].prefixlen, reverse=True):
+            self.__set_subnet(subnet, replacement)
+
+        return self.subnets
+
+    def __set_subnet(self, subnet, replacement):
+        """
+        Add or update a subnet and its replacement in the dictionary and the tries
+        :param subnet: The subnet
+        :type subnet: IPNetwork
+        :param replacement: The replacement subnet or None
+        :type replacement: IPNetwork | None
+        """
+        self.subnets[subnet] = replacement
+        self.subnet_trie[subnet.first, subnet.prefixlen] = subnet
+        if replacement:  # is not None
+            self.replacement_trie[subnet.first, subnet.prefixlen] = replacement
+            self.replacements.add(replacement)
+            self.journal('subnets', str(subnet), '{}/{}'.format(replacement.ip, subnet.prefixlen))
+        else:
+            self.journal('subnets', str(subnet), None)
 
     def __pre_save_subnets(self):
         """ Transform subnets property to be serialized """
         subnets = dict()
         for subnet, replacement in self.subnets.items():
             if replacement:  # is not None
-                replacement.prefixlen = subnet.prefixlen
-                replacement = str(replacement)
+                replacement = '{}/{}'.format(replacement.ip, subnet.prefixlen)
             subnet = str(subnet)
             subnets[subnet] = replacement
             self.data_report_value('subnet', subnet, replacement)
         self.data['subnets'] = subnets
 
     def __process_subnets(self):
-        for subnet, replacement in reversed(self.subnets.items()):  # iterate from the shortest prefix to the longest
+        # Iterate from the shortest prefix to the longest
+        subnets = sorted(self.subnets.items(), key=lambda network: network[0].prefixlen, reverse=True)
+        for subnet, replacement in reversed(subnets):
             self.data_report_processed('subnet', 'number')
             if replacement is None:
-                try:
-                    replacement = self.__anonymize_subnet(subnet)
-                    self.subnets[subnet] = replacement
-                    self.data_report_processed('subnet', 'processed')
-                except Exception as e:
-                    self.data_report_processed('subnet', 'error')
-                    self.app.log.error("sirano:data:ip: Fail to generate a replacement value, subnet='{}', "
-                                       "exception='{}', message='{}".format(subnet, type(e), e.message))
-                    raise
+                self.__process_subnet(subnet)
+
+    def __process_subnet(self, subnet):
+        """
+        Generate the replacement value for a subnet
+        :param subnet: The subnet
+        :type subnet: IPNetwork
+        """
+        try:
+            replacement = self.__anonymize_subnet(subnet)
+            self.__set_subnet(subnet, replacement)
+            self.data_report_processed('subnet', 'processed')
+        except Exception as e:
+            self.data_report_processed('subnet', 'error')
+            self.app.log.error("sirano:data:ip: Fail to generate a replacement value, subnet='{}', "
+                               "exception='{}', message='{}".format(subnet, type(e), e.message))
+            raise
 
     def __process_hosts(self):
-        for host, replacement in self.hosts.items():
+        for host, replacement in self.hosts.iteritems():
             self.data_report_processed('host', 'number')
             if replacement is None or replacement == 'None':  # is None
-                if host in self.exclusion:
-                    self.hosts[host] = host
+                self.__process_host(host)
+
+    def __process_host(self, host):
+        """
+        Generate the replacement value for a host
+        :param host: The host
+        :type host: str
+        """
+        if host in self.exclusion:
+            self.hosts[host] = host
+        else:
+            try:
+                if self.cipher is not None:
+                    self.hosts[host] = self._get_replacement(host)
                 else:
-                    try:
-                        replacement = self.__anonymize_host(IPAddress(host))
-                        self.hosts[host] = str(replacement)
-                    except Exception as e:
-                        self.data_report_processed('host', 'error')
-                        self.app.log.error("sirano:data:ip: Fail to generate a replacement value, host='{}', "
-                                           "host='{}', exception='{}', message='{}'".format(host, type(e), e.message))
-                        raise
-                self.data_report_processed('host', 'processed')
+                    self.hosts[host] = str(self.__anonymize_host(IPAddress(host)))
+            except Exception as e:
+                self.data_report_processed('host', 'error')
+                self.app.log.error("sirano:data:ip: Fail to generate a replacement value, host='{}', "
+                                   "host='{}', exception='{}', message='{}'".format(host, type(e), e.message))
+                raise
+        self.journal('hosts', host, self.hosts[host])
+        self.data_report_processed('host', 'processed')
+
+    def process_value(self, value):
+        replacement = self.hosts.get(value)
+        if replacement is not None and replacement != 'None':
+            return
+        self.data_report_processed('host', 'number')
+        if value not in self.exclusion and self.cipher is None:
+            subnet = self.__discover_host_subnet(IPAddress(value))
+            if subnet is not None:
+                self.data_report_processed('subnet', 'number')
+                self.__process_subnet(subnet)
+        self.__process_host(value)
 
     def __get_blocks(self):
         """
         Retrieve the blocks of addresses from the configuration and generate the internal representation
         :return: the blocks
-        :rtype IPNetwork
+        :rtype PrefixTrie
         """
-        blocks = list()
+        blocks = PrefixTrie()
         for network in self.conf['blocks']:
-            blocks.append(IPNetwork(network))
-        # Sort by prefix length (longest to shortest)
-        blocks = sorted(blocks, key=lambda x: x.prefixlen, reverse=True)
+            network = IPNetwork(network)
+            blocks[network.first, network.prefixlen] = network
         return blocks
 
+    @staticmethod
+    def __get_prefix(ip_address):
+        """
+        Get the prefix of an IP address or network for the lookup in a trie
+        :param ip_address: The IP address or network
+        :type ip_address: IPAddress | IPNetwork
+        :return: The integer value of the network and the prefix length
+        :rtype: (int, int)
+        """
+        if isinstance(ip_address, IPNetwork):
+            return ip_address.first, ip_address.prefixlen
+        return int(ip_address), 32
+
     @staticmethod
     def __round_down_prefix(prefix):
         """
@@ -228,9 +386,9 @@ class IPData(Data):
         :return: the network of the block
         :rtype IPNetwork
         """
-        for network in self.blocks:
-            if ip_address in network:
-                return network
+        network = self.blocks.longest_match(*self.__get_prefix(ip_address))
+        if network is not None:
+            return network
         raise Exception("No block is found for the ip {}".format(ip_address))
 
     def __get_lpm_subnet_replacement(self, ip_address):
@@ -241,10 +399,7 @@ class IPData(Data):
         :return: the replacement subnet or None if not found
         :rtype IPNetwork | None
         """
-        for subnet, replacement in self.subnets.items():
-            if replacement and ip_address in subnet:
-                return replacement
-        return None
+        return self.replacement_trie.longest_match(*self.__get_prefix(ip_address))
 
     def __is_subnet_exists_in_supernet(self, supernet):
         """
@@ -254,10 +409,7 @@ class IPData(Data):
         :return: True if exists, False otherwise
         :rtype True | False
         """
-        for subnet, replacement in self.subnets.items():
-            if replacement and subnet in supernet:
-                return True
-        return False
+        return self.replacement_trie.has_subprefix(supernet.first, supernet.prefixlen)
 
     def __is_subnet_exists(self, host):
         """
@@ -267,10 +419,7 @@ class IPData(Data):
         :return: True if exists, False otherwise
         :rtype True | False
         """
-        for subnet in self.subnets.keys():
-            if host in subnet:
-                return True
-        return False
+        return self.subnet_trie.longest_match(int(host)) is not None
 
     def __is_replacement_subnet_exists(self, subnet):
         """
@@ -281,11 +430,7 @@ class IPData(Data):
         :return: True if exists, False otherwise
         :rtype True | False
         """
-        # TODO Optimize this search
-        for replacement in self.subnets.values():
-            if replacement == subnet:
-                return True
-        return False
+        return subnet in self.replacements
 
     def __anonymize_host(self, host):
         """
@@ -295,7 +440,6 @@ class IPData(Data):
         :return: The anonymized host
         :rtype: IPAddress
         """
-
         subnet = self.__get_lpm_subnet_replacement(host)
 
         if not subnet:  # is None
@@ -337,21 +481,29 @@ class IPData(Data):
             if host in self.exclusion:
                 continue
 
-            host = IPAddress(host)
+            self.__discover_host_subnet(IPAddress(host))
 
-            if self.__is_subnet_exists(host):
-                continue
+    def __discover_host_subnet(self, host):
+        """
+        Creates a subnet with prefix /24 for an IP that not match with an existent one
+        :param host: The host
+        :type host: IPAddress
+        :return: The new subnet or None if a subnet already exists for the host
+        :rtype: IPNetwork | None
+        """
+        if self.__is_subnet_exists(host):
+            return None
 
-            subnet = IPNetwork(host)
-            subnet.prefixlen = 24
+        subnet = IPNetwork(host)
+        subnet.prefixlen = 24
 
-            # Remove the host part
-            subnet = IPNetwork(subnet.network)
-            subnet.prefixlen = 24
+        # Remove the host part
+        subnet = IPNetwork(subnet.network)
+        subnet.prefixlen = 24
 
-            self.subnets[subnet] = None
+        self.__set_subnet(subnet, None)
 
-        self.subnets = OrderedDict(sorted(self.subnets.items(), key=lambda network: network[0].prefixlen, reverse=True))
+        return subnet
 
     @staticmethod
     def __ip_address_to_bytes(ip_address):
@@ -371,6 +523,7 @@ class IPData(Data):
         :type subnet: IPNetwork
         :return: the anonymized network
         :rtype IPNetwork
+        :raise NamespaceExhaustedException: All the subnets of the supernet are used
         """
 
         if self.__is_subnet_exists_in_supernet(subnet):
@@ -379,6 +532,7 @@ class IPData(Data):
 
         supernet = self.__get_lpm_subnet_replacement(subnet)
         if supernet is not None:
+            supernet = IPNetwork(supernet)  # Keep the replacement of the supernet unchanged
             supernet.prefixlen = self.__round_down_prefix(supernet.prefixlen)
         else:
             supernet = self.__get_lpm_block(subnet)
@@ -429,12 +583,54 @@ class IPData(Data):
                     return new_subnet
                 else:
                     return None
-        return replace_byte(0)
+
+        replacement = replace_byte(0)
+        if replacement is None:
+            raise NamespaceExhaustedException("All the replacement subnets are used, data = '{}', subnet = '{}', "
+                                              "supernet = '{}'".format(self.name, subnet, supernet))
+        return replacement
 
     def __pre_save_hosts(self):
-        for value, replacement in self.hosts.items():
+        for value, replacement in self.hosts.iteritems():
             self.data_report_value('host', value, replacement)
 
+    def __post_load_hosts(self):
+        """
+        Called by post_load() to load the compact file of the hosts, the hosts of the YAML file are added
+        """
+        if os.path.isfile(self.hosts_path):
+            hosts = IPv4Dict()
+            with open(self.hosts_path, 'rb') as f:
+                hosts.load(f)
+            hosts.update(self.hosts)
+            self.hosts = self.data['hosts'] = hosts
+
+    def __pre_save_compact_hosts(self):
+        """
+        Called by pre_save() to save the hosts in the compact file if it is enabled, only the hosts that are not
+        canonical IPv4 addresses are kept in the YAML file
+        """
+        if self.conf.get('compact-hosts', False):
+            with open(self.hosts_path, 'wb') as f:
+                self.hosts.dump(f)
+            self.data['hosts'] = dict(self.hosts.others)
+        else:
+            self.data['hosts'] = self.hosts
+            if os.path.isfile(self.hosts_path):
+                os.remove(self.hosts_path)
+
+    def __post_load_cipher(self):
+        """
+        Called by post_load() to create the prefix-preserving cipher if the keyed mode is enabled
+        """
+        if self.secret is None:
+            self.cipher = None
+            return
+
+        blocks = [IPNetwork(network) for network in self.conf['blocks']]
+        exclusion = [address_to_int(ip) for ip in self.exclusion if address_to_int(ip) is not None]
+        self.cipher = PrefixPreservingCipher(self.secret, [(b.first, b.prefixlen) for b in blocks], exclusion)
+
     def __post_load_exclusion(self):
         """
         Called by post_load() to load internal representation of exception
@@ -24,7 +24,7 @@ import re
 
 import netaddr
 
-from sirano.data import Data
+from sirano.data import Data, ReplacementDict
 from sirano.exception import ValueNotFoundException
 
 
@@ -36,6 +36,9 @@ class MacData(Data):
     re_mac_find = re.compile(r"((?:[0-9a-fA-F]{2}[:\.-]?){5}[0-9a-fA-F]{2})", re.IGNORECASE)
     """Simple regegular expression to find MAC addresses"""
 
+    re_mac_colon = re.compile(r"^(?:[0-9a-f]{2}:){5}[0-9a-f]{2}$", re.IGNORECASE)
+    """The regular expression for a MAC address in the format aa:bb:cc:dd:ee:ff"""
+
     re_mac = re.compile(r"^((?:(?:(?:[0-9A-F]{2}[:-]){5}[0-9A-F]{2})|(?:(?:[0-9A-F]{4}\.){2}[0-9A-F]{4})))$",
                         re.IGNORECASE)
     """
@@ -82,28 +85,47 @@ class MacData(Data):
         for k, v in self.macs.items():
             self.data_report_processed('mac', 'number')
             if v is None:
-                if k in self.exclusion:
-                    self.macs[k] = k
-                else:
-                    try:
-                        self.macs[k] = None
-                        n = netaddr.EUI(k)
-                        oui = self.__oui(n)
-                        r = "{}-{:02X}-{:02X}-{:02X}".format(oui,
-                                                             random.randint(0x00, 0x7f),
-                                                             random.randint(0x00, 0xff),
-                                                             random.randint(0x00, 0xff))
-                        self.macs[k] = r.replace('-', ':').lower()
-                    except Exception as e:
-                        self.data_report_processed('mac', 'error')
-                        self.app.log.error("sirano:data:mac: Fail to generate a replacement value, mac='{}',"
-                                           "exception='{}', message='{}'".format(k, type(e), e.message))
-                        raise
-                self.data_report_processed('mac', 'processed')
+                self.__process_mac(k)
+
+    def process_value(self, value):
+        if self.macs.get(value) is None:
+            self.data_report_processed('mac', 'number')
+            self.__process_mac(value)
+
+    def __process_mac(self, k):
+        """
+        Generate the replacement value for a MAC address
+        :param k: The MAC address
+        :type k: str
+        """
+        if k in self.exclusion:
+            self.macs[k] = k
+        else:
+            try:
+                self.macs[k] = None
+                n = netaddr.EUI(k)
+                oui = self.__oui(n)
+
+                def candidate():
+                    r = "{}-{:02X}-{:02X}-{:02X}".format(oui,
+                                                         random.randint(0x00, 0x7f),
+                                                         random.randint(0x00, 0xff),
+                                                         random.randint(0x00, 0xff))
+                    return r.replace('-', ':').lower()
+
+                self.macs[k] = self.generate_replacement(k, candidate, self.macs.has_replacement)
+            except Exception as e:
+                self.data_report_processed('mac', 'error')
+                self.app.log.error("sirano:data:mac: Fail to generate a replacement value, mac='{}',"
+                                   "exception='{}', message='{}'".format(k, type(e), e.message))
+                raise
+        self.journal('macs', k, self.macs[k])
+        self.data_report_processed('mac', 'processed')
 
     def _add_value(self, value):
         if value not in self.macs:
             self.macs[value] = None
+            self.journal('macs', value, None)
             return True
         return False
 
@@ -114,6 +136,33 @@ class MacData(Data):
                 self.name, value))
         return r
 
+    def get_replacements(self, addresses):
+        """
+        Get the replacements of a batch of MAC addresses in integer format, the unknown addresses are reported in a
+        mask instead of raising an exception
+
+        The addresses are looked up in the format aa:bb:cc:dd:ee:ff, a replacement in another format is unknown.
+        :param addresses: The addresses
+        :type addresses: collections.Sequence[int]
+        :return: The replacements and the mask of the unknown addresses (1 if unknown), the replacement of an unknown
+        address is 0
+        :rtype: (list[int], bytearray)
+        """
+        replacements = [0] * len(addresses)
+        unknown = bytearray('\x01') * len(addresses)
+        if self.clean_mode:
+            return replacements, unknown
+
+        for index, address in enumerate(addresses):
+            value = '%012x' % address
+            value = ':'.join(value[i:i + 2] for i in xrange(0, 12, 2))
+            replacement = self.macs.get(value)
+            if replacement is None or not self.re_mac_colon.match(replacement):
+                continue
+            replacements[index] = int(replacement.replace(':', ''), 16)
+            unknown[index] = 0
+        return replacements, unknown
+
     def is_valid(self, value):
 
         if not isinstance(value, str):
@@ -126,7 +175,7 @@ class MacData(Data):
         return len(self.macs)
 
     def has_replacement(self, replacement):
-        return replacement in self.macs.values()
+        return self.macs.has_replacement(replacement)
 
     def has_value(self, value):
         return value in self.macs
@@ -143,7 +192,9 @@ class MacData(Data):
         """
         Called by post_load() to load internal representation of macs
         """
-        self.macs = self.link_data('macs', dict)
+        self.macs = self.link_data('macs', ReplacementDict)
+        if self.lazy:  # The saved macs are already in lower case
+            return
         for k, v in self.macs.items():
             old_k = k
             k = k.lower()
@@ -22,9 +22,9 @@
 import re
 
 
-from sirano.data import Data
+from sirano.data import Data, ReplacementDict
 from sirano.exception import ValueNotFoundException
-from sirano.utils import word_generate
+from sirano.matcher import MultiStringMatcher
 
 
 class NameData(Data):
@@ -44,6 +44,12 @@ class NameData(Data):
         :type: dict[str, str]
         """
 
+        self.matcher = None
+        """
+        Matcher of the names, used to find the names in a string
+        :type: MultiStringMatcher
+        """
+
         self.special_char = None
         """
         Special characters
@@ -60,6 +66,8 @@ class NameData(Data):
         value = value.lower()
         if value not in self.names:
             self.names[value] = None
+            self.journal('names', value, None)
+            self.matcher.add(value)
             return True
         return False
 
@@ -67,21 +75,36 @@ class NameData(Data):
         for name, replacement in self.names.items():
             self.data_report_processed('name', 'number')
             if replacement is None:
-                if name in self.exclusion:
-                    self.names[name] = name
-                else:
-                    try:
-                        replacement = self.__generate_name(name)
-                        self.names[name] = replacement
-                    except Exception as e:
-                        self.data_report_processed('name', 'error')
-                        self.app.log.error("sirano:data:name: Fail to generation a replacement value, name='{}',"
-                                           "exception='{}', message='{}'".format(name, type(e), e.message))
-                        raise
-                self.data_report_processed('name', 'processed')
+                self.__process_name(name)
+
+    def process_value(self, value):
+        value = value.lower()
+        if self.names.get(value) is None:
+            self.data_report_processed('name', 'number')
+            self.__process_name(value)
+
+    def __process_name(self, name):
+        """
+        Generate the replacement value for a name
+        :param name: The name
+        :type name: str
+        """
+        if name in self.exclusion:
+            self.names[name] = name
+        else:
+            try:
+                self.names[name] = self.__generate_name(name)
+            except Exception as e:
+                self.data_report_processed('name', 'error')
+                self.app.log.error("sirano:data:name: Fail to generation a replacement value, name='{}',"
+                                   "exception='{}', message='{}'".format(name, type(e), e.message))
+                raise
+        self.journal('names', name, self.names[name])
+        self.data_report_processed('name', 'processed')
 
     def post_load(self):
-        self.names = self.link_data('names', dict)
+        self.names = self.link_data('names', ReplacementDict)
+        self.matcher = MultiStringMatcher(self.names.keys())
         self.special_char = self.conf.get('special-char', list())
         self.__post_load_exclusion()
 
@@ -95,7 +118,7 @@ class NameData(Data):
 
     def has_replacement(self, replacement):
         replacement = replacement.lower()
-        return replacement in self.names.values()
+        return self.names.has_replacement(replacement)
 
     def has_value(self, value):
         value = value.lower()
@@ -117,15 +140,13 @@ class NameData(Data):
         self.data['names'] = self.names
         for value, replacement in self.names.items():
             self.data_report_value('name', value, replacement)
-        self.names = dict(self.names)
+        self.names = ReplacementDict(self.names)
 
     def _find_values(self, a_string):
         values = self.re_email_find.findall(a_string)
         values = filter(lambda v: self.is_valid(v), values)
 
-        for name in self.names.keys():
-            if name in a_string:
-                values.append(name)
+        values.extend(self.matcher.find_all(a_string))
         return values
 
     def __split_name(self, name):
@@ -144,17 +165,19 @@ class NameData(Data):
         Generate a random name and keep special char
         :param name: The name
         :type name: str
-        :return: The name generator
-        :rtype: list[str]
+        :return: The replacement name
+        :rtype: str
         """
         name_split = self.__split_name(name)
-        while True:
+
+        def candidate():
             replacement = name
             for subname in name_split:
-                word = word_generate(len(subname))
+                word = self.words.generate(len(subname))
                 replacement = replacement.replace(subname, word, 1)
-            if replacement not in self.names.values():
-                return replacement
+            return replacement
+
+        return self.generate_replacement(name, candidate, self.names.has_replacement)
 
     def __post_load_exclusion(self):
         """
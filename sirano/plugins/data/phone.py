@@ -18,13 +18,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
-from collections import OrderedDict
+from collections import Mapping, OrderedDict
 
+from itertools import product
 from random import randint, shuffle
 import re
 
-from sirano.data import Data
+from sirano.data import Data, ReplacementDict
 from sirano.exception import ValueNotFoundException
+from sirano.generator import Namespace
 from sirano.utils import str_or_none
 
 
@@ -39,6 +41,9 @@ class PhoneData(Data):
     re_phone_find_format = r"(?:^|[^a-z\d\.\-]){}(?:[^a-z\\.\-]|$)"
     """String of regular expression to find phone number in string"""
 
+    parse_cache_size = 65536
+    """The maximum number of values in the cache of the parsed values"""
+
     def __init__(self, app):
         super(PhoneData, self).__init__(app)
 
@@ -48,6 +53,30 @@ class PhoneData(Data):
         :type: list(str)
         """
 
+        self.re_format = None
+        """
+        The formats combined in a single regular expression, each format is enclosed in a group
+        :type: re.RegexObject
+        """
+
+        self.format_groups = list()
+        """
+        The index of the group that encloses each format in re_format
+        :type: list[int]
+        """
+
+        self.re_find_formats = list()
+        """
+        Regular expressions to find the phone numbers of each format in a string
+        :type: list[re.RegexObject]
+        """
+
+        self.parses = dict()
+        """
+        Cache of the parsed values, see __parse()
+        :type: dict[str, (int, str, str) | None]
+        """
+
         self.codes = dict()
         """
         Code with replacement code
@@ -55,7 +84,13 @@ class PhoneData(Data):
         :type: dict[str, str]
         """
 
-        self.numbers = dict()
+        self.code_replacements = set()
+        """
+        The replacement codes, index of the values of codes
+        :type: set[str]
+        """
+
+        self.numbers = ReplacementDict()
         """
         Number with replacement values
         :type: dict[str, str]
@@ -75,13 +110,11 @@ class PhoneData(Data):
 
     def _get_replacement(self, value):
 
-        for a_format in self.formats:
-            match = a_format.match(value)
-            if match is not None:
-                prefix = match.group(1)
-                number = match.group(2)
-                replacement = self.numbers.get(number, None)
-                return prefix + replacement
+        parse = self.__parse(value)
+        if parse is not None:
+            _, prefix, number = parse
+            replacement = self.numbers.get(number, None)
+            return prefix + replacement
 
         raise ValueNotFoundException("Replacement value not found, data = '{}', value = {}".format(self.name, value))
 
@@ -101,6 +134,19 @@ class PhoneData(Data):
         self.__anonymise_code()
         self.__anonymise_number()
 
+    def process_value(self, value):
+        parse = self.__parse(value)
+        if parse is not None:
+            _, _, number = parse
+            if self.numbers.get(number) is None:
+                self.data_report_processed('number', 'number')
+                code = self.__discover_number_code(number)
+                if code is not None:
+                    self.__sort_codes()
+                    self.data_report_processed('code', 'number')
+                    self.__anonymise_one_code(code)
+                self.__anonymise_one_number(number)
+
     def is_valid(self, value):
         if not isinstance(value, str):
             return False
@@ -108,48 +154,79 @@ class PhoneData(Data):
             self.app.log.debug("sirano:data:phone: Regex not match for value = {}".format(repr(value)))
             return False
 
-        for a_format in self.formats:
-            if a_format.match(value) is not None:
-                return True
-
-        return False
+        return self.__parse(value) is not None
 
     def get_number_of_values(self):
         return len(self.numbers)
 
     def has_replacement(self, replacement):
         self.app.log.debug("data:phone:has_replacement('{}')".format(replacement))
-        for a_format in self.formats:
-            match = a_format.match(replacement)
-            if match is not None:
-                number = match.group(2)
-                return number in self.numbers.values()
+        parse = self.__parse(replacement)
+        if parse is not None:
+            _, _, number = parse
+            return self.numbers.has_replacement(number)
         return False
 
     def has_value(self, value):
         return value in self.numbers
 
     def _add_value(self, value):
-        for a_format in self.formats:
+        parse = self.__parse(value)
+        if parse is None:
+            return True
+        index, _, number = parse
+        if number not in self.numbers:
+            self.numbers[number] = None
+            self.journal('numbers', number, None)
+            return True
+
+        # The number of the first format is already known, try the next formats
+        for a_format in self.formats[index + 1:]:
             match = a_format.match(value)
             if match is not None:
                 number = match.group(2)
                 if number not in self.numbers:
                     self.numbers[number] = None
+                    self.journal('numbers', number, None)
                     return True
         return True
 
     def _find_values(self, string):
         values = list()
-        for a_format in self.conf.get('formats', list()):
-            re_format = re.compile(self.re_phone_find_format.format(a_format), re.IGNORECASE)
-            founds = re_format.findall(string)
-            for number in founds:
+        for re_find_format in self.re_find_formats:
+            for number in re_find_format.findall(string):
                 number = ''.join(number)
-                if self.is_valid(number):
+                if isinstance(number, str) and self.re_phone.match(number) is not None and \
+                        self.__parse(number) is not None:
                     values.append(number)
         return values
 
+    def __parse(self, value):
+        """
+        Parse a value with the first format that matches the whole value, the result is cached
+        :param value: The value
+        :type value: str
+        :return: The index of the format with the prefix and the number or None if no format matches
+        :rtype: (int, str, str) | None
+        """
+        try:
+            return self.parses[value]
+        except KeyError:
+            pass
+
+        parse = None
+        match = self.re_format.match(value) if self.re_format is not None else None
+        if match is not None:
+            for index, group in enumerate(self.format_groups):
+                if match.start(group) != -1:
+                    parse = (index, match.group(group + 1), match.group(group + 2))
+                    break
+
+        if len(self.parses) >= self.parse_cache_size:
+            self.parses.clear()
+        self.parses[value] = parse
+        return parse
+
     def __post_load_exclusion(self):
         """
         Called by post_load() to load internal representation of exclusion
@@ -163,21 +240,37 @@ class PhoneData(Data):
         """
         Called by post_load() to load internal representation of formats
         """
+        self.formats = list()
+        self.format_groups = list()
+        self.re_find_formats = list()
+        self.parses.clear()
+
         formats = self.conf.get('formats')
         if isinstance(formats, list):
+            patterns = list()
+            group = 1
+            for a_format in formats:
+                a_format = re.compile('^' + a_format + '$')
+                self.formats.append(a_format)
+                self.format_groups.append(group)
+                patterns.append('(' + a_format.pattern + ')')
+                group += a_format.groups + 1
+            self.re_format = re.compile('|'.join(patterns))
+
             for a_format in formats:
-                self.formats.append(re.compile('^' + a_format + '$'))
+                self.re_find_formats.append(re.compile(self.re_phone_find_format.format(a_format), re.IGNORECASE))
 
     def __post_load_codes(self):
         """
         Called by post_load() to load internal representation of codes
         """
         codes = self.data.get('codes')
-        if isinstance(codes, dict):
+        if isinstance(codes, Mapping):
             for code, replacement in codes.items():
                 code = str(code).upper()
                 if replacement is not None:
                     replacement = str(replacement).upper()
+                    self.code_replacements.add(replacement)
                 self.codes[code] = replacement
             self.__sort_codes()
 
@@ -186,6 +279,9 @@ class PhoneData(Data):
         Called by post_load() to load internal representation of numbers
         """
         numbers = self.data.get('numbers')
+        if self.lazy and isinstance(numbers, Mapping):  # The saved numbers are already strings
+            self.numbers = numbers
+            return
         if not isinstance(numbers, dict):
             numbers = dict()
         for number, replacement in numbers.items():
@@ -224,16 +320,31 @@ class PhoneData(Data):
         Creates code if not already exists for an existent number
         """
         for number, replacement in self.numbers.items():
-            length = len(number)
-            if length <= self.digit_preserved:
-                continue
-            if (number not in self.exclusion) and (self.__get_lcm_number(number) is None):
-                code = number[:-self.digit_preserved]  # Remove the preserved digit
-                code += 'X' * self.digit_preserved
-                self.codes[code] = None
+            self.__discover_number_code(number)
 
         self.__sort_codes()
 
+    def __discover_number_code(self, number):
+        """
+        Creates code if not already exists for the specified number
+
+        The codes must be sorted with __sort_codes() after adding a code.
+        :param number: The number
+        :type number: str
+        :return: The new code or None if no code is created
+        :rtype: str | None
+        """
+        length = len(number)
+        if length <= self.digit_preserved:
+            return None
+        if (number not in self.exclusion) and (self.__get_lcm_number(number) is None):
+            code = number[:-self.digit_preserved]  # Remove the preserved digit
+            code += 'X' * self.digit_preserved
+            self.codes[code] = None
+            self.journal('codes', code, None)
+            return code
+        return None
+
     def __sort_codes(self):
         """
         For each sort codes by length (longest before)
@@ -247,29 +358,38 @@ class PhoneData(Data):
         for code, replacement in reversed(self.codes.items()):
             self.data_report_processed('code', 'number')
             if replacement is None:
-                try:
-                    supercode = self.__get_lcm_replacement(code)
-                    has_supercode = supercode is not None
-                    i = 0
-                    while True:
-                        if has_supercode:
-                            rand_code = supercode.replace('X', '') + self.__rand_str_number(
-                                len(code.replace('X', '')) - len(supercode.replace('X', '')))
-                        else:
-                            rand_code = self.__rand_str_number(len(code.replace('X', '')))
-                        rand_code += 'X' * (len(code) - len(code.replace('X', '')))
-                        if not rand_code.startswith('0') and rand_code not in self.codes.values():
-                            self.codes[code] = rand_code
-                            break
-                        i += 1
-                        if i > 1000000000000:
-                            self.app.log.error("Fail to generate code replacement value, code = '{}'".format(code))
-                    self.data_report_processed('code', 'processed')
-                except Exception as e:
-                    self.data_report_processed('code', 'error')
-                    self.app.log.error("sirano:data:phone: Fail to generate a replacement value, code='{}',"
-                                       "exception='{}', message='{}'".format(code, type(e), e.message))
-                    raise
+                self.__anonymise_one_code(code)
+
+    def __anonymise_one_code(self, code):
+        """
+        Creates the replacement value for a code
+        :param code: The code
+        :type code: str
+        """
+        try:
+            supercode = self.__get_lcm_replacement(code)
+            prefix = supercode.replace('X', '') if supercode is not None else ''
+            length = len(code.replace('X', '')) - len(prefix)
+            suffix = 'X' * (len(code) - len(code.replace('X', '')))
+
+            def candidate():
+                return prefix + self.__rand_str_number(length) + suffix
+
+            def is_used(rand_code):
+                return rand_code.startswith('0') or rand_code in self.code_replacements
+
+            namespace = Namespace(10 ** length, lambda: (prefix + ''.join(digits) + suffix
+                                                         for digits in product('0123456789', repeat=length)))
+            replacement = self.generate_replacement(code, candidate, is_used, namespace)
+            self.codes[code] = replacement
+            self.code_replacements.add(replacement)
+            self.journal('codes', code, replacement)
+            self.data_report_processed('code', 'processed')
+        except Exception as e:
+            self.data_report_processed('code', 'error')
+            self.app.log.error("sirano:data:phone: Fail to generate a replacement value, code='{}',"
+                               "exception='{}', message='{}'".format(code, type(e), e.message))
+            raise
 
     def __anonymise_number(self):
         """
@@ -278,19 +398,28 @@ class PhoneData(Data):
         for number, replacement in self.numbers.items():
             self.data_report_processed('number', 'number')
             if replacement is None:
-                if number in self.exclusion:
-                    self.numbers[number] = number
-                else:
-                    try:
-                        code = self.__get_lcm_replacement(number)
-                        replacement = code.replace('X', '') + number[len(code.replace('X', '')):]
-                        self.numbers[number] = replacement
-                    except Exception as e:
-                        self.data_report_processed('number', 'error')
-                        self.app.log.error("sirano:data:phone: Fail to generate a replacement value, number='{}',"
-                                           "exception='{}', message='{}'".format(number, type(e), e.message))
-                        raise
-                self.data_report_processed('number', 'processed')
+                self.__anonymise_one_number(number)
+
+    def __anonymise_one_number(self, number):
+        """
+        Creates the replacement value for a number
+        :param number: The number
+        :type number: str
+        """
+        if number in self.exclusion:
+            self.numbers[number] = number
+        else:
+            try:
+                code = self.__get_lcm_replacement(number)
+                replacement = code.replace('X', '') + number[len(code.replace('X', '')):]
+                self.numbers[number] = replacement
+            except Exception as e:
+                self.data_report_processed('number', 'error')
+                self.app.log.error("sirano:data:phone: Fail to generate a replacement value, number='{}',"
+                                   "exception='{}', message='{}'".format(number, type(e), e.message))
+                raise
+        self.journal('numbers', number, self.numbers[number])
+        self.data_report_processed('number', 'processed')
 
     @staticmethod
     def __rand_str_number(length):
@@ -20,18 +20,32 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from collections import defaultdict
+import multiprocessing
 import os.path
 import errno
+import shutil
+import struct
 
 import magic
+from scapy.config import conf
+from scapy.layers.l2 import Ether
 from scapy.packet import Packet
-from scapy.utils import PcapWriter, PcapReader
+from scapy.utils import PcapWriter, PcapReader, RawPcapReader, RawPcapWriter
 from enum import Enum
 import subprocess
 from sirano.app import Phase
 
 from sirano.exception import ExplicitDropException, ImplicitDropException, ErrorDropException
-from sirano.file import File
+from sirano.fastpath import FastPathAnonymizer
+from sirano.flow import MediaFlowTable
+from sirano.file import File, init_worker, run_worker_task, merge_worker_task
+from sirano.plugins.layers.sip import SDP
+
+sirano_pcap_file = None
+"""
+The PCAP file inherited by the worker processes
+:type: PCAPFile
+"""
 
 
 class _LayerActionEnum(Enum):
@@ -55,27 +69,98 @@ class _LayerAction(object):
 class PCAPFile(File):
     name = 'pcap'
 
+    pcap_header_length = 24
+    """The length of the PCAP global header"""
+
+    pcap_record_header_length = 16
+    """The length of the PCAP record header"""
+
+    pcap_magics = {'\xd4\xc3\xb2\xa1': '<',
+                   '\xa1\xb2\xc3\xd4': '>'}
+    """The PCAP magic numbers with the byte order"""
+
     def __init__(self, app, a_file):
         super(PCAPFile, self).__init__(app, a_file)
         self.validation_file_tshark = os.path.join(self.app.project.validation,
                                                    os.path.splitext(self.file)[0] + '.tshark.txt')
         self.layers = defaultdict(lambda: _LayerAction(app))
+
+        self.shard_size = self.conf.get('shard-size', 0)
+        """
+        The size in MB of the shards processed by the worker processes, 0 to never split the file
+        :type: int | float
+        """
+
+        self.shards = None
+        """
+        The shards of the file, computed on first use
+        :type: list[(int, int, int, int)]
+        """
+
+        self.fast_path = self.conf.get('fast-path', True)
+        """
+        Anonymize the Ethernet, IPv4, UDP and TCP headers without scapy when it is possible
+        :type: True | False
+        """
+
+        self.media_flows = self.conf.get('media-flows', True)
+        """
+        Decode as RTP only the UDP datagrams of the media flows negotiated by SDP
+        :type: True | False
+        """
+
+        self.media_flow_timeout = self.conf.get('media-flow-timeout', 3600)
+        """
+        The time in seconds during which a media flow is decoded after its SDP description, 0 for no limit
+        :type: int | float
+        """
+
+        self.flows = None
+        """
+        The media flows negotiated in all PCAP files, shared by the PCAP files and built on first use
+        :type: MediaFlowTable
+        """
+
         self.app.log.info("Filetype 'pcap' initialized")
 
-    def __process_packets(self, packets, out_writer, drop_writer, validation_file):
+    def __process_packets(self, reader, records, out_writer, drop_writer, validation_file, flows, first_index=0):
         """
-        :type packets: list[Packet]
+        :param reader: The PCAP reader used to dissect the records
+        :type reader: SiranoPcapReader
+        :param records: The records read by the reader
+        :type records: list[(str, (int, int, int))]
+        :param flows: The media flows used to decode the RTP datagrams, None to use only the layer bindings
+        :type flows: MediaFlowTable | None
+        :param first_index: The index of the first packet in the file
+        :type first_index: int
         :return A tuple with the number of packets anonymized and the number of packets dropped
         :rtype (int, int)
         """
 
-        for index, packet in enumerate(packets):
+        fast_path = self.__get_fast_path(reader, flows)
+        if fast_path is not None:
+            records = fast_path.iter_batches(records)
+
+        for index, record in enumerate(records, first_index):
 
             if index and (index % 10000) == 0:
                 self.app.log.info("pcap:{}: Process packet id = '{}'".format(self.file, index))
 
             packet_id = index + 1  # packet id start with 1
 
+            if fast_path is not None:
+                data = fast_path.anonymize(record[0], reader.get_time(record))
+                if data is not None:
+                    out_writer.write_raw(data, reader.get_time(record), reader.linktype)
+                    continue
+
+            packet = reader.dissect(record)
+
+            if flows is not None:
+                if self.app.single_pass:
+                    flows.add_packet(packet)
+                flows.decode(packet)
+
             # packet_backup = Packet(str(packet))
             packet_backup = packet.original
             packet_backup_time = packet.time
@@ -85,6 +170,8 @@ class PCAPFile(File):
                     if self.app.phase is Phase.phase_1:
                         self.app.packet.discover(packet)
                     elif self.app.phase is Phase.phase_3:
+                        if self.app.single_pass:
+                            self.__discover_packet(packet, packet_id)
                         self.app.packet.anonymize(packet)
                     elif self.app.phase is Phase.phase_4:
                         validation = self.app.packet.validate(packet)
@@ -121,12 +208,108 @@ class PCAPFile(File):
                     "sirano:file:pcap:{}: Unexpected error: id = '{}', exception = '{}', message = '{}', {}".format(
                         self.file, packet_id, type(e), e.message, repr(packet.summary())))
 
+    def __get_fast_path(self, reader, flows):
+        """
+        Get the fast path anonymizer for the packets read by the specified reader
+        :param reader: The PCAP reader
+        :type reader: SiranoPcapReader
+        :param flows: The media flows used to decode the RTP datagrams
+        :type flows: MediaFlowTable | None
+        :return: The fast path anonymizer or None if the fast path is not used
+        :rtype: FastPathAnonymizer | None
+        """
+        if not self.fast_path or self.app.phase is not Phase.phase_3 or self.app.single_pass:
+            return None
+        if reader.LLcls is not Ether:
+            return None
+        fast_path = FastPathAnonymizer(self.app, flows)
+        if not fast_path.enabled:
+            return None
+        return fast_path
+
+    def __get_media_flows(self):
+        """
+        Get the table of the media flows negotiated in all PCAP files, the table is built on first use by scanning the
+        files and shared with the other PCAP files
+
+        The single pass mode does not scan the files, the table is filled with the SDP descriptions dissected during
+        the anonymization, so only the flows negotiated by a previous packet are decoded as RTP. Without the media
+        flows, the table decodes as RTP all the UDP datagrams that match no layer binding.
+        :return: The table
+        :rtype: MediaFlowTable
+        """
+        if self.flows is not None:
+            return self.flows
+
+        files = [f for f in self.app.manager.file.files if isinstance(f, PCAPFile)]
+        if self not in files:
+            files.append(self)
+
+        if not self.media_flows:
+            flows = MediaFlowTable(all_flows=True)
+        else:
+            flows = MediaFlowTable(self.media_flow_timeout)
+            self.__check_rtp_binding()
+            if not self.app.single_pass:
+                for f in files:
+                    f.__scan_media_flows(flows)
+                self.app.log.info("file:pcap:{}: Media flows negotiated: flows = '{}'".format(
+                    self.file, len(flows.flows)))
+
+        for f in files:
+            f.flows = flows
+        return flows
+
+    def __check_rtp_binding(self):
+        """
+        Warn if the configuration of the layers binds all the UDP datagrams to RTP, the media flows are then not used
+        """
+        for elt in self.app.conf.get('layer', dict()).get('bind-layers', list()):
+            if elt.get('lower') == 'UDP' and elt.get('upper') == 'RTP' and not elt.get('fields'):
+                self.app.log.warning(
+                    "file:pcap:{}: The configuration of the layers binds UDP to RTP, all the UDP datagrams are decoded "
+                    "as RTP and the media flows are not used, remove this binding from 'layer.bind-layers' or set "
+                    "'file.pcap.media-flows' to false".format(self.file))
+
+    def __scan_media_flows(self, flows):
+        """
+        Add the media flows negotiated in the file, only the packets with a line m= are dissected
+        :param flows: The table of the media flows
+        :type flows: MediaFlowTable
+        """
+        reader = SiranoPcapReader(os.path.join(self.app.project.input, self.file))
+        try:
+            for record in iter(reader.read_record, None):
+                if '\nm=' in record[0]:
+                    flows.add_packet(reader.dissect(record))
+        except Exception as e:
+            self.app.log.error("file:pcap:{}: Media flows not scanned: exception = '{}', message = '{}'".format(
+                self.file, type(e), e.message))
+        finally:
+            reader.close()
+
+    def __discover_packet(self, packet, packet_id):
+        """
+        Discover a packet before its anonymization in the single pass mode
+
+        The drop of the packet is logged by the anonymization.
+        :param packet: The packet
+        :type packet: Packet
+        :param packet_id: The id of the packet
+        :type packet_id: int
+        """
+        try:
+            self.app.packet.discover(packet)
+        except Exception as e:
+            self.app.log.debug("file:pcap:{}: Packet not discovered: id = '{}', {}".format(
+                self.file, packet_id, e.message))
+
     def __process_file(self, name):
 
         self.app.log.info("file:pcap:{}: Start anonymization: File = '{}'".format(self.file, name))
 
         in_path = os.path.join(self.app.project.input, name)
-        packets = PcapReader(in_path)
+        reader = SiranoPcapReader(in_path)
 
         out_writer = None
         drop_writer = None
@@ -164,14 +347,17 @@ class PCAPFile(File):
             validation_file = open(path, 'w')
 
         try:
-            self.__process_packets(packets,
+            self.__process_packets(reader,
+                                   iter(reader.read_record, None),
                                    out_writer,
                                    drop_writer,
-                                   validation_file)
+                                   validation_file,
+                                   self.__get_media_flows())
         except Exception as e:
             self.app.log.critical("file:pcap:{}: Unexpected error: exception = '{}', message = '{}'".format(
                 self.file, type(e), e.message))
         finally:
+            reader.close()
             if self.app.phase is Phase.phase_3:
                 out_writer.close()
                 drop_writer.close()
@@ -181,10 +367,214 @@ class PCAPFile(File):
                 validation_file.close()
 
     def discover(self):
-        self.__process_file(self.file)
+        if self.is_parallel('discover'):
+            self.__process_shards(self.file)
+        else:
+            self.__process_file(self.file)
 
     def anonymize(self):
-        self.__process_file(self.file)
+        if self.is_parallel('anonymize'):
+            self.__process_shards(self.file)
+        else:
+            self.__process_file(self.file)
+
+    def prepare(self, method):
+        self.__get_media_flows()
+
+    def is_parallel(self, method):
+        if method == 'validate':
+            return False
+        shards = self.__get_shards()
+        return self.app.manager.file.get_number_of_workers(len(shards)) > 1
+
+    def process_shard(self, shard):
+        """
+        Process a shard of the file in a worker process
+
+        In the anonymization phase, the packets are written in the temporary files returned by __get_shard_path().
+        :param shard: The shard index, the start and end offset and the index of the first packet
+        :type shard: (int, int, int, int)
+        """
+        shard_index, start, end, first_index = shard
+
+        reader = SiranoPcapReader(os.path.join(self.app.project.input, self.file))
+        reader.f.seek(start)
+
+        out_writer = None
+        drop_writer = None
+
+        if self.app.phase is Phase.phase_3:
+            out_path = self.__get_shard_path(os.path.join(self.app.project.output, self.file), shard_index)
+            drop_path = self.__get_shard_path(os.path.join(self.app.project.trash, self.file), shard_index)
+            out_writer = SiranoPcapWriter(out_path, append=True)
+            drop_writer = SiranoPcapWriter(drop_path, append=True)
+
+        try:
+            self.__process_packets(reader,
+                                   self.__read_shard_records(reader, end),
+                                   out_writer,
+                                   drop_writer,
+                                   None,
+                                   self.__get_media_flows(),
+                                   first_index)
+        except Exception as e:
+            self.app.log.critical(
+                "file:pcap:{}: Unexpected error: shard = '{}', exception = '{}', message = '{}'".format(
+                    self.file, shard_index, type(e), e.message))
+        finally:
+            reader.close()
+            if self.app.phase is Phase.phase_3:
+                out_writer.close()
+                drop_writer.close()
+
+    def __process_shards(self, name):
+        """
+        Process the file split in shards with a pool of worker processes
+
+        The changes of the report and the values added to the Data plugins are merged in the packet order and the
+        anonymized shards are joined to obtain the same files than a serial processing.
+        :param name: The relative path of the file
+        :type name: str
+        """
+        global sirano_pcap_file
+        sirano_pcap_file = self
+
+        shards = self.__get_shards()
+        workers = self.app.manager.file.get_number_of_workers(len(shards))
+
+        self.app.log.info("file:pcap:{}: Start processing: File = '{}', shards = '{}', workers = '{}'".format(
+            self.file, name, len(shards), workers))
+
+        out_path = os.path.join(self.app.project.output, name)
+        drop_path = os.path.join(self.app.project.trash, name)
+
+        if self.app.phase is Phase.phase_3:
+            for shard in shards:
+                self.__remove(self.__get_shard_path(out_path, shard[0]))
+                self.__remove(self.__get_shard_path(drop_path, shard[0]))
+
+        pool = multiprocessing.Pool(workers, init_worker, (self.app,))
+        try:
+            for _, delta, values in pool.imap(_process_shard, shards):
+                merge_worker_task(self.app, delta, values)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            sirano_pcap_file = None
+
+        if self.app.phase is Phase.phase_3:
+            self.__join_shards(out_path, len(shards))
+            self.__join_shards(drop_path, len(shards))
+
+    def __get_shards(self):
+        """
+        Split the file in record-aligned shards of the configured size
+        :return: The list of shards with the shard index, the start and end offset and the index of the first packet,
+        an empty list if the file must not be split
+        :rtype: list[(int, int, int, int)]
+        """
+        if self.shards is not None:
+            return self.shards
+
+        self.shards = list()
+        shard_size = int(self.shard_size * 1024 * 1024)
+        path = os.path.join(self.app.project.input, self.file)
+
+        if shard_size <= 0 or os.path.getsize(path) <= shard_size:
+            return self.shards
+
+        with open(path, 'rb') as a_file:
+            endian = self.pcap_magics.get(a_file.read(4))
+            if endian is None:  # Compressed or unsupported capture file
+                return self.shards
+
+            start = offset = self.pcap_header_length
+            first_index = index = 0
+            a_file.seek(offset)
+
+            while True:
+                record_header = a_file.read(self.pcap_record_header_length)
+                if len(record_header) < self.pcap_record_header_length:
+                    break
+                caplen = struct.unpack(endian + 'I', record_header[8:12])[0]
+                offset += self.pcap_record_header_length + caplen
+                index += 1
+                a_file.seek(offset)
+
+                if offset - start >= shard_size:
+                    self.shards.append((len(self.shards), start, offset, first_index))
+                    start = offset
+                    first_index = index
+
+            if index > first_index:
+                self.shards.append((len(self.shards), start, offset, first_index))
+
+        return self.shards
+
+    @staticmethod
+    def __read_shard_records(reader, end):
+        """
+        Generator that return the records until the end offset of a shard
+        :param reader: The PCAP reader positioned at the start of the shard
+        :type reader: SiranoPcapReader
+        :param end: The end offset of the shard
+        :type end: int
+        :return: The record generator
+        :rtype: list[(str, (int, int, int))]
+        """
+        while reader.f.tell() < end:
+            record = reader.read_record()
+            if record is None:
+                break
+            yield record
+
+    @staticmethod
+    def __get_shard_path(path, shard_index):
+        """
+        Get the path of the temporary file for a shard
+        :param path: The path of the file
+        :type path: str
+        :param shard_index: The index of the shard
+        :type shard_index: int
+        :return: The path of the shard
+        :rtype: str
+        """
+        return '{}.shard-{}'.format(path, shard_index)
+
+    @staticmethod
+    def __remove(path):
+        """
+        Remove a file if it exists
+        :param path: The path of the file
+        :type path: str
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __join_shards(self, path, number_of_shards):
+        """
+        Join the anonymized shards in a PCAP file, only the first PCAP global header is kept
+        :param path: The path of the file
+        :type path: str
+        :param number_of_shards: The number of shards
+        :type number_of_shards: int
+        """
+        self.__remove(path)
+        header_present = False
+        with open(path, 'wb') as out_file:
+            for shard_index in range(number_of_shards):
+                shard_path = self.__get_shard_path(path, shard_index)
+                with open(shard_path, 'rb') as shard_file:
+                    if header_present:
+                        shard_file.seek(self.pcap_header_length)
+                    header_present = header_present or os.path.getsize(shard_path) > 0
+                    shutil.copyfileobj(shard_file, out_file)
+                self.__remove(shard_path)
 
     def validate(self):
         self.app.manager.data.clean_mode = True
@@ -229,6 +619,64 @@ class PCAPFile(File):
                             self.file, line_number, data_name, value))
 
 
+def _process_shard(shard):
+    """
+    Process a shard of the PCAP file in a worker process
+    :param shard: The shard index, the start and end offset and the index of the first packet
+    :type shard: (int, int, int, int)
+    :return: The result, the changes of the report and the values added to the Data plugins
+    :rtype: (None, dict | None, dict[str, list[str]])
+    """
+    return run_worker_task(sirano_pcap_file.app, sirano_pcap_file.process_shard, shard)
+
+
+# noinspection PyClassicStyleClass
+class SiranoPcapReader(PcapReader):
+    """
+    PCAP reader that returns the raw records, the records are dissected on demand
+    """
+
+    def read_record(self):
+        """
+        Read the next record
+        :return: The raw packet with its timestamp and length or None if no more records are available
+        :rtype: (str, (int, int, int)) | None
+        """
+        return RawPcapReader.read_packet(self)
+
+    def dissect(self, record):
+        """
+        Dissect a record, same than the original implementation of read_packet()
+        :param record: The record
+        :type record: (str, (int, int, int))
+        :return: The packet
+        :rtype: Packet
+        """
+        s, (sec, usec, wirelen) = record
+        try:
+            p = self.LLcls(s)
+        except KeyboardInterrupt:
+            raise
+        except:
+            if conf.debug_dissector:
+                raise
+            p = conf.raw_layer(s)
+        p.time = self.get_time(record)
+        return p
+
+    @staticmethod
+    def get_time(record):
+        """
+        Get the time of a record
+        :param record: The record
+        :type record: (str, (int, int, int))
+        :return: The time in seconds
+        :rtype: float
+        """
+        _, (sec, usec, _) = record
+        return sec + 0.000001 * usec
+
+
 # noinspection PyClassicStyleClass
 class SiranoPcapWriter(PcapWriter):
     def write(self, pkt):
@@ -243,3 +691,21 @@ class SiranoPcapWriter(PcapWriter):
             self._write_packet(pkt)
         else:
             self._write_packet(pkt)
+
+    def write_raw(self, data, time, linktype):
+        """
+        Write a raw packet, the record is the same than the one written by write() for the dissected packet
+        :param data: The raw packet
+        :type data: str
+        :param time: The time of the packet in seconds
+        :type time: float
+        :param linktype: The link type of the packet
+        :type linktype: int
+        """
+        if not self.header_present:
+            if self.linktype is None:
+                self.linktype = linktype
+            self._write_header(None)
+        sec = int(time)
+        usec = int(round((time - sec) * 1000000))
+        RawPcapWriter._write_packet(self, data, sec, usec, len(data), len(data))
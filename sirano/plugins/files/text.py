@@ -97,6 +97,9 @@ class TextFile(File):
                         f_out.write(new_line)
 
     def anonymize(self):
+        if self.app.single_pass:
+            # A value found in a line must be replaced in the previous lines too, the file is discovered before
+            self.discover()
         self.__replace(os.path.join(self.app.project.output, self.file))
 
     def validate(self):
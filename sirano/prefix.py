@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+_MISSING = object()
+"""The item of a node that does not end a prefix"""
+
+
+class PrefixTrie(object):
+    """
+    Binary radix trie of integer prefixes, like the IP subnets, with an item for each prefix
+
+    A prefix is the couple of an integer value and a length, the bits of the value after the length are ignored. A
+    lookup follows the bits of the value from the most significant one, it costs at most the width of the values.
+    The prefixes cannot be removed, so a node exists only if a prefix is stored in its subtree.
+    """
+
+    def __init__(self, width=32):
+        """
+        :param width: The number of bits of the values
+        :type width: int
+        """
+        self.width = width
+        """
+        The number of bits of the values
+        :type: int
+        """
+
+        self.root = [None, None, _MISSING]
+        """
+        The root node, a node is a list with the child for the bit 0, the child for the bit 1 and the item
+        :type: list
+        """
+
+        self.size = 0
+        """
+        The number of prefixes
+        :type: int
+        """
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, prefix):
+        return self.get(*prefix, default=_MISSING) is not _MISSING
+
+    def __getitem__(self, prefix):
+        item = self.get(*prefix, default=_MISSING)
+        if item is _MISSING:
+            raise KeyError(prefix)
+        return item
+
+    def __setitem__(self, prefix, item):
+        value, length = prefix
+        node = self.root
+        shift = self.width - 1
+        for _ in xrange(length):
+            bit = (value >> shift) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, _MISSING]
+            node = child
+            shift -= 1
+        if node[2] is _MISSING:
+            self.size += 1
+        node[2] = item
+
+    def __get_node(self, value, length):
+        """
+        Get the node of a prefix
+        :param value: The value of the prefix
+        :type value: int
+        :param length: The length of the prefix
+        :type length: int
+        :return: The node or None if no prefix is stored in its subtree
+        :rtype: list | None
+        """
+        node = self.root
+        shift = self.width - 1
+        for _ in xrange(length):
+            node = node[(value >> shift) & 1]
+            if node is None:
+                return None
+            shift -= 1
+        return node
+
+    def get(self, value, length, default=None):
+        """
+        Get the item of a prefix
+        :param value: The value of the prefix
+        :type value: int
+        :param length: The length of the prefix
+        :type length: int
+        :param default: The item returned if the prefix is not found
+        :return: The item or the default if the prefix is not found
+        """
+        node = self.__get_node(value, length)
+        if node is None or node[2] is _MISSING:
+            return default
+        return node[2]
+
+    def longest_match(self, value, length=None, default=None):
+        """
+        Get the item of the longest prefix that contains a value or a prefix
+        :param value: The value
+        :type value: int
+        :param length: The length of the prefix or None for the whole value
+        :type length: int | None
+        :param default: The item returned if no prefix contains the value
+        :return: The item of the longest prefix or the default if not found
+        """
+        if length is None:
+            length = self.width
+        node = self.root
+        item = node[2]
+        shift = self.width - 1
+        for _ in xrange(length):
+            node = node[(value >> shift) & 1]
+            if node is None:
+                break
+            if node[2] is not _MISSING:
+                item = node[2]
+            shift -= 1
+        return default if item is _MISSING else item
+
+    def has_subprefix(self, value, length):
+        """
+        Check if a prefix or one of its subprefixes (longer prefixes that it contains) is stored
+        :param value: The value of the prefix
+        :type value: int
+        :param length: The length of the prefix
+        :type length: int
+        :return: True if a prefix is found, False otherwise
+        :rtype: True | False
+        """
+        if length == 0:
+            return self.size > 0
+        return self.__get_node(value, length) is not None
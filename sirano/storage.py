@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import atexit
+from collections import Mapping, MutableMapping, OrderedDict
+import marshal
+import os
+import sqlite3
+import time
+
+import yaml
+
+from sirano.exception import DataException
+
+
+class YamlStorage(object):
+    """
+    Storage of the data of a Data plugin in a YAML file
+
+    The file is read and written entirely, the values are not journaled.
+    """
+
+    lazy = False
+    """True if the storage can load the data lazily, see load()"""
+
+    def __init__(self, path):
+        """
+        :param path: The path of the YAML file
+        :type path: str
+        """
+        self.path = path
+        """The path of the YAML file"""
+
+    def load(self, lazy=False):
+        """
+        Load the data
+        :param lazy: Load the sections as mappings that look up the values on demand if the storage supports it, the
+        changes of these mappings are not saved
+        :type lazy: True | False
+        :return: The data or None if there is no data
+        :rtype: dict | None
+        """
+        if os.path.isfile(self.path):
+            with file(self.path) as f:  # Read only by default
+                return yaml.load(f)
+        return None
+
+    def save(self, data):
+        """
+        Save the data
+        :param data: The data
+        :type data: dict
+        """
+        with open(self.path, 'w') as f:
+            yaml.dump(dict(data), f, default_flow_style=False)
+
+    def export_yaml(self):
+        """Write the data in the YAML file, nothing to do for this storage"""
+        pass
+
+    def import_yaml(self):
+        """Read the data from the YAML file, nothing to do for this storage"""
+        pass
+
+    def open_journal(self):
+        """Start to journal the values, nothing to do for this storage"""
+        pass
+
+    def close_journal(self):
+        """Stop to journal the values, nothing to do for this storage"""
+        pass
+
+    def journal(self, section, key, value):
+        """
+        Journal a value, nothing to do for this storage
+        :param section: The section of the data, like 'hosts'
+        :type section: str
+        :param key: The key in the section
+        :type key: str
+        :param value: The value in the section
+        :type value: str | None
+        """
+        pass
+
+    def flush(self):
+        """Write the journaled values, nothing to do for this storage"""
+        pass
+
+
+class JournalStorage(YamlStorage):
+    """
+    Storage of the data of a Data plugin in a binary snapshot and an append-only journal
+
+    The journal records the values as they are added or replaced, they are written at the exit of the process or after
+    the flush interval, so a run that is killed loses only the records of this interval. A save
+    compacts the data in a new snapshot and empties the journal. The snapshot and the records are marshaled, a record
+    truncated by a crash is dropped at the next load. The YAML file is read if there is no snapshot and it is kept for
+    the explicit export and import.
+    """
+
+    flush_size = 1024
+    """The number of records written at once in the journal"""
+
+    flush_interval = 1.0
+    """The maximum time in seconds during which a record is kept before it is written in the journal"""
+
+    def __init__(self, path):
+        """
+        :param path: The path of the YAML file, the snapshot and the journal have the same name with another extension
+        :type path: str
+        """
+        super(JournalStorage, self).__init__(path)
+
+        base = os.path.splitext(path)[0]
+
+        self.snapshot_path = base + '.snapshot'
+        """The path of the binary snapshot"""
+
+        self.journal_path = base + '.journal'
+        """The path of the journal"""
+
+        self.fd = None
+        """
+        The file descriptor of the journal opened in append mode, None if the values are not journaled
+        :type: int | None
+        """
+
+        self.records = list()
+        """
+        The records not written yet
+        :type: list[str]
+        """
+
+        self.flush_time = 0.0
+        """
+        The time of the last write in the journal
+        :type: float
+        """
+
+        self.pid = None
+        """
+        The process that opened the journal, the records are not written by the forked processes
+        :type: int | None
+        """
+
+    def load(self, lazy=False):
+        if os.path.isfile(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                data = marshal.load(f)
+        else:
+            data = super(JournalStorage, self).load()
+
+        if os.path.isfile(self.journal_path):
+            if data is None:
+                data = dict()
+            self.__replay(data)
+        return data
+
+    def save(self, data):
+        self.close_journal()
+        self.__write_snapshot(data)
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+
+    def export_yaml(self):
+        """Write the data of the snapshot and the journal in the YAML file"""
+        data = self.load()
+        if data is not None:
+            super(JournalStorage, self).save(data)
+
+    def import_yaml(self):
+        """Replace the snapshot and the journal by the data of the YAML file"""
+        data = super(JournalStorage, self).load()
+        if data is not None:
+            self.save(data)
+
+    def open_journal(self):
+        if self.fd is None:
+            self.fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+            atexit.register(self.flush)  # The records of a run that stops with an exception are kept
+
+    def close_journal(self):
+        if self.fd is not None:
+            self.flush()
+            os.close(self.fd)
+            self.fd = None
+
+    def journal(self, section, key, value):
+        if self.fd is None:
+            return
+        self.records.append(marshal.dumps((section, key, value)))
+        if len(self.records) >= self.flush_size or time.time() - self.flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.fd is not None and self.pid == os.getpid() and len(self.records) > 0:
+            os.write(self.fd, ''.join(self.records))
+        self.records = list()
+        self.flush_time = time.time()
+
+    def __replay(self, data):
+        """
+        Apply the records of the journal to the data, a truncated record at the end is removed from the file
+        :param data: The data
+        :type data: dict
+        """
+        with open(self.journal_path, 'r+b') as f:
+            position = 0
+            while True:
+                try:
+                    section, key, value = marshal.load(f)
+                except (EOFError, ValueError, TypeError):
+                    break
+                position = f.tell()
+                sub = data.get(section)
+                if not isinstance(sub, dict):
+                    sub = data[section] = dict()
+                sub[key] = value
+
+            f.seek(0, os.SEEK_END)
+            if f.tell() > position:
+                f.truncate(position)
+
+    def __write_snapshot(self, data):
+        """
+        Write the data in a new snapshot that replaces the old one once it is complete
+        :param data: The data, the sections that are mappings are converted in dictionaries
+        :type data: dict
+        """
+        snapshot = dict()
+        for section, value in data.items():
+            if isinstance(value, Mapping):
+                value = dict(value.iteritems())
+            snapshot[section] = value
+
+        path = self.snapshot_path + '.tmp'
+        with open(path, 'wb') as f:
+            marshal.dump(snapshot, f)
+        os.rename(path, self.snapshot_path)
+
+
+class SqliteStorage(YamlStorage):
+    """
+    Storage of the data of a Data plugin in a SQLite database
+
+    Each section of the data is a table with the indexed columns key and value, so the values and the replacements can
+    be looked up without loading the table. A save replaces the database by a new one once it is complete. The YAML
+    file is read if there is no database and it is kept for the explicit export and import.
+    """
+
+    lazy = True
+
+    cache_size = 65536
+    """The default number of lookups kept in the caches of each section loaded lazily"""
+
+    def __init__(self, path, cache_size=None):
+        """
+        :param path: The path of the YAML file, the database has the same name with another extension
+        :type path: str
+        :param cache_size: The number of lookups kept in the caches of each section, the default one if None
+        :type cache_size: int | None
+        """
+        super(SqliteStorage, self).__init__(path)
+
+        if cache_size is not None:
+            self.cache_size = cache_size
+
+        self.database_path = os.path.splitext(path)[0] + '.sqlite'
+        """The path of the database"""
+
+        self.__connection = None
+        """
+        The connection to the database used by the sections loaded lazily
+        :type: sqlite3.Connection | None
+        """
+
+        self.__pid = None
+        """
+        The process that opened the connection, a connection is not used by a forked process
+        :type: int | None
+        """
+
+    def connection(self):
+        """
+        Get the connection to the database, it is opened again in a forked process
+        :return: The connection
+        :rtype: sqlite3.Connection
+        """
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.database_path)
+            self.__connection.text_factory = str
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def close(self):
+        """Close the connection to the database"""
+        if self.__connection is not None and self.__pid == os.getpid():
+            self.__connection.close()
+        self.__connection = None
+
+    def load(self, lazy=False):
+        if not os.path.isfile(self.database_path):
+            return super(SqliteStorage, self).load()
+
+        connection = self.connection()
+        sections = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        data = dict()
+        for section in sections:
+            if lazy:
+                data[section] = SqliteMapping(self, section, self.cache_size)
+            else:
+                data[section] = dict(connection.execute('SELECT key, value FROM "{}"'.format(section)))
+        if not lazy:
+            self.close()
+        return data
+
+    def save(self, data):
+        self.close()
+
+        path = self.database_path + '.tmp'
+        if os.path.isfile(path):
+            os.remove(path)
+        connection = sqlite3.connect(path)
+        connection.text_factory = str
+        try:
+            for section, values in data.items():
+                if not isinstance(values, Mapping):
+                    raise DataException("The section '{}' of '{}' is not a mapping".format(section, self.path))
+                connection.execute('CREATE TABLE "{}" (key TEXT PRIMARY KEY, value TEXT)'.format(section))
+                connection.executemany('INSERT INTO "{}" VALUES (?, ?)'.format(section), values.iteritems())
+                connection.execute('CREATE INDEX "{0}_value" ON "{0}" (value)'.format(section))
+            connection.commit()
+        finally:
+            connection.close()
+        os.rename(path, self.database_path)
+
+    def export_yaml(self):
+        """Write the data of the database in the YAML file"""
+        data = self.load()
+        if data is not None:
+            super(SqliteStorage, self).save(data)
+
+    def import_yaml(self):
+        """Replace the database by the data of the YAML file"""
+        data = super(SqliteStorage, self).load()
+        if data is not None:
+            self.save(data)
+
+
+class SqliteMapping(MutableMapping):
+    """
+    Section of the data loaded lazily from a SQLite database
+
+    The values and the replacements are looked up on demand with a least recently used cache in front of the database.
+    The changes are kept in memory and they are not saved, this mapping is used by the phases that do not save the
+    data.
+    """
+
+    def __init__(self, storage, section, cache_size):
+        """
+        :param storage: The storage of the database
+        :type storage: SqliteStorage
+        :param section: The section, the name of the table
+        :type section: str
+        :param cache_size: The number of lookups kept in each cache
+        :type cache_size: int
+        """
+        self.storage = storage
+        """
+        The storage of the database
+        :type: SqliteStorage
+        """
+
+        self.section = section
+        """The section, the name of the table"""
+
+        self.cache_size = cache_size
+        """The number of lookups kept in each cache"""
+
+        self.value_cache = OrderedDict()
+        """
+        The cache of the values by key, in least recently used order, _MISSING if the key is not in the table
+        :type: OrderedDict[str, str | None]
+        """
+
+        self.replacements = OrderedDict()
+        """
+        The cache of the lookups of the replacements, in least recently used order
+        :type: OrderedDict[str, bool]
+        """
+
+        self.changes = dict()
+        """
+        The values changed in memory, _MISSING if the key is deleted
+        :type: dict[str, str | None]
+        """
+
+        self.changed_replacements = dict()
+        """
+        The number of times each replacement is a value in changes
+        :type: dict[str, int]
+        """
+
+        self.length = None
+        """
+        The number of keys in the table, counted on the first call of len()
+        :type: int | None
+        """
+
+    def __getitem__(self, key):
+        value = self.changes.get(key, _NOT_CHANGED)
+        if value is _NOT_CHANGED:
+            value = self.__lookup(self.value_cache, key, 'SELECT value FROM "{}" WHERE key = ?', _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.__discard_change(key)
+        self.changes[key] = value
+        self.changed_replacements[value] = self.changed_replacements.get(value, 0) + 1
+
+    def __delitem__(self, key):
+        self[key]  # Raise KeyError if the key is missing
+        self.__discard_change(key)
+        self.changes[key] = _MISSING
+
+    def __iter__(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def __len__(self):
+        if self.length is None:
+            self.length = self.storage.connection().execute(
+                'SELECT COUNT(*) FROM "{}"'.format(self.section)).fetchone()[0]
+        length = self.length
+        for key, value in self.changes.iteritems():
+            in_table = self.__lookup(self.value_cache, key, 'SELECT value FROM "{}" WHERE key = ?',
+                                     _MISSING) is not _MISSING
+            length += (value is not _MISSING) - in_table
+        return length
+
+    def iteritems(self):
+        """
+        Iterate over the keys and the values, the table is read once
+        :return: The iterator
+        :rtype: collections.Iterator[(str, str | None)]
+        """
+        cursor = self.storage.connection().execute('SELECT key, value FROM "{}"'.format(self.section))
+        for key, value in cursor:
+            if key not in self.changes:
+                yield key, value
+        for key, value in self.changes.items():
+            if value is not _MISSING:
+                yield key, value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return [key for key, _ in self.iteritems()]
+
+    def values(self):
+        return [value for _, value in self.iteritems()]
+
+    def has_replacement(self, replacement):
+        """
+        Check if a value is the replacement of a key
+        :param replacement: The replacement
+        :type replacement: str
+        :return: True if it is a replacement, False otherwise
+        :rtype: True | False
+        """
+        if self.changed_replacements.get(replacement, 0) > 0:
+            return True
+        # A key of the table whose replacement is changed is not excluded, like a replacement already used
+        return self.__lookup(self.replacements, replacement, 'SELECT 1 FROM "{}" WHERE value = ? LIMIT 1', None) \
+            is not None
+
+    def get_batch(self, keys):
+        """
+        Get the values of a batch of keys, the keys that are not cached are looked up together
+        :param keys: The keys
+        :type keys: collections.Sequence[str]
+        :return: The values, None if a key is missing
+        :rtype: list[str | None]
+        """
+        missing = [key for key in set(keys) if key not in self.changes and key not in self.value_cache]
+        connection = self.storage.connection()
+        for start in xrange(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            found = dict(connection.execute('SELECT key, value FROM "{}" WHERE key IN ({})'.format(
+                self.section, ', '.join('?' * len(chunk))), chunk))
+            for key in chunk:
+                self.__cache(self.value_cache, key, found.get(key, _MISSING))
+        return [self.get(key) for key in keys]
+
+    def __lookup(self, cache, key, query, default):
+        """
+        Look up a key in a cache, then in the table if it is not cached
+        :param cache: The cache
+        :type cache: OrderedDict
+        :param key: The key
+        :type key: str
+        :param query: The query, the table is inserted with format()
+        :type query: str
+        :param default: The result if the query returns no row
+        :return: The result
+        """
+        try:
+            result = cache.pop(key)
+        except KeyError:
+            row = self.storage.connection().execute(query.format(self.section), (key,)).fetchone()
+            result = row[0] if row is not None else default
+        self.__cache(cache, key, result)
+        return result
+
+    def __cache(self, cache, key, result):
+        """
+        Add a result to a cache as the most recently used, the least recently used one is removed if it is full
+        :param cache: The cache
+        :type cache: OrderedDict
+        :param key: The key
+        :type key: str
+        :param result: The result
+        """
+        cache[key] = result
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def __discard_change(self, key):
+        """
+        Discard the change of a key from the count of the changed replacements
+        :param key: The key
+        :type key: str
+        """
+        value = self.changes.pop(key, _MISSING)
+        if value is not _MISSING:
+            count = self.changed_replacements[value] - 1
+            if count > 0:
+                self.changed_replacements[value] = count
+            else:
+                del self.changed_replacements[value]
+
+
+_MISSING = object()
+"""Marker of a key missing from a table or deleted"""
+
+_NOT_CHANGED = object()
+"""Marker of a key not changed in memory"""
+
+
+storages = {'yaml': YamlStorage, 'journal': JournalStorage, 'sqlite': SqliteStorage}
+"""The storage classes by name for the configuration data.global.storage"""
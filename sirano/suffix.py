@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from tld.conf import get_setting
+from tld.utils import PROJECT_DIR, update_tld_names
+
+
+class PublicSuffixTrie(object):
+    """
+    Trie of the domain suffixes, like the public suffix list, indexed by their labels from the last one
+
+    A node is a list with the children by label and the kind of suffix that ends at the node, if any. The suffix of a
+    rule matches the domains whose labels end with its labels, a label * matches any label and a rule that starts
+    with ! is an exception, it is matched like the other rules, as the library tld does. A local suffix, like the TLDs
+    of a private network, matches only the domains that have at least one label before it. A lookup follows the
+    labels of the domain from the last one, it costs at most the number of labels of the domain.
+    """
+
+    RULE = 1
+    """The kind of a node that ends a rule of the suffix list"""
+
+    LOCAL = 2
+    """The kind of a node that ends a local suffix"""
+
+    def __init__(self, rules=(), local_suffixes=()):
+        """
+        :param rules: The rules of the suffix list
+        :type rules: collections.Iterable[str]
+        :param local_suffixes: The local suffixes
+        :type local_suffixes: collections.Iterable[str]
+        """
+        self.root = [dict(), 0]
+        """
+        The root node, a node is a list with the children by label and the kinds of suffix that end at the node
+        :type: list
+        """
+
+        for rule in rules:
+            self.add_rule(rule)
+        for suffix in local_suffixes:
+            self.add_local(suffix)
+
+    def add_rule(self, rule):
+        """
+        Add a rule of the suffix list
+        :param rule: The rule, like 'ch', '*.ck' or '!www.ck'
+        :type rule: str
+        """
+        self.__add(rule.lstrip('!'), self.RULE)
+
+    def add_local(self, suffix):
+        """
+        Add a local suffix
+        :param suffix: The suffix, like 'lan'
+        :type suffix: str
+        """
+        self.__add(suffix, self.LOCAL)
+
+    def __add(self, suffix, kind):
+        """
+        Add a suffix to the trie
+        :param suffix: The suffix
+        :type suffix: str
+        :param kind: The kind of the suffix
+        :type kind: int
+        """
+        node = self.root
+        for label in reversed(suffix.lower().split('.')):
+            node = node[0].setdefault(label, [dict(), 0])
+        node[1] |= kind
+
+    def has_suffix(self, domain):
+        """
+        Check if a domain ends with a suffix of the trie
+        :param domain: The domain
+        :type domain: str
+        :return: True if the domain ends with a suffix, False otherwise
+        :rtype: True | False
+        """
+        labels = domain.lower().split('.')
+        remaining = len(labels)
+        node = self.root
+        for label in reversed(labels):
+            remaining -= 1
+            children = node[0]
+            wildcard = children.get('*')
+            if wildcard is not None and wildcard[1] & self.RULE:
+                return True
+            node = children.get(label)
+            if node is None:
+                return False
+            if node[1] & self.RULE or (node[1] & self.LOCAL and remaining > 0):
+                return True
+        return False
+
+    @classmethod
+    def load_rules(cls):
+        """
+        Load the rules of the suffix list bundled with the library tld, downloaded if it is missing
+        :return: The rules
+        :rtype: list[str]
+        """
+        path = PROJECT_DIR(get_setting('NAMES_LOCAL_PATH'))
+        try:
+            f = open(path)
+        except IOError:
+            update_tld_names(fail_silently=True)
+            try:
+                f = open(path)
+            except IOError:
+                return list()
+        with f:
+            return [line.strip() for line in f if line[0] not in '/\n']
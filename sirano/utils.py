@@ -5,7 +5,7 @@ import os
 import errno
 import datetime
 from sirano.exception import DropException, ErrorDropException, ExplicitDropException
-from vendor.pygpw import pygpw
+from sirano.word import WordPool
 
 
 class AppBase(object):
@@ -37,6 +37,10 @@ def makedirs(path):
             raise
 
 
+_words = WordPool(batch_size=1)
+"""The unbatched pool of word_generator() and word_generate(), a word depends only on the state of the module random"""
+
+
 def word_generator(length):
     """
     Generate a pronounceable random word
@@ -46,8 +50,7 @@ def word_generator(length):
     :rtype: str
     """
     while True:
-        label = pygpw.generate(numpasswords=1, passwordlength=length, substitute_rate=0, capitalize_rate=0)
-        yield label[0][0:length]
+        yield _words.generate(length)
 
 
 def word_generate(length):
@@ -58,8 +61,7 @@ def word_generate(length):
     :return: The word
     :rtype: str
     """
-    label = pygpw.generate(numpasswords=1, passwordlength=length, substitute_rate=0, capitalize_rate=0)
-    return label[0][0:length]
+    return _words.generate(length)
 
 
 def str_or_none(o):
@@ -179,3 +181,84 @@ def read_by_n_lines(f, n):
             lines = list()
     if len(lines) != 0:
         yield lines
+
+
+def _is_named_list(a_list):
+    """
+    Check if a list is a report list of dict identified by the key 'name'
+    :param a_list: The list
+    :type a_list: list
+    :return: True if all entries are dict with a name, False otherwise
+    :rtype: True | False
+    """
+    return all(isinstance(entry, dict) and 'name' in entry for entry in a_list)
+
+
+def report_delta(before, after):
+    """
+    Compute the changes between two states of the report
+
+    Counters are subtracted, list of dict identified by the key 'name' are compared entry by entry and the other values
+    are taken from after if they changed.
+    :param before: The report before the processing
+    :type before: object
+    :param after: The report after the processing
+    :type after: object
+    :return: The changes or None if nothing changed
+    :rtype: object | None
+    """
+    if isinstance(before, dict) and isinstance(after, dict):
+        delta = dict()
+        for key, value in after.items():
+            if key not in before:
+                delta[key] = value
+            else:
+                value = report_delta(before[key], value)
+                if value is not None:
+                    delta[key] = value
+        return delta or None
+    elif isinstance(before, list) and isinstance(after, list) and _is_named_list(before) and _is_named_list(after):
+        delta = list()
+        for entry in after:
+            previous = find_one_dict_by_key(before, 'name', entry['name'])
+            if previous is None:
+                delta.append(entry)
+            else:
+                entry_delta = report_delta(previous, entry)
+                if entry_delta is not None:
+                    entry_delta['name'] = entry['name']
+                    delta.append(entry_delta)
+        return delta or None
+    elif isinstance(before, (int, long, float)) and isinstance(after, (int, long, float)) \
+            and not isinstance(before, bool) and not isinstance(after, bool):
+        return (after - before) or None
+    elif before != after:
+        return after
+    return None
+
+
+def report_merge(report, delta):
+    """
+    Merge the changes computed by report_delta() into a report
+    :param report: The report to update
+    :type report: dict
+    :param delta: The changes
+    :type delta: dict
+    """
+    for key, value in delta.items():
+        current = report.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            report_merge(current, value)
+        elif isinstance(current, list) and isinstance(value, list) and _is_named_list(current) \
+                and _is_named_list(value):
+            for entry in value:
+                previous = find_one_dict_by_key(current, 'name', entry['name'])
+                if previous is None:
+                    current.append(entry)
+                else:
+                    report_merge(previous, entry)
+        elif isinstance(current, (int, long, float)) and isinstance(value, (int, long, float)) \
+                and not isinstance(current, bool) and not isinstance(value, bool):
+            report[key] = current + value
+        else:
+            report[key] = value
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from bisect import bisect_left, bisect_right
+import random
+
+from vendor.pygpw.pygpw_tris import tris
+
+
+class TrigraphTable(object):
+    """
+    The cumulative probabilities of the English trigraphs of pygpw
+
+    A word is drawn like pygpw.generate_trigraph() with the same random numbers, so it gives the same words for the
+    same state of the random generator, but the trigraphs are found by bisection in the cumulative tables instead of
+    linear scans of the 17576 trigraphs.
+    """
+
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    """The letters of the trigraphs"""
+
+    vowels = 'aeiou'
+    """The letters injected after a pair of letters that starts no trigraph"""
+
+    def __init__(self):
+        self.starts = list()
+        """
+        The cumulative probabilities of all the trigraphs, the index is c1 * 676 + c2 * 26 + c3
+        :type: list[int]
+        """
+
+        self.nexts = list()
+        """
+        The cumulative probabilities of the third letter after each pair of letters, the index is c1 * 26 + c2
+        :type: list[list[int]]
+        """
+
+        total = 0
+        for c1 in xrange(26):
+            for c2 in xrange(26):
+                cumulative = list()
+                pair_total = 0
+                for c3 in xrange(26):
+                    total += tris[c1][c2][c3]
+                    pair_total += tris[c1][c2][c3]
+                    self.starts.append(total)
+                    cumulative.append(pair_total)
+                self.nexts.append(cumulative)
+
+    def generate(self, length, rng=random):
+        """
+        Generate a pronounceable word
+        :param length: The length of the word, at least 3 letters are drawn
+        :type length: int
+        :param rng: The random generator
+        :type rng: random.Random
+        :return: The word
+        :rtype: str
+        """
+        alphabet = self.alphabet
+        nexts = self.nexts
+
+        start = bisect_left(self.starts, int(self.starts[-1] * rng.random()))
+        word = [alphabet[start // 676], alphabet[start // 26 % 26], alphabet[start % 26]]
+        pair = start % 676
+        while len(word) < length:
+            cumulative = nexts[pair]
+            if cumulative[-1] == 0:
+                letter = rng.sample(self.vowels, 1)[0]
+            else:
+                letter = alphabet[bisect_right(cumulative, int(rng.random() * cumulative[-1]))]
+            word.append(letter)
+            pair = pair % 26 * 26 + alphabet.index(letter)
+        return ''.join(word)
+
+
+class WordPool(object):
+    """
+    Pool of pronounceable words by length
+
+    The words are generated in batches with the trigraph table, the duplicates of a batch are removed and the words
+    are handed out in the order they are drawn. With a batch size of 1, a word depends only on the state of the random
+    generator when it is requested, this is required in the contexts seeded by value like Data.keyed_random().
+    """
+
+    batch_size = 1024
+    """The default number of words drawn when the pool of a length is empty"""
+
+    table = None
+    """
+    The trigraph table shared by the pools, built on first use
+    :type: TrigraphTable
+    """
+
+    def __init__(self, batch_size=None, rng=random):
+        """
+        :param batch_size: The number of words drawn when the pool of a length is empty, the default one if None
+        :type batch_size: int | None
+        :param rng: The random generator, the module random by default
+        :type rng: random.Random
+        """
+        if batch_size is not None:
+            self.batch_size = batch_size
+
+        self.rng = rng
+        """
+        The random generator
+        :type: random.Random
+        """
+
+        self.pools = dict()
+        """
+        The words not handed out yet for each length, in reverse order
+        :type: dict[int, list[str]]
+        """
+
+        if WordPool.table is None:
+            WordPool.table = TrigraphTable()
+
+    def seed(self, seed):
+        """
+        Seed the random generator and empty the pools
+        :param seed: The seed
+        :type seed: object
+        """
+        self.rng.seed(seed)
+        self.pools.clear()
+
+    def generate(self, length):
+        """
+        Get a pronounceable word
+        :param length: The length of the word
+        :type length: int
+        :return: The word
+        :rtype: str
+        """
+        pool = self.pools.get(length)
+        if not pool:
+            pool = self.pools[length] = self.__draw(length)
+        return pool.pop()
+
+    def __draw(self, length):
+        """
+        Draw a batch of words without duplicates
+        :param length: The length of the words
+        :type length: int
+        :return: The words in reverse order
+        :rtype: list[str]
+        """
+        generate = self.table.generate
+        rng = self.rng
+        words = list()
+        drawn = set()
+        for _ in xrange(self.batch_size):
+            word = generate(length, rng)[0:length]
+            if word not in drawn:
+                drawn.add(word)
+                words.append(word)
+        words.reverse()
+        return words
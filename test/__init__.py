@@ -25,3 +25,20 @@ Unit test package
 
 
 from plugins.data.ip import IPDataTest
+from utils import UtilsTest
+from flow import MediaFlowTableTest
+from matcher import MultiStringMatcherTest
+from data import ReplacementDictTest, KeyedDataTest, DataManagerTest
+from prefix import PrefixTrieTest
+from ipv4 import IPv4DictTest, PrefixPreservingCipherTest
+from generator import UniqueGeneratorTest
+from word import WordPoolTest
+from storage import JournalStorageTest, SqliteStorageTest
+from suffix import PublicSuffixTrieTest
+from label import LabelTrieTest
+from plugins.files.pcap import PCAPFileTest
+from packet import PacketAnonymizerTest
+from fastpath import FastPathAnonymizerTest
+from plugins.action.raw_payload import RTPPayloadActionTest
+from plugins.action.auto import AutoActionTest
+from plugins.data.phone import PhoneDataTest
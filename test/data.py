@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+from sirano.data import ReplacementDict
+from sirano.exception import DataException
+from test.project import create_app, remove_project
+
+
+class ReplacementDictTest(unittest.TestCase):
+    """Unit test for the dictionary that indexes the replacements"""
+
+    def test_has_replacement(self):
+        """
+        Test the index of the replacements kept in sync with the dictionary
+        """
+        values = ReplacementDict({'a': 'x', 'b': 'y'})
+        self.assertTrue(values.has_replacement('x'))
+        self.assertFalse(values.has_replacement('z'))
+
+        values['c'] = 'x'
+        values['a'] = 'z'
+        self.assertTrue(values.has_replacement('x'))
+        self.assertTrue(values.has_replacement('z'))
+
+        del values['c']
+        self.assertFalse(values.has_replacement('x'))
+
+        values.update({'b': 'w'}, d='v')
+        self.assertFalse(values.has_replacement('y'))
+        self.assertTrue(values.has_replacement('w'))
+        self.assertTrue(values.has_replacement('v'))
+
+        values.pop('d')
+        values.setdefault('e', 'u')
+        self.assertEqual(values.replacements, {'z': 1, 'w': 1, 'u': 1})
+
+
+class KeyedDataTest(unittest.TestCase):
+    """Unit test for the keyed mode of the Data plugins"""
+
+    values = {'name': ['alice', 'bob'],
+              'domain': ['www.example.com', 'sip.example.com'],
+              'mac': ['00:11:22:33:44:55', '00:11:22:33:44:66'],
+              'phone': ['+41261234567', '0261234568']}
+    """The values added to each Data plugin"""
+
+    projects = ['test-keyed-1', 'test-keyed-2', 'test-keyed-3']
+    """The projects created by the test"""
+
+    def tearDown(self):
+        for name in self.projects:
+            remove_project(name)
+
+    def __get_mappings(self, project, secret, reverse=False):
+        """
+        Generate the replacements of the values in a new project
+        :param project: The project name
+        :type project: str
+        :param secret: The secret
+        :type secret: str
+        :param reverse: Add the values in the reverse order
+        :type reverse: True | False
+        :return: The values with their replacement for each Data plugin
+        :rtype: dict[str, dict[str, str]]
+        """
+        conf = {'data': dict((name, {'keyed': True}) for name in self.values)}
+        conf['data']['global'] = {'secret': secret}
+        app = create_app(project, conf)
+        names = sorted(self.values, reverse=reverse)
+        for name in names:
+            values = self.values[name][::-1] if reverse else self.values[name]
+            for value in values:
+                app.manager.data.get_data(name).add_value(value)
+        app.manager.data.process_all()
+
+        mappings = dict()
+        for name in names:
+            data = app.manager.data.get_data(name)
+            mappings[name] = dict((value, data.get_replacement(value)) for value in self.values[name])
+        return mappings
+
+    def test_keyed(self):
+        """
+        Test that the same secret gives the same replacements in any order and that another secret does not
+        """
+        first = self.__get_mappings(self.projects[0], 'secret')
+        second = self.__get_mappings(self.projects[1], 'secret', reverse=True)
+        other = self.__get_mappings(self.projects[2], 'other')
+
+        self.assertEqual(first, second)
+        for name in self.values:
+            self.assertNotIn(None, first[name].values())
+            self.assertNotEqual(first[name], other[name])
+
+
+class DataManagerTest(unittest.TestCase):
+    """Unit test for the memo of the Data class guessed for each value"""
+
+    project = 'test-guess'
+    """The project created by the test"""
+
+    def setUp(self):
+        self.app = create_app(self.project)
+        self.manager = self.app.manager.data
+        self.manager.add_value('alice')
+        self.manager.add_value('bob')
+        self.manager.process_all()
+        self.manager.guess_report.update(hits=0, misses=0)
+
+    def tearDown(self):
+        remove_project(self.project)
+
+    def test_hits(self):
+        """
+        Test the hits and the misses of the memo in the report
+        """
+        replacement = self.manager.get_replacement('alice')
+        self.assertEqual(self.app.report['data']['guess'], {'hits': 0, 'misses': 1})
+        self.assertEqual(self.manager.get_replacement('alice'), replacement)
+        self.assertEqual(self.manager.guess_data('alice'), self.manager.get_data('name'))
+        self.assertEqual(self.app.report['data']['guess'], {'hits': 2, 'misses': 1})
+
+    def test_size(self):
+        """
+        Test that the memo is cleared when it is full
+        """
+        self.manager.guess_cache_size = 1
+        self.manager.get_replacement('alice')
+        self.assertEqual(list(self.manager.guesses), ['alice'])
+        self.manager.get_replacement('bob')
+        self.assertEqual(list(self.manager.guesses), ['bob'])
+        self.manager.get_replacement('alice')
+        self.assertEqual(self.app.report['data']['guess'], {'hits': 0, 'misses': 3})
+
+    def test_clean_mode(self):
+        """
+        Test that the replacement values in the memo are not used in clean mode
+        """
+        replacement = self.manager.get_replacement('alice')
+        self.manager.set_clean_mode_all(True)
+        self.assertEqual(self.manager.get_replacement('alice'), '')
+        self.manager.set_clean_mode_all(False)
+        self.assertEqual(self.manager.get_replacement('alice'), replacement)
+
+    def test_unknown(self):
+        """
+        Test that a value of an ambiguous data type raises a DataException and is not memoized
+        """
+        self.assertRaises(DataException, self.manager.get_replacement, '00:11:22:33:44:55')
+        self.assertNotIn('00:11:22:33:44:55', self.manager.guesses)
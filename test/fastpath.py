@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+
+from scapy.layers.dns import DNS, DNSQR
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.l2 import Ether
+from scapy.layers.rtp import RTP
+from scapy.packet import Raw
+
+from sirano.app import Phase
+from sirano.fastpath import FastPathAnonymizer
+from sirano.flow import MediaFlowTable
+from sirano.plugins.actions.raw_payload import RTPPayloadAction
+from test.project import create_app, remove_project
+
+
+class FastPathAnonymizerTest(unittest.TestCase):
+    """Unit test for the anonymization of the raw packets, the result is compared with the scapy path"""
+
+    project = 'test-fastpath'
+    """The project created by the test"""
+
+    time = 1000.0
+    """The time of the packets"""
+
+    def setUp(self):
+        self.app = create_app(self.project)
+        self.flows = MediaFlowTable()
+
+    def tearDown(self):
+        remove_project(self.project)
+
+    def __dissect(self, data):
+        """
+        Dissect a raw packet with scapy, like the PCAP file does
+        :param data: The raw packet
+        :type data: str
+        :return: The packet
+        :rtype: Ether
+        """
+        packet = Ether(data)
+        packet.time = self.time
+        self.flows.decode(packet)
+        return packet
+
+    def __anonymize(self, packets):
+        """
+        Anonymize raw packets with the fast path and with scapy
+        :param packets: The raw packets
+        :type packets: list[str]
+        :return: The packets anonymized by the fast path (None if not supported) and the packets anonymized by scapy
+        :rtype: (list[str | None], list[str])
+        """
+        self.app.set_phase(Phase.phase_1)
+        for data in packets:
+            self.app.packet.discover(self.__dissect(data))
+        self.app.set_phase(Phase.phase_2)
+        self.app.manager.data.process_all()
+        self.app.set_phase(Phase.phase_3)
+
+        fast_path = FastPathAnonymizer(self.app, self.flows)
+        self.assertTrue(fast_path.enabled)
+        fast_path.prefetch([(data,) for data in packets])
+        fast = [fast_path.anonymize(data, self.time) for data in packets]
+
+        slow = list()
+        for data in packets:
+            packet = self.__dissect(data)
+            self.app.packet.anonymize(packet)
+            slow.append(str(packet))
+        return fast, slow
+
+    def test_headers(self):
+        """
+        Test the anonymization of the Ethernet, IPv4, TCP and UDP headers
+        """
+        ether = Ether(src='00:11:22:33:44:55', dst='66:77:88:99:aa:bb')
+        syn = str(ether / IP(src='172.16.0.5', dst='10.1.2.3') / TCP(sport=1234, dport=80, flags='S'))
+        packets = [syn,
+                   syn + '\x00' * 6,  # Ethernet padding
+                   str(ether / IP(src='10.1.2.3', dst='192.168.5.6', chksum=0) / TCP(sport=80, dport=1234, flags='SA',
+                                                                                   chksum=0)),
+                   str(ether / IP(src='10.1.2.3', dst='192.168.5.6') / UDP(sport=4000, dport=4001)),
+                   str(ether / IP(src='10.1.2.3', dst='8.8.8.8') / UDP(sport=5353, dport=53) /
+                       DNS(rd=1, qd=DNSQR(qname='www.example.com')))]
+
+        fast, slow = self.__anonymize(packets)
+        self.assertEqual(fast[:-1], slow[:-1])
+        self.assertIsNone(fast[-1])  # The DNS payload is anonymized by scapy
+        for data, anonymized in zip(packets, slow):
+            self.assertNotEqual(data, anonymized)
+
+    def test_rtp(self):
+        """
+        Test the anonymization of the RTP media payloads of a media flow
+        """
+        self.flows.add('10.1.2.3', 49170, self.time)
+        ether = Ether(src='00:11:22:33:44:55', dst='66:77:88:99:aa:bb')
+        packets = [str(ether / IP(src='10.1.2.3', dst='192.168.5.6') / UDP(sport=49170, dport=3456) /
+                       RTP(sequence=i, timestamp=i * 160) / Raw('\x55' * length))
+                   for i, length in enumerate([160, 20, 1, 320])]
+
+        fast, slow = self.__anonymize(packets)
+        self.assertEqual(fast, slow)
+        filler = RTPPayloadAction(None)
+        for data, anonymized in zip(packets, fast):
+            self.assertEqual(anonymized[54:], filler.anonymize(data[54:]))  # After the RTP header
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+
+from scapy.layers.inet import IP, UDP
+from scapy.layers.rtp import RTP
+from scapy.packet import Raw
+
+from sirano.flow import MediaFlowTable
+from sirano.plugins.layers.sip import SDP
+
+
+class MediaFlowTableTest(unittest.TestCase):
+    """Unit test for the table of the media flows"""
+
+    def test_get_sdp_flows(self):
+        """
+        Test the flows negotiated by an SDP description
+        """
+        sdp = SDP("v=0\r\n"
+                  "o=- 1 1 IN IP4 10.0.0.1\r\n"
+                  "c=IN IP4 10.0.0.1\r\n"
+                  "m=audio 4000 RTP/AVP 0\r\n"
+                  "m=video 0 RTP/AVP 31\r\n"
+                  "m=image 5000 udptl t38\r\n"
+                  "m=audio 6000 RTP/SAVP 0\r\n"
+                  "c=IN IP4 10.0.0.2\r\n"
+                  "a=rtcp:7000\r\n")
+
+        self.assertEqual(MediaFlowTable.get_sdp_flows(sdp), [('10.0.0.1', 4000), ('10.0.0.1', 4001),
+                                                             ('10.0.0.2', 6000), ('10.0.0.2', 7000)])
+
+    def test_is_media(self):
+        """
+        Test the validity of the flows in the time
+        """
+        flows = MediaFlowTable(60)
+        flows.add('10.0.0.1', 4000, 100.0)
+
+        self.assertTrue(flows.is_media('10.0.0.2', 8000, '10.0.0.1', 4000, 100.0))
+        self.assertTrue(flows.is_media('10.0.0.1', 4000, '10.0.0.2', 8000, 160.0))
+        self.assertFalse(flows.is_media('10.0.0.1', 4000, '10.0.0.2', 8000, 99.0))
+        self.assertFalse(flows.is_media('10.0.0.1', 4000, '10.0.0.2', 8000, 161.0))
+        self.assertFalse(flows.is_media('10.0.0.1', 4002, '10.0.0.2', 8000, 120.0))
+
+        flows.add('10.0.0.1', 4000, 200.0)
+        self.assertTrue(flows.is_media('10.0.0.1', 4000, '10.0.0.2', 8000, 250.0))
+        self.assertFalse(flows.is_media('10.0.0.1', 4000, '10.0.0.2', 8000, 170.0))
+
+    def test_all_flows(self):
+        """
+        Test that a table with all the flows decodes the UDP datagrams that match no layer binding
+        """
+        flows = MediaFlowTable(all_flows=True)
+        self.assertTrue(flows.is_decoded({'sport': 4000, 'dport': 8000}, '10.0.0.1', '10.0.0.2', 100.0))
+        self.assertFalse(flows.is_decoded({'sport': 4000, 'dport': 5060}, '10.0.0.1', '10.0.0.2', 100.0))  # SIP
+        self.assertFalse(MediaFlowTable().is_decoded({'sport': 4000, 'dport': 8000}, '10.0.0.1', '10.0.0.2', 100.0))
+
+        payload = str(RTP(sequence=1) / Raw('\x55' * 20))
+        for table, cls in [(flows, RTP), (MediaFlowTable(), Raw)]:
+            packet = IP(str(IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=4000, dport=8000) / Raw(payload)))
+            packet.time = 100.0
+            table.decode(packet)
+            self.assertIsInstance(packet[UDP].payload, cls)
+            self.assertEqual(str(packet[UDP].payload), payload)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import random
+import unittest
+from sirano.exception import NamespaceExhaustedException
+from sirano.generator import Namespace, UniqueGenerator
+
+
+class UniqueGeneratorTest(unittest.TestCase):
+    """Unit test for the generator of the unique replacement values"""
+
+    def test_generate(self):
+        """
+        Test the random candidates and the pool of a small namespace until it is exhausted
+        """
+        random.seed(0)
+        generator = UniqueGenerator(max_retries=3)
+        namespace = Namespace(10, lambda: map(str, range(10)))
+        used = set()
+
+        for _ in range(10):
+            value = generator.generate(lambda: str(random.randint(0, 9)), used.__contains__, namespace)
+            self.assertNotIn(value, used)
+            used.add(value)
+
+        self.assertEqual(used, set(namespace))
+        self.assertRaises(NamespaceExhaustedException, generator.generate, lambda: '0', used.__contains__, namespace)
+
+    def test_generate_unknown_namespace(self):
+        """
+        Test the bounded retries when the namespace cannot be enumerated
+        """
+        generator = UniqueGenerator(max_retries=5)
+        calls = list()
+
+        def candidate():
+            calls.append(None)
+            return 'a'
+
+        self.assertEqual(generator.generate(candidate, lambda value: False), 'a')
+        self.assertRaises(NamespaceExhaustedException, generator.generate, candidate, lambda value: True)
+        self.assertEqual(len(calls), 6)
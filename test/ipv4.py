@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+from io import BytesIO
+import unittest
+from sirano.ipv4 import IPv4Dict, PrefixPreservingCipher, address_to_int, int_to_address
+
+
+class IPv4DictTest(unittest.TestCase):
+    """Unit test for the compact dictionary of IPv4 addresses"""
+
+    def setUp(self):
+        self.hosts = IPv4Dict({'10.0.0.2': '10.9.0.2', '10.0.0.1': None, '010.0.0.3': 'foo'})
+
+    def test_items(self):
+        """
+        Test the access to the addresses and the other keys
+        """
+        self.hosts['10.0.0.1'] = '10.9.0.1'
+        self.hosts['192.168.1.1'] = ''
+        self.hosts['10.0.0.2'] = 'bar'
+
+        self.assertEqual(dict(self.hosts), {'10.0.0.1': '10.9.0.1', '10.0.0.2': 'bar', '010.0.0.3': 'foo',
+                                            '192.168.1.1': ''})
+        self.assertEqual(len(self.hosts), 4)
+        self.assertNotIn('10.0.0.3', self.hosts)
+
+        del self.hosts['10.0.0.1']
+        self.assertNotIn('10.0.0.1', self.hosts)
+        self.assertEqual(len(self.hosts), 3)
+
+    def test_has_replacement(self):
+        """
+        Test the index of the replacements
+        """
+        self.assertTrue(self.hosts.has_replacement('10.9.0.2'))
+        self.assertTrue(self.hosts.has_replacement('foo'))
+        self.assertFalse(self.hosts.has_replacement('10.9.0.1'))
+
+        self.hosts['10.0.0.1'] = '10.9.0.1'
+        self.hosts['10.0.0.2'] = None
+        self.assertTrue(self.hosts.has_replacement('10.9.0.1'))
+        self.assertFalse(self.hosts.has_replacement('10.9.0.2'))
+
+    def test_dump(self):
+        """
+        Test the compact file form
+        """
+        self.hosts['10.0.0.4'] = '10.9.0.4'
+        a_file = BytesIO()
+        self.hosts.dump(a_file)
+        a_file.seek(0)
+
+        hosts = IPv4Dict()
+        hosts.load(a_file)
+        self.assertEqual(dict(hosts), {'10.0.0.1': None, '10.0.0.2': '10.9.0.2', '10.0.0.4': '10.9.0.4'})
+        self.assertRaises(ValueError, hosts.load, BytesIO('foo'))
+
+    def test_get_many(self):
+        """
+        Test the lookup of a batch of integer addresses
+        """
+        self.hosts['10.0.0.4'] = '10.9.0.4'  # In the pending dict
+        replacements, unknown = self.hosts.get_many([0x0a000004, 0x0a000001, 0x0a000002, 0x0a000005])
+        self.assertEqual(list(replacements), [0x0a090004, 0, 0x0a090002, 0])
+        self.assertEqual(list(unknown), [0, 1, 0, 1])
+
+
+class PrefixPreservingCipherTest(unittest.TestCase):
+    """Unit test for the prefix-preserving cipher of the IPv4 addresses"""
+
+    def setUp(self):
+        self.cipher = PrefixPreservingCipher('secret', [(0x0a000000, 8)], [0x0a000001])
+
+    def test_prefix(self):
+        """
+        Test the preservation of the prefixes and of the blocks
+        """
+        a = self.cipher.encrypt(0xc0a80101)  # 192.168.1.1
+        b = self.cipher.encrypt(0xc0a80102)  # 192.168.1.2
+        c = self.cipher.encrypt(0xc0a80201)  # 192.168.2.1
+        self.assertEqual(a >> 8, b >> 8)
+        self.assertNotEqual(a, b)
+        self.assertEqual(a >> 16, c >> 16)
+        self.assertNotEqual(a >> 8, c >> 8)
+        self.assertEqual(self.cipher.encrypt(0x0a7b4c2d) >> 24, 0x0a)
+        self.assertNotEqual(self.cipher.encrypt(0x0b7b4c2d) >> 24, 0x0a)
+
+    def test_length(self):
+        """
+        Test the preservation of the text length of the addresses
+        """
+        for value in ['10.1.2.3', '1.22.133.4', '192.168.10.100', '8.8.8.8', '99.100.9.10']:
+            replacement = int_to_address(self.cipher.encrypt(address_to_int(value)))
+            self.assertEqual(len(replacement), len(value))
+            self.assertEqual(map(len, replacement.split('.')), map(len, value.split('.')))
+
+    def test_decrypt(self):
+        """
+        Test the inverse of the cipher and the exclusion
+        """
+        self.assertEqual(self.cipher.encrypt(0x0a000001), 0x0a000001)
+        for address in [0, 0x0a000002, 0xc0a80101, 0xffffffff]:
+            replacement = self.cipher.encrypt(address)
+            self.assertNotEqual(replacement, 0x0a000001)
+            self.assertEqual(self.cipher.decrypt(replacement), address)
+        self.assertEqual(PrefixPreservingCipher('secret').encrypt(0xc0a80101),
+                         PrefixPreservingCipher('secret').encrypt(0xc0a80101))
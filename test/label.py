@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+from sirano.label import LabelTrie
+
+
+class LabelTrieTest(unittest.TestCase):
+    """Unit test for the trie of the domain names"""
+
+    def test_mapping(self):
+        """
+        Test the relative and the full replacements, the replaced parents and the removed domains
+        """
+        domains = LabelTrie({'ch': 'xy', 'heia-fr.ch': 'abc.xy', 'www.heia-fr.ch': 'def.abc.xy', 'lan': None})
+        domains['host.lan'] = 'host.lan'
+
+        self.assertEqual(len(domains), 5)
+        self.assertEqual(domains['www.heia-fr.ch'], 'def.abc.xy')
+        self.assertEqual(domains.get_levels('ftp.heia-fr.ch'), ['xy', 'abc.xy', None])
+        self.assertTrue(domains.has_replacement('abc.xy'))
+        self.assertTrue(domains.has_replacement('host.lan'))
+        self.assertFalse(domains.has_replacement('xyz'))
+        self.assertNotIn('heia-fr', domains)
+
+        domains['heia-fr.ch'] = 'ghi.xy'
+        self.assertEqual(domains['www.heia-fr.ch'], 'def.abc.xy')
+        self.assertFalse(domains.has_replacement('abc.xy'))
+
+        del domains['ch']
+        del domains['www.heia-fr.ch']
+        self.assertEqual(dict(domains.iteritems()), {'heia-fr.ch': 'ghi.xy', 'lan': None, 'host.lan': 'host.lan'})
+        self.assertFalse(domains.has_replacement('def.abc.xy'))
+        self.assertRaises(KeyError, domains.__getitem__, 'ch')
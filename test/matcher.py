@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+from sirano.matcher import MultiStringMatcher
+
+
+class MultiStringMatcherTest(unittest.TestCase):
+    """Unit test for the multi-string matcher"""
+
+    def test_find_all(self):
+        """
+        Test that the patterns found are the patterns contained in the string
+        """
+        matcher = MultiStringMatcher(['he', 'she', 'his', 'hers'])
+        self.assertEqual(matcher.find_all("ushers"), ['she', 'he', 'hers'])
+        self.assertEqual(matcher.find_all("ahishers"), ['his', 'she', 'he', 'hers'])
+        self.assertEqual(matcher.find_all("xyz"), [])
+
+    def test_add(self):
+        """
+        Test the patterns added after the creation
+        """
+        matcher = MultiStringMatcher(['alice'])
+        for pattern in ['bob', 'ali', 'carol', 'lice', 'bo']:
+            self.assertTrue(matcher.add(pattern))
+        self.assertFalse(matcher.add('bob'))
+
+        self.assertEqual(len(matcher), 6)
+        self.assertEqual(sorted(matcher.find_all("alice and bob")), ['ali', 'alice', 'bo', 'bob', 'lice'])
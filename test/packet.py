@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+
+from scapy.layers.dns import DNS, DNSQR
+from scapy.layers.inet import ICMP, IP, TCP, UDP
+from scapy.layers.l2 import Ether, GRE
+from scapy.packet import Raw
+
+from sirano.app import Phase
+from sirano.exception import ExplicitDropException, ImplicitDropException
+from test.project import create_app, remove_project
+
+
+class PacketAnonymizerTest(unittest.TestCase):
+    """Unit test for the anonymization of the packets by the packet anonymizer"""
+
+    project = 'test-packet'
+    """The project created by the test"""
+
+    def setUp(self):
+        self.app = create_app(self.project)
+
+    def tearDown(self):
+        remove_project(self.project)
+
+    @staticmethod
+    def __packets(ip, mac, domain):
+        """
+        Build the packets dissected from their bytes, like the packets read in a capture
+        :param ip: The function giving the IP address used for an IP address
+        :type ip: (str) -> str
+        :param mac: The function giving the MAC address used for a MAC address
+        :type mac: (str) -> str
+        :param domain: The function giving the domain name used for a domain name
+        :type domain: (str) -> str
+        :return: The packets
+        :rtype: list[Ether]
+        """
+        ether = Ether(src=mac('00:11:22:33:44:55'), dst=mac('66:77:88:99:aa:bb'))
+        packets = [ether / IP(src=ip('10.1.2.3'), dst=ip('192.168.5.6')) / TCP(sport=1234, dport=80, flags='S'),
+                   ether / IP(src=ip('10.1.2.3'), dst=ip('8.8.8.8')) / TCP(sport=1235, dport=443, flags='S'),
+                   ether / IP(src=ip('10.1.2.3'), dst=ip('8.8.8.8')) / UDP(sport=5353, dport=53) /
+                   DNS(rd=1, qd=DNSQR(qname=domain('www.example.com')))]
+        return [Ether(str(packet)) for packet in packets]
+
+    def test_anonymize(self):
+        """
+        Test that the anonymized packets are the packets built by scapy with the replacement values
+        """
+        same = lambda value: value
+        self.app.set_phase(Phase.phase_1)
+        for packet in self.__packets(same, same, same):
+            self.app.packet.discover(packet)
+        self.app.set_phase(Phase.phase_2)
+        self.app.manager.data.process_all()
+        self.app.set_phase(Phase.phase_3)
+
+        data = self.app.manager.data
+        expected = self.__packets(data.get_data('ip').get_replacement, data.get_data('mac').get_replacement,
+                                  data.get_data('domain').get_replacement)
+        for packet, expected_packet in zip(self.__packets(same, same, same), expected):
+            self.app.packet.anonymize(packet)
+            self.assertEqual(str(packet), str(expected_packet))
+        self.assertEqual(len(self.app.packet.layers['IP'].plans), 1)
+
+    def test_drop(self):
+        """
+        Test that the packets with a layer to drop are rejected before the processing of the other layers
+        """
+        self.app.set_phase(Phase.phase_3)
+        ether = Ether(src='00:11:22:33:44:55', dst='66:77:88:99:aa:bb')
+        explicit = Ether(str(ether / IP(src='10.1.2.3', dst='10.9.9.9') / ICMP() / Raw('abcdefgh')))
+        implicit = Ether(str(ether / IP(src='10.1.2.3', dst='10.9.9.9') / GRE()))
+
+        for packet, exception in [(explicit, ExplicitDropException), (implicit, ImplicitDropException),
+                                  (explicit, ExplicitDropException)]:
+            original = str(packet)
+            self.assertRaises(exception, self.app.packet.anonymize, packet)
+            self.assertEqual(str(packet), original)
+
+        self.assertEqual(sorted(self.app.packet.stacks.values()), [2, 3])
+
+        layers = self.app.report['packet']['anonymization']['layers']
+        self.assertEqual(sorted((layer['name'], layer['explicit_drop'], layer['implicit_drop']) for layer in layers),
+                         [('GRE', 0, 1), ('Raw', 2, 0)])
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+
+from sirano.app import Phase
+from sirano.plugins.actions.auto import AutoAction
+from test.project import create_app, remove_project
+
+
+class AutoActionTest(unittest.TestCase):
+    """Unit tests for auto action plugin"""
+
+    project = 'test-auto'
+    """The project created by the test"""
+
+    samples = ['<sip:alice@10.1.2.3;lr>',
+               '<sip:proxy@10.1.2.3>;proxy=proxy',
+               'alice <sip:+41261234567@10.1.2.3:5060>;alice',
+               'sip:alice@192.168.5.6 00:11:22:33:44:55',
+               'nothing to replace']
+    """The strings anonymized"""
+
+    overlap = '172.16.0.5;172'
+    """The string with a name in an IP address"""
+
+    def setUp(self):
+        self.app = create_app(self.project)
+        self.action = self.app.manager.action.get_action('auto')
+
+        self.app.set_phase(Phase.phase_1)
+        for name in ['alice', 'proxy', '172']:
+            self.app.manager.data.get_data('name').add_value(name)
+        for sample in self.samples + [self.overlap]:
+            self.action.discover(sample)
+        self.app.set_phase(Phase.phase_2)
+        self.app.manager.data.process_all()
+        self.app.set_phase(Phase.phase_3)
+
+    def tearDown(self):
+        remove_project(self.project)
+
+    def __get_replacement(self, name, value):
+        """
+        Get the replacement value of a Data plugin
+        :param name: The name of the Data plugin
+        :type name: str
+        :param value: The value
+        :type value: str
+        :return: The replacement value
+        :rtype: str
+        """
+        return self.app.manager.data.get_data(name).get_replacement(value)
+
+    def __anonymize_sequentially(self, string):
+        """
+        Anonymize a string with one search and one replacement per Data plugin, like before the spans
+        :param string: The string
+        :type string: str
+        :return: The anonymized string
+        :rtype: str
+        """
+        for name in AutoAction.data_names:
+            data = self.app.manager.data.get_data(name)
+            values = data.find_values(string)
+            values.sort(key=len, reverse=True)
+            for value in values:
+                string = string.replace(value, data.get_replacement(value))
+        return string
+
+    def test_anonymize(self):
+        """
+        Test the replacement of the values found by the Data plugins, like the sequential replacements
+        """
+        name = lambda value: self.__get_replacement('name', value)
+        ip = lambda value: self.__get_replacement('ip', value)
+        expected = ['<sip:{}@{};lr>'.format(name('alice'), ip('10.1.2.3')),
+                    '<sip:{}@{}>;{}={}'.format(name('proxy'), ip('10.1.2.3'), name('proxy'), name('proxy')),
+                    '{} <sip:{}@{}:5060>;{}'.format(name('alice'), self.__get_replacement('phone', '+41261234567'),
+                                                    ip('10.1.2.3'), name('alice')),
+                    'sip:{}@{} {}'.format(name('alice'), ip('192.168.5.6'),
+                                          self.__get_replacement('mac', '00:11:22:33:44:55')),
+                    'nothing to replace']
+
+        for sample, expected_sample in zip(self.samples, expected):
+            self.assertEqual(self.action.anonymize(sample), expected_sample)
+            self.assertEqual(self.__anonymize_sequentially(sample), expected_sample)
+
+    def test_overlap(self):
+        """
+        Test that a value overlapping a value of a previous Data plugin is not replaced, even in a replacement value
+        """
+        ip = self.__get_replacement('ip', '172.16.0.5')
+        self.assertTrue(ip.startswith('172.'))
+        self.assertEqual(self.action.anonymize(self.overlap), '{};{}'.format(ip, self.__get_replacement('name', '172')))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+from sirano.plugins.actions.raw_payload import RTPPayloadAction
+
+
+class RTPPayloadActionTest(unittest.TestCase):
+    """Unit tests for raw-payload action plugin"""
+
+    def test_anonymize(self):
+        """
+        Test that the content is replaced by the text repeated, the filler grows with the length of the contents
+        """
+        action = RTPPayloadAction(None)
+        text = RTPPayloadAction.text
+
+        for length in [0, 1, len(text) - 1, len(text), len(text) + 1, 160, 50, 1000, 3]:
+            expected = ''.join(text[i % len(text)] for i in range(length))
+            self.assertEqual(action.anonymize('\x55' * length), expected)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import re
+import unittest
+
+from sirano.app import Phase
+from test.project import create_app, remove_project
+
+
+class PhoneDataTest(unittest.TestCase):
+    """Unit test for the phone Data plugin, the combined formats are compared with the formats matched one by one"""
+
+    project = 'test-phone'
+    """The project created by the test"""
+
+    formats = [r"(\+|000|00)(\d{10,15})",
+               r"(00|0)(\d{7,11})",
+               r"(\*\*)(\d{4}(#\d)?)",
+               r"()(\d{10,15})"]
+    """The formats of the phone numbers, one of them contains a nested group"""
+
+    values = ['+41261234567', '0041261234567', '000123456789012', '0261234567', '0261234567890', '1234567890',
+              '**1234', '**1234#5', '**123', '026123', '+41', '*41261234567', '#', '']
+    """The values parsed"""
+
+    def setUp(self):
+        self.app = create_app(self.project, {'data': {'phone': {'formats': self.formats}}})
+        self.phone = self.app.manager.data.get_data('phone')
+
+    def tearDown(self):
+        remove_project(self.project)
+
+    def __parse(self, value):
+        """
+        Parse a value with the formats matched one by one
+        :param value: The value
+        :type value: str
+        :return: The prefix and the number of the first format that matches the whole value or None
+        :rtype: (str, str) | None
+        """
+        for a_format in self.formats:
+            match = re.match('^' + a_format + '$', value)
+            if match is not None:
+                return match.group(1), match.group(2)
+        return None
+
+    def __find_values(self, string):
+        """
+        Find the phone numbers in a string with the formats searched one by one
+        :param string: The string
+        :type string: str
+        :return: The phone numbers
+        :rtype: list[str]
+        """
+        values = list()
+        for a_format in self.formats:
+            re_format = re.compile(self.phone.re_phone_find_format.format(a_format), re.IGNORECASE)
+            for number in re_format.findall(string):
+                number = ''.join(number)
+                if self.phone.is_valid(number):
+                    values.append(number)
+        return values
+
+    def test_parse(self):
+        """
+        Test that the combined formats validate and split the values like the first format that matches
+        """
+        valid = list()
+        for value in self.values:
+            self.assertEqual(self.phone.is_valid(value), self.__parse(value) is not None, value)
+            if self.phone.is_valid(value):
+                valid.append(value)
+
+        self.app.set_phase(Phase.phase_1)
+        for value in valid:
+            self.phone.add_value(value)
+        self.app.set_phase(Phase.phase_2)
+        self.app.manager.data.process_all()
+
+        for value in valid:
+            prefix, number = self.__parse(value)
+            self.assertEqual(self.phone.get_replacement(value), prefix + self.phone.numbers[number])
+            self.assertTrue(self.phone.has_replacement(prefix + self.phone.numbers[number]))
+
+    def test_find_values(self):
+        """
+        Test that the phone numbers found in a string are the numbers found by each format
+        """
+        string = 'tel:+41261234567;phone-context=0261234567 **1234#5 <sip:000123456789012@10.1.2.3> x-1234567890 026123'
+        self.assertEqual(self.phone.find_values(string), self.__find_values(string))
+        self.assertNotEqual(self.__find_values(string), [])
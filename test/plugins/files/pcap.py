@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from scapy.layers.dns import DNS, DNSQR
+from scapy.layers.inet import ICMP, IP, TCP, UDP
+from scapy.layers.l2 import ARP, Ether
+from scapy.layers.rtp import RTP
+from scapy.packet import Raw
+from scapy.utils import wrpcap
+
+from sirano.app import Phase
+from sirano.plugins.files.pcap import PCAPFile
+from test.project import create_app, remove_project
+
+
+class PCAPFileTest(unittest.TestCase):
+    """Unit test for the PCAP File plugin, the output of each processing path is compared with the reference path"""
+
+    sdp = ("v=0\r\n"
+           "o=alice 2890844526 2890844526 IN IP4 10.1.2.3\r\n"
+           "s=-\r\n"
+           "c=IN IP4 10.1.2.3\r\n"
+           "t=0 0\r\n"
+           "m=audio 49170 RTP/AVP 0\r\n")
+    """The SDP description of the media flow"""
+
+    sip = ("INVITE sip:bob@biloxi.example.com SIP/2.0\r\n"
+           "Via: SIP/2.0/UDP pc33.atlanta.example.com;branch=z9hG4bK776asdhds\r\n"
+           "Max-Forwards: 70\r\n"
+           "To: Bob <sip:bob@biloxi.example.com>\r\n"
+           "From: Alice <sip:alice@atlanta.example.com>;tag=1928301774\r\n"
+           "Call-ID: a84b4c76e66710@pc33.atlanta.example.com\r\n"
+           "CSeq: 314159 INVITE\r\n"
+           "Contact: <sip:alice@pc33.atlanta.example.com>\r\n"
+           "Content-Type: application/sdp\r\n"
+           "Content-Length: {}\r\n"
+           "\r\n"
+           "{}").format(len(sdp), sdp)
+    """The SIP request with the SDP description"""
+
+    conf = {'data': {'ip': {'keyed': True},
+                     'mac': {'keyed': True},
+                     'name': {'keyed': True},
+                     'domain': {'keyed': True},
+                     'phone': {'keyed': True},
+                     'global': {'secret': 'secret'}}}
+    """The configuration of the projects, the keyed mode makes the replacements independent of the processing order"""
+
+    project = 'test-pcap'
+    """The prefix of the projects created by the test"""
+
+    data_names = ['ip', 'mac', 'name', 'domain', 'phone']
+    """The names of the Data plugins compared after the discovery"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.captures = [os.path.join(cls.directory, 'capture-{}.pcap'.format(index)) for index in range(4)]
+        for index, path in enumerate(cls.captures):
+            cls.__write_capture(path, index)
+        cls.capture = cls.captures[0]
+
+    @classmethod
+    def __write_capture(cls, path, index):
+        """
+        Write a capture, the addresses of the hosts depend on its index
+        :param path: The path of the capture
+        :type path: str
+        :param index: The index of the capture
+        :type index: int
+        """
+        ether = Ether(src='00:11:22:33:44:55', dst='66:77:88:99:aa:{:02x}'.format(index))
+        packets = [ether / IP(src='10.1.2.3', dst='192.168.5.{}'.format(index)) / UDP(sport=5060, dport=5060) /
+                   Raw(cls.sip)]
+        for i in range(20):
+            packets.append(ether / IP(src='10.1.2.3', dst='192.168.5.{}'.format(index)) / UDP(sport=49170, dport=3456) /
+                           RTP(sequence=i, timestamp=i * 160) / Raw('\x55' * 160))
+            if i % 5 == 0:
+                packets.append(ether / IP(src='10.1.2.3', dst='8.8.8.8') / UDP(sport=5353, dport=53) /
+                               DNS(rd=1, qd=DNSQR(qname='www{}.example.com'.format(index))))
+                packets.append(ether / IP(src='172.16.{}.{}'.format(index, i), dst='10.1.2.3') /
+                               TCP(sport=1234, dport=80, flags='S'))
+                packets.append(Ether(src='00:11:22:33:{:02x}:{:02x}'.format(index, i), dst='ff:ff:ff:ff:ff:ff') /
+                               ARP(hwsrc='00:11:22:33:{:02x}:{:02x}'.format(index, i),
+                                   psrc='10.1.{}.{}'.format(index, i), pdst='10.1.2.1'))
+                packets.append(ether / IP(src='10.1.2.3', dst='10.9.9.9') / ICMP(type=8) / Raw('abcdefgh'))
+                packets.append(ether / IP(src='10.1.2.3', dst='192.168.5.{}'.format(index)) /
+                               UDP(sport=40000, dport=40002) / RTP(sequence=i) / Raw('\x55' * 160))  # Not negotiated
+        for i, packet in enumerate(packets):
+            packet.time = 1000 + i * 0.01
+        wrpcap(path, packets)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.projects = list()
+
+    def tearDown(self):
+        for project in self.projects:
+            remove_project(project)
+
+    def __anonymize(self, conf=None, workers=1, single_pass=False):
+        """
+        Anonymize the capture in a new project
+        :param conf: The configuration merged with the configuration of the test
+        :type conf: dict
+        :param workers: The number of worker processes
+        :type workers: int
+        :param single_pass: Discover, generate and anonymize in a single pass
+        :type single_pass: True | False
+        :return: The content of the anonymized file and of the file with the dropped packets
+        :rtype: (str, str)
+        """
+        project = '{}-{}'.format(self.project, len(self.projects))
+        self.projects.append(project)
+        app = create_app(project, dict(self.conf, **(conf or dict())), [self.capture])
+        name = os.path.basename(self.capture)
+        app.manager.file.files.append(PCAPFile(app, name))
+        app.manager.file.workers = workers
+
+        if single_pass:
+            app.single_pass = True
+            app.set_phase(Phase.phase_3)
+            app.manager.data.process_all()
+        else:
+            app.set_phase(Phase.phase_1)
+            app.manager.file.discover_all()
+            app.set_phase(Phase.phase_2)
+            app.manager.data.process_all()
+            app.set_phase(Phase.phase_3)
+        app.manager.file.anonymize_all()
+
+        with open(os.path.join(app.project.output, name), 'rb') as f:
+            out = f.read()
+        with open(os.path.join(app.project.trash, name), 'rb') as f:
+            trash = f.read()
+        return out, trash
+
+    def __discover(self, captures, conf=None, workers=1):
+        """
+        Discover the values of captures in a new project, without the keyed mode
+        :param captures: The paths of the captures
+        :type captures: list[str]
+        :param conf: The configuration merged with the default configuration
+        :type conf: dict
+        :param workers: The number of worker processes
+        :type workers: int
+        :return: The content of the data files and the report without the times
+        :rtype: (dict[str, str], dict)
+        """
+        project = '{}-{}'.format(self.project, len(self.projects))
+        self.projects.append(project)
+        app = create_app(project, conf, captures)
+        for path in captures:
+            app.manager.file.files.append(PCAPFile(app, os.path.basename(path)))
+        app.manager.file.workers = workers
+
+        app.set_phase(Phase.phase_1)
+        app.manager.file.discover_all()
+        app.manager.data.save_all()
+
+        data = dict()
+        for name in self.data_names:
+            with open(os.path.join(app.project.data, name + '.yml')) as f:
+                data[name] = f.read()
+        report = self.__strip_times(app.report)
+        del report['data']['guess']  # The hits of the memo depend on the values already seen by each process
+        return data, report
+
+    def __strip_times(self, report):
+        """
+        Copy a report with the durations and the times replaced by None
+        :param report: The report
+        :type report: dict | list | object
+        :return: The copy of the report
+        :rtype: dict | list | object
+        """
+        if isinstance(report, dict):
+            return dict((key, None if key.endswith('duration') or key in ('start', 'end') else
+                         self.__strip_times(value)) for key, value in report.iteritems())
+        if isinstance(report, list):
+            return [self.__strip_times(value) for value in report]
+        return report
+
+    def test_workers(self):
+        """
+        Test that the files discovered by the worker processes give the same data and report than a serial processing
+        """
+        data, report = self.__discover(self.captures)
+        self.assertIn('10.1.3.5', data['ip'])
+        self.assertEqual(sorted(entry['name'] for entry in report['file']['files']),
+                         sorted(os.path.basename(path) for path in self.captures))
+        for entry in report['file']['files']:
+            self.assertIn('discover_duration', entry)
+        self.assertEqual(self.__discover(self.captures, workers=3), (data, report))
+
+    def test_shards(self):
+        """
+        Test that the shards processed by the worker processes give the same files than a serial processing
+        """
+        out, trash = self.__anonymize()
+        self.assertGreater(len(out), 0)
+        self.assertGreater(len(trash), 0)
+        self.assertEqual(self.__anonymize({'file': {'pcap': {'shard-size': 0.001}}}, workers=3), (out, trash))
+
+    def test_shards_discovery(self):
+        """
+        Test that the values discovered in the shards are merged in the packet order, without the keyed mode
+        """
+        self.assertEqual(self.__discover([self.capture], {'file': {'pcap': {'shard-size': 0.001}}}, workers=3),
+                         self.__discover([self.capture]))
+
+    def test_media_flows(self):
+        """
+        Test that without the media flows all the UDP datagrams are decoded as RTP, without changing the layer bindings
+        of the next projects
+        """
+        out, trash = self.__anonymize()
+        out_all, trash_all = self.__anonymize({'file': {'pcap': {'media-flows': False}}})
+        self.assertNotIn(RTP, [cls for _, cls in UDP.payload_guess])
+        self.assertGreater(len(out_all), len(out))  # The RTP datagrams not negotiated are anonymized
+        self.assertLess(len(trash_all), len(trash))
+        self.assertEqual(self.__anonymize({'file': {'pcap': {'media-flows': False, 'fast-path': False}}}),
+                         (out_all, trash_all))
+        self.assertEqual(self.__anonymize(), (out, trash))
+
+    def test_rtp_binding(self):
+        """
+        Test that a binding of UDP to RTP left in the configuration of the layers is warned about with the media flows
+        """
+        warnings = list()
+        handler = logging.Handler(logging.WARNING)
+        handler.emit = lambda record: warnings.append(record.getMessage())
+
+        for conf, count in (({'file': {'pcap': {'media-flows': False}}}, 0), (None, 1)):
+            project = '{}-{}'.format(self.project, len(self.projects))
+            self.projects.append(project)
+            app = create_app(project, conf, [self.capture])
+            # Added after the loading of the layers, the binding must not reach scapy and the next projects
+            app.conf['layer']['bind-layers'].append({'lower': 'UDP', 'upper': 'RTP'})
+            app.manager.file.files.append(PCAPFile(app, os.path.basename(self.capture)))
+            app.set_phase(Phase.phase_1)
+            app.log.addHandler(handler)
+            try:
+                app.manager.file.discover_all()
+            finally:
+                app.log.removeHandler(handler)
+            self.assertEqual(len([w for w in warnings if 'binds UDP to RTP' in w]), count)
+
+    def test_single_pass(self):
+        """
+        Test that the single pass mode gives the same files than the phases
+        """
+        self.assertEqual(self.__anonymize(single_pass=True), self.__anonymize())
+
+    def test_fast_path(self):
+        """
+        Test that the fast path gives the same files than scapy
+        """
+        self.assertEqual(self.__anonymize({'file': {'pcap': {'fast-path': False}}}), self.__anonymize())
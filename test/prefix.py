@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import unittest
+from netaddr import IPNetwork, IPAddress
+from sirano.prefix import PrefixTrie
+
+
+class PrefixTrieTest(unittest.TestCase):
+    """Unit test for the trie of integer prefixes"""
+
+    def setUp(self):
+        self.trie = PrefixTrie()
+        for network in ['10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '192.168.0.0/16']:
+            network = IPNetwork(network)
+            self.trie[network.first, network.prefixlen] = network
+
+    def test_longest_match(self):
+        """
+        Test the longest prefix match of addresses and prefixes
+        """
+        self.assertEqual(self.trie.longest_match(int(IPAddress('10.1.2.3'))), IPNetwork('10.1.2.0/24'))
+        self.assertEqual(self.trie.longest_match(int(IPAddress('10.1.3.3'))), IPNetwork('10.1.0.0/16'))
+        self.assertEqual(self.trie.longest_match(int(IPAddress('10.2.3.4'))), IPNetwork('10.0.0.0/8'))
+        self.assertIsNone(self.trie.longest_match(int(IPAddress('11.0.0.1'))))
+        self.assertEqual(self.trie.longest_match(int(IPAddress('10.1.2.0')), 20), IPNetwork('10.1.0.0/16'))
+
+    def test_has_subprefix(self):
+        """
+        Test the lookup of the prefixes contained in a prefix
+        """
+        self.assertTrue(self.trie.has_subprefix(int(IPAddress('10.1.0.0')), 12))
+        self.assertTrue(self.trie.has_subprefix(int(IPAddress('192.168.0.0')), 16))
+        self.assertFalse(self.trie.has_subprefix(int(IPAddress('192.168.0.0')), 24))
+        self.assertFalse(self.trie.has_subprefix(int(IPAddress('172.16.0.0')), 12))
+        self.assertTrue(self.trie.has_subprefix(0, 0))
+
+    def test_items(self):
+        """
+        Test the access to the items of the prefixes
+        """
+        self.assertEqual(len(self.trie), 4)
+        self.assertIn((int(IPAddress('10.1.2.255')), 24), self.trie)
+        self.assertNotIn((int(IPAddress('10.1.2.0')), 23), self.trie)
+        self.assertRaises(KeyError, self.trie.__getitem__, (0, 0))
+        self.trie[0, 0] = 'default'
+        self.assertEqual(self.trie.longest_match(int(IPAddress('11.0.0.1'))), 'default')
+        self.assertEqual(len(self.trie), 5)
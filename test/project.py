@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import shutil
+
+import yaml
+
+from sirano.app import App
+
+
+def create_app(name, conf=None, inputs=()):
+    """
+    Create a project copied from the default project and load its application, for the tests that need a project
+    :param name: The project name
+    :type name: str
+    :param conf: The configuration merged in the configuration of the default project
+    :type conf: dict
+    :param inputs: The paths of the files copied in the input folder
+    :type inputs: collections.Iterable[str]
+    :return: The loaded application
+    :rtype: App
+    """
+    remove_project(name)
+    root = os.path.join('projects', name)
+    shutil.copytree(os.path.join('projects', 'default'), root)
+
+    if conf:
+        path = os.path.join(root, 'data', 'config.yml')
+        with open(path) as f:
+            project_conf = yaml.load(f)
+        _merge(project_conf, conf)
+        with open(path, 'w') as f:
+            yaml.dump(project_conf, f, default_flow_style=False)
+
+    app = App(name)
+    app.load()
+    for path in inputs:
+        shutil.copy(path, app.project.input)
+    return app
+
+
+def remove_project(name):
+    """
+    Remove a project created by create_app()
+    :param name: The project name
+    :type name: str
+    """
+    shutil.rmtree(os.path.join('projects', name), ignore_errors=True)
+    shutil.rmtree(os.path.join('projects', 'archives', name), ignore_errors=True)
+
+
+def _merge(conf, other):
+    """
+    Merge a configuration in another one
+    :param conf: The configuration updated
+    :type conf: dict
+    :param other: The configuration merged
+    :type other: dict
+    """
+    for key, value in other.items():
+        if isinstance(value, dict) and isinstance(conf.get(key), dict):
+            _merge(conf[key], value)
+        else:
+            conf[key] = value
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+from sirano.storage import JournalStorage, SqliteStorage
+
+
+class JournalStorageTest(unittest.TestCase):
+    """Unit test for the storage in a snapshot and a journal"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ip.yml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_journal(self):
+        """
+        Test the replay of the journal after a crash, with a truncated record, and its compaction
+        """
+        with open(self.path, 'w') as f:
+            yaml.dump({'hosts': {'10.0.0.1': '10.9.0.1'}}, f)
+
+        storage = JournalStorage(self.path)
+        storage.open_journal()
+        storage.journal('hosts', '10.0.0.2', None)
+        storage.journal('hosts', '10.0.0.2', '10.9.0.2')
+        storage.journal('subnets', '10.0.0.0/24', None)
+        storage.flush()
+        with open(storage.journal_path, 'ab') as f:
+            f.write('\x28\x03')  # The beginning of a record
+
+        data = JournalStorage(self.path).load()
+        self.assertEqual(data, {'hosts': {'10.0.0.1': '10.9.0.1', '10.0.0.2': '10.9.0.2'},
+                                'subnets': {'10.0.0.0/24': None}})
+
+        storage = JournalStorage(self.path)
+        storage.save(data)
+        self.assertFalse(os.path.isfile(storage.journal_path))
+        self.assertEqual(JournalStorage(self.path).load(), data)
+
+    def test_export_import(self):
+        """
+        Test the YAML file used as export and import format
+        """
+        storage = JournalStorage(self.path)
+        storage.save({'names': {'alice': 'zorba'}})
+        storage.export_yaml()
+        with open(self.path) as f:
+            self.assertEqual(yaml.load(f), {'names': {'alice': 'zorba'}})
+
+        with open(self.path, 'w') as f:
+            yaml.dump({'names': {'alice': 'bob'}}, f)
+        storage.import_yaml()
+        self.assertEqual(storage.load(), {'names': {'alice': 'bob'}})
+
+
+class SqliteStorageTest(unittest.TestCase):
+    """Unit test for the storage in a SQLite database"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'name.yml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lazy(self):
+        """
+        Test the lookups of a section loaded lazily and the changes kept in memory
+        """
+        storage = SqliteStorage(self.path, cache_size=2)
+        storage.save({'names': {'alice': 'zorba', 'bob': None}})
+        self.assertEqual(SqliteStorage(self.path).load(), {'names': {'alice': 'zorba', 'bob': None}})
+
+        names = SqliteStorage(self.path, cache_size=2).load(lazy=True)['names']
+        self.assertEqual(names.get('alice'), 'zorba')
+        self.assertIsNone(names.get('carol'))
+        self.assertIn('bob', names)
+        self.assertEqual(len(names.value_cache), 2)
+        self.assertTrue(names.has_replacement('zorba'))
+        self.assertFalse(names.has_replacement('alice'))
+        self.assertEqual(names.get_batch(['bob', 'alice', 'dave']), [None, 'zorba', None])
+
+        names['bob'] = 'yann'
+        names['carol'] = None
+        del names['alice']
+        self.assertTrue(names.has_replacement('yann'))
+        self.assertEqual(len(names), 2)
+        self.assertEqual(dict(names.iteritems()), {'bob': 'yann', 'carol': None})
+        self.assertEqual(sorted(names.items()), [('bob', 'yann'), ('carol', None)])
+        self.assertEqual(sorted(names.keys()), ['bob', 'carol'])
+        self.assertEqual(sorted(names.values()), [None, 'yann'])
+        self.assertEqual(SqliteStorage(self.path).load(), {'names': {'alice': 'zorba', 'bob': None}})
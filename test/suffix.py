@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import unittest
+from sirano.suffix import PublicSuffixTrie
+
+
+class PublicSuffixTrieTest(unittest.TestCase):
+    """Unit test for the trie of the domain suffixes"""
+
+    def test_has_suffix(self):
+        """
+        Test the rules, the wildcards, the exceptions and the local suffixes
+        """
+        suffixes = PublicSuffixTrie(['ch', 'co.uk', '*.ck', '!www.ck'], ['lan'])
+
+        self.assertTrue(suffixes.has_suffix('www.heia-fr.ch'))
+        self.assertTrue(suffixes.has_suffix('WWW.EXAMPLE.CO.UK'))
+        self.assertTrue(suffixes.has_suffix('co.uk'))
+        self.assertTrue(suffixes.has_suffix('example.anything.ck'))
+        self.assertTrue(suffixes.has_suffix('www.ck'))
+        self.assertTrue(suffixes.has_suffix('host.lan'))
+        self.assertFalse(suffixes.has_suffix('lan'))
+        self.assertFalse(suffixes.has_suffix('example.uk'))
+        self.assertFalse(suffixes.has_suffix('example.com'))
+        self.assertFalse(suffixes.has_suffix('ck'))
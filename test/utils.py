@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import copy
+import unittest
+from sirano.utils import report_delta, report_merge
+
+
+class UtilsTest(unittest.TestCase):
+    """Unit tests for the utils module"""
+
+    def test_report_delta_merge(self):
+        """
+        Test that the changes of two processes merged into the report give the same result than a serial processing
+        """
+        base = {'packet': {'layers': [{'name': 'IP', 'pass': 0, 'anonymized': 2}]},
+                'files': [{'name': 'a.pcap', 'type': 'pcap'}]}
+
+        worker_1 = copy.deepcopy(base)
+        worker_1['packet']['layers'][0]['anonymized'] += 3
+        worker_1['packet']['layers'].append({'name': 'UDP', 'pass': 1, 'anonymized': 0})
+
+        worker_2 = copy.deepcopy(base)
+        worker_2['packet']['layers'][0]['pass'] += 1
+        worker_2['files'][0]['discover_duration'] = '10 ms'
+
+        report = copy.deepcopy(base)
+        report_merge(report, report_delta(base, worker_1))
+        report_merge(report, report_delta(base, worker_2))
+
+        self.assertEqual(report, {'packet': {'layers': [{'name': 'IP', 'pass': 1, 'anonymized': 5},
+                                                        {'name': 'UDP', 'pass': 1, 'anonymized': 0}]},
+                                  'files': [{'name': 'a.pcap', 'type': 'pcap', 'discover_duration': '10 ms'}]})
+
+    def test_report_delta_unchanged(self):
+        """
+        Test that no changes is given when the report is not modified
+        """
+        base = {'packet': {'layers': [{'name': 'IP', 'pass': 0}]}, 'project_name': 'test'}
+        self.assertIsNone(report_delta(base, copy.deepcopy(base)))
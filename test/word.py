@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# This file is a part of Sirano.
+#
+# Copyright (C) 2015  HES-SO // HEIA-FR
+# Copyright (C) 2015  Loic Gremaud <loic.gremaud@grelinfo.ch>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+
+import random
+import unittest
+from sirano.word import WordPool
+
+
+class WordPoolTest(unittest.TestCase):
+    """Unit test for the pool of pronounceable words"""
+
+    def test_generate(self):
+        """
+        Test the length of the words and the duplicates of a batch
+        """
+        pool = WordPool(batch_size=100, rng=random.Random(0))
+        for length in (1, 2, 3, 8, 20):
+            words = [pool.generate(length)] + pool.pools[length]
+            self.assertTrue(all(len(word) == length and word.isalpha() for word in words))
+            self.assertEqual(len(words), len(set(words)))
+
+    def test_seed(self):
+        """
+        Test that the words of a seeded pool and of an unbatched pool depend only on the seed
+        """
+        pool = WordPool(rng=random.Random())
+        pool.seed(1)
+        words = [pool.generate(6) for _ in range(10)]
+        pool.seed(1)
+        self.assertEqual([pool.generate(6) for _ in range(10)], words)
+
+        pool = WordPool(batch_size=1)
+        random.seed(2)
+        words = [pool.generate(6) for _ in range(10)]
+        random.seed(2)
+        self.assertEqual([pool.generate(6) for _ in range(10)], words)